@@ -1,86 +1,66 @@
 import streamlit as st
-import pandas as pd
-import spacy
-from gensim import corpora
-from gensim.models import LdaModel
-from bertopic import BERTopic
 
-from utils.preprocessing import single_text_preprocessing
+from utils.artifacts import refresh_corpus, registry
+from utils.corpus_store import document_columns
+from utils.figure_cache import get_figure, start_precompute
+from utils.metrics import debug_panel, finish_rerun, stage, start_rerun
+from utils.prediction import (
+    bertopic_batcher,
+    find_similar_papers,
+    predict_topic_bertopic_cached,
+    predict_topic_lda_cached,
+    prediction_cache,
+    query_embedding_cache,
+    search_papers,
+)
 from utils.visualization import (
-    visualize_topic_over_time,
-    visualize_top10words_bertopic,
-    visualize_top10words_lda,
+    visualize_topic_comparison,
     visualize_topic_distribution,
-    visualize_wordcloud_bertopic,
-    visualize_wordcloud_lda,
     create_colored_text,
     print_topic_colors,
 )
+from utils.wordcloud_cache import get_wordcloud_png
+from utils import warmup
 
 # SETTINGS
 
 # Set theme
 st.set_page_config(page_title="PREDTopic App", page_icon=":bar_chart:", layout="wide")
 
-# Set file path
-data_path = "data/"
-lda_model_path = "models/lda_model/"
-bertopic_model_path = "models/bertopic_model"
-materials_path = "materials/documentation/"
-
+# Time the stages of this rerun (breakdown kept for the debug panel when requested)
+show_debug_panel = debug_panel or st.query_params.get("debug") == "1"
+start_rerun(record=show_debug_panel)
 
 # LOAD DATA
-
-# Load prepared documents
-data_df = pd.read_csv(f"{data_path}prepared_data.csv")
-
-# Load LDA-clustered documents and merge with dataset
-topic_df_lda = pd.read_csv(f"{data_path}topic_probabilities_LDA-BoW.csv")
-topic_df_lda = topic_df_lda.join(
-    data_df.drop(columns=["DOI", "Year", "Title", "Text"]), how="left"
-)
-
-# Load BERTopic-clustered documents and merge with dataset
-topic_df_bertopic = pd.read_csv(f"{data_path}topic_documents_BERTopic.csv")
-topic_df_bertopic = topic_df_bertopic.join(
-    data_df.drop(columns=["DOI", "Year", "Title", "Text"]), how="left"
-)
-# fill probability value same for all data in BERTopic model,
-# since this model does not provide probability for each document.
-topic_df_bertopic["Top Topic Probability"] = 1
-
-# LOAD MODEL
-
-# Load LDA model
-best_lda_model_path = f"{lda_model_path}best_lda_model"
-lda_model = LdaModel.load(best_lda_model_path)
-dictionary = corpora.Dictionary.load(f"{best_lda_model_path}.id2word")
-
-# Load BERTopic model
-bertopic_model = BERTopic.load(f"{bertopic_model_path}")
-
-# Load spaCy model for visualization
-nlp = spacy.load("en_core_web_sm")
-
-
-# LOAD ADDITIONAL MATERIALS (e.g., topic descriptions)
-topic_desc_bertopic_path = f"{materials_path}topic_descriptions_BERTopic.csv"
-topic_desc_bertopic = pd.read_csv(topic_desc_bertopic_path)
-
-topic_desc_lda_path = f"{materials_path}topic_descriptions_LDA.csv"
-topic_desc_lda = pd.read_csv(topic_desc_lda_path)
-
+# Artifacts are loaded once per process by the registry and shared across reruns.
+# Models are loaded lazily, the first time a view or a prediction needs them.
+# Papers ingested while the app runs (python -m utils.ingest) are picked up here.
+refresh_corpus()
+with stage("load_data"):
+    topic_df_lda = registry.get("topic_df_lda")
+    topic_df_bertopic = registry.get("topic_df_bertopic")
+    topic_desc_bertopic = registry.get("topic_desc_bertopic")
+    topic_desc_lda = registry.get("topic_desc_lda")
+    topic_index_lda = registry.get("topic_index_lda")
+    topic_index_bertopic = registry.get("topic_index_bertopic")
+
+# Warm up the process in the background (once per process): with PREDTOPIC_WARMUP=1
+# load everything and prime every topic view, otherwise only build the figures
+if warmup.enabled:
+    warmup.start_warm_up(warmup.app_steps())
+else:
+    start_precompute()
 
 # GET BEST TOPIC
 
 # Best Topic of LDA
-best_topic_lda = topic_df_lda["Top Topic ID"].value_counts().idxmax()
-best_topic_name_lda = topic_df_lda["Top Topic Name"].value_counts().idxmax()
+best_topic_lda = topic_index_lda.best_topic
+best_topic_name_lda = topic_index_lda.best_topic_name
 num_topics_lda = 11
 
 # Best Topic of BERTopic
-best_topic_bertopic = topic_df_bertopic["Top Topic ID"].value_counts().idxmax()
-best_topic_name_bertopic = topic_df_bertopic["Top Topic Name"].value_counts().idxmax()
+best_topic_bertopic = topic_index_bertopic.best_topic
+best_topic_name_bertopic = topic_index_bertopic.best_topic_name
 num_topics_bertopic = 13
 
 
@@ -158,34 +138,30 @@ def display_header(container):
 
 # Function to display topic visualizations include representative words and documents
 def display_topic_viz_docs(topic_id, container):
+    model = st.session_state.selected_model
     # Set data by model type selected
     if st.session_state.selected_model == "BERTopic":
         best_topic = best_topic_bertopic
         best_topic_name = best_topic_name_bertopic
-        topic_df = topic_df_bertopic
+        topic_index = topic_index_bertopic
+        topic_table = registry.get("topic_table_bertopic")
     else:
         best_topic = best_topic_lda
         best_topic_name = best_topic_name_lda
-        topic_df = topic_df_lda
+        topic_index = topic_index_lda
+        topic_table = registry.get("topic_table_lda")
 
-    # Get topic informations
-    if topic_id == best_topic:  # default display
-        topic_df_to_show = topic_df[topic_df["Top Topic ID"] == best_topic]
-        header = f"### :trophy: Top Topic: Topic {best_topic}\n{best_topic_name}"
-    else:
-        topic_df_to_show = topic_df[topic_df["Top Topic ID"] == topic_id]
-        header = f'**[Topic {topic_id}]** {topic_df_to_show["Top Topic Name"].value_counts().idxmax()}'
-
-    # Get 10 representative documents
-    top_10_docs = topic_df_to_show.sample(10, random_state=42)
-    top_10_docs.reset_index(drop=True, inplace=True)
-
-    # Get 10 most probable documents for LDA model type
-    if st.session_state.selected_model == "LDA":
-        top_10_docs = (
-            topic_df_to_show.sort_values("Top Topic Probability", ascending=False)
-            .head(10)
-            .reset_index()
+    # Get topic informations from the precomputed topic index
+    with stage("filter", model=model):
+        if topic_id == best_topic:  # default display
+            header = f"### :trophy: Top Topic: Topic {best_topic}\n{best_topic_name}"
+        else:
+            header = f"**[Topic {topic_id}]** {topic_index.name(topic_id)}"
+
+        # Get 10 representative documents, reading only these rows from the topic table
+        # (sampled for BERTopic, most probable for LDA model type)
+        top_10_docs = topic_table.rows(
+            topic_index.representatives(topic_id), document_columns
         )
 
     with container.container():
@@ -195,35 +171,26 @@ def display_topic_viz_docs(topic_id, container):
         container_mid = st.container()
         # Create columns to part the display
         main_col1, main_col2 = st.columns([0.6, 0.4])
-        with main_col1:
+        # Figures are built once per model and topic, then served from the cache
+        with main_col1, stage("figure", model=model, chart="topic_over_time"):
             st.plotly_chart(
-                visualize_topic_over_time(topic_id, topic_df_to_show),
+                get_figure(model, "topic_over_time", topic_id),
                 use_container_width=True,
             )
 
-        with main_col2:
-            if st.session_state.selected_model == "BERTopic":
-                st.plotly_chart(
-                    visualize_top10words_bertopic(
-                        model=bertopic_model,
-                        topic_id=topic_id,
-                    ),
-                    use_container_width=True,
-                )
-            else:
-                st.plotly_chart(
-                    visualize_top10words_lda(
-                        model=lda_model,
-                        topic_id=topic_id,
-                    ),
-                    use_container_width=True,
-                )
+        with main_col2, stage("figure", model=model, chart="top10words"):
+            st.plotly_chart(
+                get_figure(model, "top10words", topic_id),
+                use_container_width=True,
+            )
 
         # Display wordcloud
-        if st.session_state.selected_model == "BERTopic":
-            st.pyplot(visualize_wordcloud_bertopic(bertopic_model, topic_id))
-        else:
-            st.pyplot(visualize_wordcloud_lda(lda_model, topic_id))
+        with stage("wordcloud", model=model):
+            st.image(
+                get_wordcloud_png(st.session_state.selected_model, topic_id),
+                use_column_width=True,
+                output_format="PNG",
+            )
         st.markdown("<br>", unsafe_allow_html=True)
 
         st.divider()
@@ -231,18 +198,18 @@ def display_topic_viz_docs(topic_id, container):
         # Display the description of the topic
         if st.session_state.selected_model == "BERTopic":
             st.markdown(
-                f"<h5 style:'margin-top:12px'>Topic {topic_id}: {topic_desc_bertopic['Topic'][topic_id]}</h5>",
+                f"<h5 style:'margin-top:12px'>Topic {topic_id}: {topic_desc_bertopic[topic_id]['Topic']}</h5>",
                 unsafe_allow_html=True,
             )
             st.markdown(
-                f"<p style:'text-align: justify; text-justify: inter-word;'>{topic_desc_bertopic['Description'][topic_id]}</p>",
+                f"<p style:'text-align: justify; text-justify: inter-word;'>{topic_desc_bertopic[topic_id]['Description']}</p>",
                 unsafe_allow_html=True,
-                # f"**Description**: {topic_desc_bertopic['Description'][topic_id]}"
+                # f"**Description**: {topic_desc_bertopic[topic_id]['Description']}"
             )
 
         else:
-            st.markdown(f"##### Topic {topic_id}: {topic_desc_lda['Topic'][topic_id]}")
-            st.markdown(f"**Description**: {topic_desc_lda['Description'][topic_id]}")
+            st.markdown(f"##### Topic {topic_id}: {topic_desc_lda[topic_id]['Topic']}")
+            st.markdown(f"**Description**: {topic_desc_lda[topic_id]['Description']}")
 
         st.divider()
 
@@ -293,47 +260,112 @@ topic_id = display_header(container_header)
 display_topic_viz_docs(topic_id, container_main)
 
 
-# Function for new prediction using BERTopic
-def predict_topic_bertopic(new_text, bertopic_model):
-    [topic_id], [probability] = bertopic_model.transform([new_text])
-    return topic_id, probability
+# Function to display several topics of the selected model over the years
+def display_topic_comparison(topic_id):
+    model = st.session_state.selected_model
+    if model == "BERTopic":
+        topic_trends = registry.get("topic_trends_bertopic")
+        num_topics = num_topics_bertopic
+    else:
+        topic_trends = registry.get("topic_trends_lda")
+        num_topics = num_topics_lda
+
+    with st.expander("Compare Topics Over The Years"):
+        compare_col1, compare_col2 = st.columns([0.8, 0.2])
+        with compare_col1:
+            compared_topics = st.multiselect(
+                "Topics",
+                options=list(range(num_topics)),
+                default=[topic_id],
+                format_func=lambda i: f"Topic {i}",
+                key=f"compare_topics_{model}",
+            )
+        with compare_col2:
+            measure = st.radio(
+                "Show",
+                options=["Document_Count", "Share"],
+                format_func=lambda m: "Documents" if m == "Document_Count" else "Share",
+                key="compare_measure",
+            )
+        if compared_topics:
+            with stage("figure", model=model, chart="topic_comparison"):
+                st.plotly_chart(
+                    visualize_topic_comparison(compared_topics, topic_trends, measure),
+                    use_container_width=True,
+                )
 
 
-# Function for new prediction using LDA
-def predict_topic_lda(new_text, lda_model):
-    # Preprocessed new text
-    processed_new_text = single_text_preprocessing(new_text)
+display_topic_comparison(topic_id)
 
-    # Convert new text to BoW (feature extraction)
-    new_bow = dictionary.doc2bow(processed_new_text)
 
-    # Get topic distribution of the new text (prediction)
-    new_topic_distribution, per_word_topics, _ = lda_model.get_document_topics(
-        new_bow, per_word_topics=True
-    )
+# Function to display the corpus search (titles and abstracts), filtered by topics
+# of the selected model and by years
+def display_paper_search():
+    model = st.session_state.selected_model
+    num_topics = num_topics_bertopic if model == "BERTopic" else num_topics_lda
+    topic_df = topic_df_bertopic if model == "BERTopic" else topic_df_lda
+    first_year, last_year = int(topic_df["Year"].min()), int(topic_df["Year"].max())
 
-    # Sort topic distribution
-    sorted_topic_distribution = sorted(
-        new_topic_distribution, key=lambda x: x[1], reverse=True
-    )
-    topic_id = sorted_topic_distribution[0][0]
+    with st.expander("Search Papers"):
+        query = st.text_input("Search titles and abstracts", key="search_query")
+        filter_col1, filter_col2 = st.columns([0.6, 0.4])
+        with filter_col1:
+            searched_topics = st.multiselect(
+                f"Topics ({model}, all when empty)",
+                options=list(range(num_topics)),
+                format_func=lambda i: f"Topic {i}",
+                key=f"search_topics_{model}",
+            )
+        with filter_col2:
+            years = (first_year, last_year)
+            if first_year < last_year:
+                years = st.slider(
+                    "Years", first_year, last_year, years, key="search_years"
+                )
+        if not query.strip():
+            return
+
+        papers = search_papers(
+            query,
+            k=20,
+            model_type=model,
+            topic_ids=searched_topics or None,
+            years=years,
+        )
+        if papers is None:
+            st.write(
+                "No up-to-date search index, run: python -m utils.search_index build"
+            )
+            return
+        if papers.empty:
+            st.write("No papers found.")
+        for index, row in papers.iterrows():
+            st.markdown(
+                f'**[{index + 1}]** ({row["Year"]}) {row["Title"]}  \n'
+                f'<small>Topic {row["Top Topic ID"]} | '
+                f'Score: {row["Score"]:.2f} | '
+                f'DOI: <a href="https://doi.org/{row["DOI"]}">{row["DOI"]}</a></small>',
+                unsafe_allow_html=True,
+            )
 
-    # Create doc for visualization
-    doc = nlp(new_text)
 
-    return topic_id, sorted_topic_distribution, per_word_topics, doc
+display_paper_search()
 
 
 with st.sidebar:
     st.markdown(f"### Topic Prediction for New Research Idea", unsafe_allow_html=True)
     # Text input for research description
     text = st.text_area("Describe your research idea here", height=250, max_chars=3000)
+    similar_same_topic = st.checkbox(
+        "Show similar papers from the predicted topic only (BERTopic)"
+    )
     # Button to choose model type
     st.write("Predict using:")
     col1, col2 = st.columns(2)
     with col1:
         if st.button("BERTopic", use_container_width=True):
-            topic_id, probability = predict_topic_bertopic(text, bertopic_model)
+            with stage("prediction", model="BERTopic"):
+                topic_id, probability, _ = predict_topic_bertopic_cached(text)
 
             # Update selectbox and state
             st.session_state.selected_model = "BERTopic"
@@ -357,11 +389,30 @@ with st.sidebar:
                     unsafe_allow_html=True,
                 )
 
+            # Display the papers of the corpus closest to the research idea
+            with stage("similar_papers", model="BERTopic"):
+                similar_papers = find_similar_papers(
+                    text, k=10, topic_id=topic_id if similar_same_topic else None
+                )
+            if similar_papers is not None:
+                with container_mid.container():
+                    expander = st.empty()
+                    with expander.expander("Similar Papers", expanded=True):
+                        for index, row in similar_papers.iterrows():
+                            st.markdown(
+                                f'**[{index + 1}]** ({row["Year"]}) {row["Title"]}  \n'
+                                f'<small>Topic {row["Top Topic ID"]} | '
+                                f'Similarity: {row["Similarity"]:.3f} | '
+                                f'DOI: <a href="https://doi.org/{row["DOI"]}">{row["DOI"]}</a></small>',
+                                unsafe_allow_html=True,
+                            )
+
     with col2:
         if st.button("LDA", use_container_width=True):
-            topic_id, new_topic_distribution, per_word_topics, doc = predict_topic_lda(
-                text, lda_model
-            )
+            with stage("prediction", model="LDA"):
+                topic_id, new_topic_distribution, per_word_topics, tokens = (
+                    predict_topic_lda_cached(text)
+                )
 
             # Update selectbox and state
             st.session_state.selected_model = "LDA"
@@ -389,14 +440,41 @@ with st.sidebar:
             with container_mid.container():
                 expander = st.empty()
                 with expander.expander("Topic Distribution", expanded=True):
+                    with stage("colored_text", model="LDA"):
+                        colored_text = create_colored_text(
+                            tokens, registry.get("dictionary"), per_word_topics
+                        )
                     st.markdown(
-                        f"<p>{create_colored_text(doc, dictionary, per_word_topics)}</p>",
+                        f"<p>{colored_text}</p>",
                         unsafe_allow_html=True,
                     )
                     st.markdown(
                         f"<p>{print_topic_colors(num_topics_lda)}</p>",
                         unsafe_allow_html=True,
                     )
-                    st.plotly_chart(
-                        visualize_topic_distribution(new_topic_distribution)
-                    )
+                    with stage("figure", model="LDA", chart="topic_distribution"):
+                        st.plotly_chart(
+                            visualize_topic_distribution(new_topic_distribution)
+                        )
+
+
+# Stage timings of this rerun, metrics export and debug panel
+rerun_timings = finish_rerun()
+if show_debug_panel:
+    with st.sidebar.expander("Debug: stage timings", expanded=False):
+        st.write(
+            f"Rerun stages: {sum(t['seconds'] for t in rerun_timings if t['depth'] == 0):.3f}s"
+        )
+        st.dataframe(rerun_timings, use_container_width=True)
+        st.write("Artifacts")
+        st.dataframe(registry.stats(), use_container_width=True)
+        st.write("BERTopic micro-batching and caches")
+        st.json(
+            {
+                "batcher": bertopic_batcher.stats(),
+                "prediction_cache": prediction_cache.stats(),
+                "query_embedding_cache": query_embedding_cache.stats(),
+                "warmup": warmup.state(),
+            },
+            expanded=False,
+        )
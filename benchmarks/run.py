@@ -0,0 +1,509 @@
+# Offline benchmarks of the app's hot paths: cold start (imports and artifact
+# loading), preprocessing, LDA/BERTopic prediction, colored text and every
+# visualization function, on synthetic texts and on the sample corpus.
+#
+# Usage:
+#   python -m benchmarks.run run --output benchmarks/results/baseline.json
+#   python -m benchmarks.run run --output current.json --only preprocessing,lda
+#   python -m benchmarks.run compare baseline.json current.json --threshold 0.2
+#
+# Every benchmark records latency percentiles (seconds) and the peak memory
+# allocated by one call (tracemalloc, or the child's max RSS for cold start).
+# Benchmarks whose models or data are missing are recorded as skipped.
+# compare exits with status 1 when a benchmark got slower (or used more memory)
+# than the threshold allows, so it can be used as a gate.
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+# Inputs of the synthetic texts (words) and of the colored text benchmark
+synthetic_sizes = [10, 100, 1000]
+sample_corpus_path = "data/prepared_data.csv"
+sample_size = 200
+# Artifacts PREDTopic.py loads at startup and on the first prediction
+cold_start_artifacts = [
+    "topic_df_lda",
+    "topic_df_bertopic",
+    "topic_index_lda",
+    "topic_index_bertopic",
+    "topic_desc_lda",
+    "topic_desc_bertopic",
+    "topic_terms_lda",
+    "topic_terms_bertopic",
+    "dictionary",
+    "lda_model",
+    "nlp",
+    "bertopic_model",
+]
+percentiles = [50, 90, 95, 99]
+# Words of the synthetic texts when the LDA dictionary is not available
+fallback_vocabulary = (
+    "model data learning network method system analysis neural algorithm image "
+    "performance deep proposed results based training feature classification "
+    "detection approach information research paper study using dataset accuracy"
+).split()
+
+cold_start_script = """
+import json, resource, sys, time
+start = time.perf_counter()
+from utils.artifacts import registry
+import_seconds = time.perf_counter() - start
+errors = {}
+for name in sys.argv[1:]:
+    try:
+        registry.get(name)
+    except Exception as e:
+        errors[name] = repr(e)
+print(json.dumps({
+    "import_seconds": import_seconds,
+    "total_seconds": time.perf_counter() - start,
+    "artifacts": {row["artifact"]: row.get("load_seconds") for row in registry.stats()
+                  if row["loaded"]},
+    "errors": errors,
+    "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+}))
+"""
+
+
+class Skip(Exception):
+    pass
+
+
+# Function to summarize a list of timings (seconds)
+def summarize(timings):
+    timings = np.asarray(timings, dtype=float)
+    summary = {
+        "n": int(len(timings)),
+        "mean": float(timings.mean()),
+        "min": float(timings.min()),
+        "max": float(timings.max()),
+    }
+    for q, value in zip(percentiles, np.percentile(timings, percentiles)):
+        summary[f"p{q}"] = float(value)
+    return summary
+
+
+# Function to time fn() repeat times (after warmup calls), then measure the peak
+# memory allocated by one more call
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = summarize(timings)
+    result["peak_memory_bytes"] = int(peak)
+    return result
+
+
+# Function to run the cold start in fresh interpreters, one per repeat
+def bench_cold_start(repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", cold_start_script] + cold_start_artifacts,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        run["wall_seconds"] = time.perf_counter() - start
+        runs.append(run)
+
+    results = {}
+    result = summarize([run["wall_seconds"] for run in runs])
+    result["peak_memory_bytes"] = max(run["max_rss_bytes"] for run in runs)
+    result["errors"] = runs[-1]["errors"]
+    results["cold_start"] = result
+    results["cold_start[import]"] = summarize([run["import_seconds"] for run in runs])
+    for name in runs[-1]["artifacts"]:
+        results[f"cold_start[{name}]"] = summarize(
+            [run["artifacts"][name] for run in runs]
+        )
+    return results
+
+
+# Function to get the words synthetic texts are drawn from
+def get_vocabulary():
+    try:
+        from utils.artifacts import registry
+
+        dictionary = registry.get("dictionary")
+        return [dictionary[i] for i in range(len(dictionary))]
+    except Exception:
+        return fallback_vocabulary
+
+
+# Function to create a synthetic text of num_words words (Zipf-like frequencies)
+def synthetic_text(vocabulary, num_words, seed=0):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    words = rng.choices(vocabulary, weights=weights, k=num_words)
+    # Sentences of ~20 words, like abstracts
+    for i in range(20, num_words, 20):
+        words[i - 1] += "."
+    return " ".join(words).capitalize()
+
+
+# Function to get texts of the sample corpus, or None when it is not available
+def get_sample_texts():
+    if not os.path.exists(sample_corpus_path):
+        return None
+    import pandas as pd
+
+    column = (
+        "Abstract" if "Abstract" in pd.read_csv(sample_corpus_path, nrows=0) else "Text"
+    )
+    texts = pd.read_csv(sample_corpus_path, usecols=[column])[column]
+    texts = texts.dropna().astype(str)
+    return texts.sample(min(sample_size, len(texts)), random_state=42).tolist()
+
+
+# Function to get the inputs of the text benchmarks: name -> list of texts
+def get_inputs():
+    vocabulary = get_vocabulary()
+    inputs = {
+        f"synthetic-{size}": [
+            synthetic_text(vocabulary, size, seed=seed) for seed in range(5)
+        ]
+        for size in synthetic_sizes
+    }
+    sample_texts = get_sample_texts()
+    if sample_texts is not None:
+        inputs["sample"] = sample_texts
+    return inputs
+
+
+# Function returning a callable that processes the next text of texts on each call
+def cycle(fn, texts):
+    state = {"i": 0}
+
+    def call():
+        text = texts[state["i"] % len(texts)]
+        state["i"] += 1
+        return fn(text)
+
+    return call
+
+
+def bench_preprocessing(repeat, inputs):
+    from utils.nltk_resources import require, resources
+    from utils.preprocessing import single_text_preprocessing
+
+    try:
+        require(*resources)
+    except LookupError as e:
+        raise Skip(str(e).splitlines()[0])
+    return {
+        f"single_text_preprocessing[{name}]": measure(
+            cycle(single_text_preprocessing, texts), repeat
+        )
+        for name, texts in inputs.items()
+    }
+
+
+def load_or_skip(*names):
+    from utils.artifacts import registry
+
+    artifacts = []
+    for name in names:
+        try:
+            artifacts.append(registry.get(name))
+        except Exception as e:
+            raise Skip(f"{name} not available: {e!r}")
+    return artifacts
+
+
+def bench_lda(repeat, inputs):
+    from utils.prediction import predict_topic_lda
+
+    lda_model, _, _ = load_or_skip("lda_model", "dictionary", "nlp")
+    try:
+        predict_topic_lda(inputs["synthetic-10"][0], lda_model)
+    except LookupError as e:
+        raise Skip(str(e).splitlines()[0])
+    return {
+        f"predict_topic_lda[{name}]": measure(
+            cycle(lambda text: predict_topic_lda(text, lda_model), texts), repeat
+        )
+        for name, texts in inputs.items()
+    }
+
+
+def bench_bertopic(repeat, inputs):
+    from utils.prediction import predict_topic_bertopic
+
+    (bertopic_model,) = load_or_skip("bertopic_model")
+    return {
+        f"predict_topic_bertopic[{name}]": measure(
+            cycle(lambda text: predict_topic_bertopic(text, bertopic_model), texts),
+            repeat,
+        )
+        for name, texts in inputs.items()
+    }
+
+
+# Synthetic LDA output for one text: its tokens and per word topics
+def synthetic_per_word_topics(dictionary, text, num_topics, seed=0):
+    rng = random.Random(seed)
+    tokens = text.split()
+    word_ids = sorted(
+        {dictionary.token2id[t] for t in tokens if t in dictionary.token2id}
+    )
+    per_word_topics = [(word_id, [rng.randrange(num_topics)]) for word_id in word_ids]
+    return tokens, per_word_topics
+
+
+def bench_colored_text(repeat, inputs):
+    from utils.visualization import create_colored_text, create_word_topic_index
+
+    (dictionary,) = load_or_skip("dictionary")
+    results = {}
+    for name, texts in inputs.items():
+        tokens, per_word_topics = synthetic_per_word_topics(dictionary, texts[0], 11)
+        results[f"create_colored_text[{name}]"] = measure(
+            lambda: create_colored_text(tokens, dictionary, per_word_topics), repeat
+        )
+        results[f"create_word_topic_index[{name}]"] = measure(
+            lambda: create_word_topic_index(per_word_topics), repeat
+        )
+    return results
+
+
+# Synthetic document table (Year and topic of each document) for topic over time
+def synthetic_topic_df(num_docs=5000, num_topics=11, seed=0):
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    topic_ids = rng.integers(0, num_topics, num_docs)
+    return pd.DataFrame(
+        {
+            "Year": rng.integers(2010, 2025, num_docs),
+            "Top Topic ID": topic_ids,
+            "Top Topic Name": [f"{t}_topic_words" for t in topic_ids],
+        }
+    )
+
+
+def bench_visualization(repeat, inputs):
+    from utils import visualization
+
+    results = {}
+    try:
+        from utils.artifacts import registry
+
+        topic_trends = registry.get("topic_trends_lda")
+        topic_id = registry.get("topic_index_lda").best_topic
+    except Exception:
+        from utils.topic_counts import count_topic_years
+        from utils.topic_trends import build_topic_trends
+
+        topic_id = 0
+        topic_trends = build_topic_trends(count_topic_years(synthetic_topic_df()))
+    results["visualize_topic_over_time"] = measure(
+        lambda: visualization.visualize_topic_over_time(topic_id, topic_trends),
+        repeat,
+    )
+    results["visualize_topic_comparison"] = measure(
+        lambda: visualization.visualize_topic_comparison([0, 1, 2], topic_trends),
+        repeat,
+    )
+
+    distribution = sorted(
+        enumerate(np.random.default_rng(0).dirichlet(np.ones(11))),
+        key=lambda x: x[1],
+        reverse=True,
+    )
+    results["visualize_topic_distribution"] = measure(
+        lambda: visualization.visualize_topic_distribution(distribution), repeat
+    )
+    results["print_topic_colors"] = measure(
+        lambda: visualization.print_topic_colors(11), repeat
+    )
+
+    for model_type in ["lda", "bertopic"]:
+        try:
+            (topic_terms,) = load_or_skip(f"topic_terms_{model_type}")
+        except Skip as e:
+            results[f"visualize_top10words_{model_type}"] = {"skipped": str(e)}
+            results[f"visualize_wordcloud_{model_type}"] = {"skipped": str(e)}
+            continue
+        top10words = getattr(visualization, f"visualize_top10words_{model_type}")
+        wordcloud = getattr(visualization, f"visualize_wordcloud_{model_type}")
+        results[f"visualize_top10words_{model_type}"] = measure(
+            lambda: top10words(topic_terms, 0), repeat
+        )
+        # Wordclouds take seconds, a few runs are enough
+        results[f"visualize_wordcloud_{model_type}"] = measure(
+            lambda: wordcloud(topic_terms, 0), max(3, repeat // 10)
+        )
+    return results
+
+
+# Benchmark groups: name -> function(repeat, inputs) returning {benchmark: result}
+groups = {
+    "preprocessing": bench_preprocessing,
+    "lda": bench_lda,
+    "bertopic": bench_bertopic,
+    "colored_text": bench_colored_text,
+    "visualization": bench_visualization,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+# Function to run the selected benchmark groups and return the results document
+def run(only=None, repeat=30, cold_start_repeat=3):
+    only = only or ["cold_start"] + list(groups)
+    benchmarks = {}
+
+    # Cold start first, before this process warms any cache
+    if "cold_start" in only:
+        try:
+            benchmarks.update(bench_cold_start(cold_start_repeat))
+        except Exception as e:
+            benchmarks["cold_start"] = {"skipped": repr(e)}
+
+    inputs = get_inputs()
+    for name in only:
+        if name == "cold_start":
+            continue
+        print(f"Running {name}...", file=sys.stderr)
+        try:
+            benchmarks.update(groups[name](repeat, inputs))
+        except (Skip, ImportError) as e:
+            benchmarks[name] = {"skipped": str(e)}
+
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+            "inputs": {name: len(texts) for name, texts in inputs.items()},
+        },
+        "benchmarks": benchmarks,
+    }
+
+
+# Function to compare two results documents. Returns rows of
+# (benchmark, baseline, current, ratio, regressed) for the benchmarks of the
+# baseline. A benchmark missing or skipped in the current run (e.g. a model failed
+# to load) is a regression, with current and ratio None.
+def compare(baseline, current, metric="p50", threshold=0.2, memory_threshold=None):
+    rows = []
+    for name, base in baseline["benchmarks"].items():
+        if metric not in base:
+            continue
+        new = current["benchmarks"].get(name)
+        if new is None or metric not in new:
+            rows.append((name, base[metric], None, None, True))
+            continue
+        ratio = new[metric] / base[metric] if base[metric] else float("inf")
+        regressed = ratio > 1 + threshold
+        if memory_threshold is not None and base.get("peak_memory_bytes"):
+            memory_ratio = new.get("peak_memory_bytes", 0) / base["peak_memory_bytes"]
+            regressed = regressed or memory_ratio > 1 + memory_threshold
+        rows.append((name, base[metric], new[metric], ratio, regressed))
+    return rows
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the PREDTopic hot paths.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--output", default="benchmarks/results/latest.json")
+    run_parser.add_argument(
+        "--only",
+        help="comma separated groups: " + ",".join(["cold_start"] + list(groups)),
+    )
+    run_parser.add_argument("--repeat", type=int, default=30)
+    run_parser.add_argument("--cold-start-repeat", type=int, default=3)
+
+    compare_parser = subparsers.add_parser("compare", help="compare two runs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--metric", default="p50")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)"
+    )
+    compare_parser.add_argument(
+        "--memory-threshold", type=float, help="allowed peak memory increase"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        only = args.only.split(",") if args.only else None
+        results = run(only, args.repeat, args.cold_start_repeat)
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        for name, result in results["benchmarks"].items():
+            if "skipped" in result:
+                print(f"{name:<50} skipped: {result['skipped']}")
+            else:
+                print(f"{name:<50} p50 {result['p50'] * 1000:10.3f} ms")
+        print(f"Results written to {args.output}")
+        return 0
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    with open(args.current, "r") as f:
+        current = json.load(f)
+    rows = compare(
+        baseline, current, args.metric, args.threshold, args.memory_threshold
+    )
+    for name, base, new, ratio, regressed in rows:
+        if new is None:
+            result = current["benchmarks"].get(name)
+            reason = f"skipped: {result['skipped']}" if result else "missing"
+            print(f"{name:<50} {base * 1000:10.3f} ms -> {reason} REGRESSION")
+            continue
+        flag = "REGRESSION" if regressed else ""
+        print(
+            f"{name:<50} {base * 1000:10.3f} ms -> {new * 1000:10.3f} ms "
+            f"{ratio:6.2f}x {flag}"
+        )
+    regressions = [row for row in rows if row[-1]]
+    print(f"{len(regressions)} regression(s) out of {len(rows)} benchmarks")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
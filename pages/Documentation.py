@@ -1,40 +1,48 @@
 import streamlit as st
 
+from utils.artifacts import refresh_corpus, registry
+from utils.topic_trends import (
+    growth_table_markdown,
+    significant_change,
+    summary_table_markdown,
+)
+
 st.set_page_config(
     page_title="About | PREDTopic",
     page_icon=":bar_chart:",
     layout="wide",
 )
 
-# Set file path
-data_path = "data/"
-materials_path = "materials/documentation/"
-images_path = "materials/images/"
-
-# Load the Excel file
-app_layout_file = f"{materials_path}app_layout.md"
-with open(app_layout_file, "r") as f:
-    app_layout = f.read()
-
-feature_list_file1 = f"{materials_path}feature_list_1.md"
-with open(feature_list_file1, "r") as f:
-    feature_list1 = f.read()
-
-feature_list_file2 = f"{materials_path}feature_list_2.md"
-with open(feature_list_file2, "r") as f:
-    feature_list2 = f.read()
-
-about_models_file = f"{materials_path}about_models.md"
-with open(about_models_file, "r") as f:
-    about_models = f.read()
-
-trend_analysis_LDA_file = f"{materials_path}trend_analysis_LDA.md"
-with open(trend_analysis_LDA_file, "r") as f:
-    trend_analysis_LDA = f.read()
+# Documentation and images, from the asset bundle loaded once per process
+assets = registry.get("assets")
+app_layout = assets.document("app_layout")
+feature_list1 = assets.document("feature_list_1")
+feature_list2 = assets.document("feature_list_2")
+about_models = assets.document("about_models")
+trend_analysis_LDA = assets.document("trend_analysis_LDA")
+trend_analysis_BERTopic = assets.document("trend_analysis_BERTopic")
+
+# Trend cubes of both models, the trend tables below are generated from them
+refresh_corpus()
+topic_trends_lda = registry.get("topic_trends_lda")
+topic_trends_bertopic = registry.get("topic_trends_bertopic")
+num_documents = topic_trends_bertopic["Document_Count"].sum()
+first_year = topic_trends_bertopic["Year"].min()
+last_year = topic_trends_bertopic["Year"].max()
+num_years = last_year - first_year + 1
+
+
+# Function to display the generated trend tables of a model
+def display_trend_tables(topic_trends, figure):
+    with st.expander(f"Table {figure}: Documents and Year-over-Year Growth per Topic"):
+        st.markdown(
+            f"Number of documents per year (growth rate against the previous year, "
+            f"changes of {significant_change:.0%} or more in bold)."
+        )
+        st.markdown(growth_table_markdown(topic_trends))
+        st.markdown("Totals, average annual growth rate and significant changes.")
+        st.markdown(summary_table_markdown(topic_trends))
 
-trend_analysis_BERTopic_file = f"{materials_path}trend_analysis_BERTopic.md"
-with open(trend_analysis_BERTopic_file, "r") as f:
-    trend_analysis_BERTopic = f.read()
 
 # Header
 tab1, tab2, tab3, tab4, tab5 = st.tabs(
@@ -46,34 +54,36 @@ with tab1:
 
 with tab2:
     st.markdown(
-        """### Research Trends in Computer Science (2019-2023)
+        f"""### Research Trends in Computer Science ({first_year}-{last_year})
 
 #### Methodology
 
-The trend analysis was conducted using LDA and BERTopic models applied to 4,892 computer science research article metadata entries from Emerald Insight (2019-2023). We analyzed trends by calculating the number of publications per topic for each year and computing year-over-year growth rates using the formula: Growth Rate = (Current Year Count - Previous Year Count) / Previous Year Count. 
+The trend analysis was conducted using LDA and BERTopic models applied to {num_documents:,} computer science research article metadata entries from Emerald Insight ({first_year}-{last_year}). We analyzed trends by calculating the number of publications per topic for each year and computing year-over-year growth rates using the formula: Growth Rate = (Current Year Count - Previous Year Count) / Previous Year Count. 
 
-Average annual growth rates were determined for topics showing consistent trends. Significant changes were identified by noting topics with annual fluctuations of 20% or more. We also assessed each topic's overall importance by comparing its total publication count across all years. 
+Average annual growth rates were determined for topics showing consistent trends. Significant changes were identified by noting topics with annual fluctuations of {significant_change:.0%} or more. We also assessed each topic's overall importance by comparing its total publication count across all years. 
 
-This quantitative analysis was then interpreted within the context of broader trends in computer science and relevant global events, providing insights into the evolving landscape of computer science research over the five-year period.""",
+This quantitative analysis was then interpreted within the context of broader trends in computer science and relevant global events, providing insights into the evolving landscape of computer science research over the {num_years}-year period.""",
         unsafe_allow_html=True,
     )
     st.markdown("---", unsafe_allow_html=True)
     st.markdown("#### BERTopic Model Insights", unsafe_allow_html=True)
     st.image(
-        f"{images_path}heatmap_BERTopic.png",
+        assets.image("heatmap_BERTopic"),
         caption="Fig 2.1 Topic Trend Evolution Heatmap using BERTopic Model",
         use_column_width=True,
         output_format="PNG",
     )
+    display_trend_tables(topic_trends_bertopic, "2.1")
     st.markdown(trend_analysis_BERTopic, unsafe_allow_html=True)
     st.markdown("---", unsafe_allow_html=True)
     st.markdown("#### LDA Model Insights", unsafe_allow_html=True)
     st.image(
-        f"{images_path}heatmap_LDA.png",
+        assets.image("heatmap_LDA"),
         caption="Fig 2.2 Topic Trend Evolution Heatmap using LDA Model",
         use_column_width=True,
         output_format="PNG",
     )
+    display_trend_tables(topic_trends_lda, "2.2")
     st.markdown(trend_analysis_LDA, unsafe_allow_html=True)
     st.markdown(
         """--- 
@@ -91,7 +101,7 @@ with tab3:
         st.markdown(app_layout, unsafe_allow_html=True)
     with col2:
         st.image(
-            f"{images_path}app_features.png",
+            assets.image("app_features"),
             caption="Fig 3.1 PREDTopic Features",
             use_column_width=True,
             output_format="PNG",
@@ -113,7 +123,7 @@ When you first launch PREDTopic, it will automatically load the data and display
         unsafe_allow_html=True,
     )
     st.image(
-        f"{images_path}default_view.png",
+        assets.image("default_view"),
         caption="Fig 4.1 Default View of The Main Page",
         use_column_width=True,
         output_format="PNG",
@@ -127,7 +137,7 @@ When you first launch PREDTopic, it will automatically load the data and display
             unsafe_allow_html=True,
         )
         st.image(
-            f"{images_path}model_options.png",
+            assets.image("model_options"),
             caption="Fig 4.2 Choosing a Topic Model",
             use_column_width=True,
             output_format="PNG",
@@ -140,7 +150,7 @@ When you first launch PREDTopic, it will automatically load the data and display
             unsafe_allow_html=True,
         )
         st.image(
-            f"{images_path}topic_options.png",
+            assets.image("topic_options"),
             caption="Fig 4.3 Choosing a Topic Based on The Selected Model",
             use_column_width=True,
             output_format="PNG",
@@ -155,7 +165,7 @@ When you first launch PREDTopic, it will automatically load the data and display
             unsafe_allow_html=True,
         )
         st.image(
-            f"{images_path}input_text.png",
+            assets.image("input_text"),
             caption="Fig 4.4 Input Text Describing Research Idea and Choose Model for Prediction",
             use_column_width=True,
             output_format="PNG",
@@ -168,7 +178,7 @@ When you first launch PREDTopic, it will automatically load the data and display
             unsafe_allow_html=True,
         )
         st.image(
-            f"{images_path}prediction_BERTopic.png",
+            assets.image("prediction_BERTopic"),
             caption="Fig 4.5 Prediction Result by BERTopic Model",
             use_column_width=True,
             output_format="PNG",
@@ -178,7 +188,7 @@ When you first launch PREDTopic, it will automatically load the data and display
             unsafe_allow_html=True,
         )
         st.image(
-            f"{images_path}prediction_LDA.png",
+            assets.image("prediction_LDA"),
             caption="Fig 4.6 Prediction Result by LDA Model",
             use_column_width=True,
             output_format="PNG",
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+
+# The app imports the registry on every start: heavy modules load on first use
+def test_registry_import_loads_nothing_heavy():
+    heavy = ["scipy", "gensim", "bertopic", "spacy", "utils.lda_inference"]
+    code = (
+        "import sys, utils.artifacts; "
+        f"print(','.join(m for m in {heavy!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    assert result.stdout.strip() == ""
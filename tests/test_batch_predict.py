@@ -0,0 +1,27 @@
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.batch_predict import ChunkWriter
+
+
+def test_parquet_chunks_keep_the_first_schema(tmp_path):
+    output_path = str(tmp_path / "predictions.parquet")
+    writer = ChunkWriter(output_path)
+    writer.write(pd.DataFrame({"Title": ["a", "b"], "Year": [2020, 2021]}))
+    # All-null and float columns would otherwise be inferred as other types
+    writer.write(pd.DataFrame({"Title": [None, None], "Year": [2022.0, 2023.0]}))
+    writer.close()
+
+    table = pq.read_table(output_path)
+    assert table.schema.field("Year").type == "int64"
+    assert table.column("Title").to_pylist() == ["a", "b", None, None]
+    assert table.column("Year").to_pylist() == [2020, 2021, 2022, 2023]
+
+
+def test_csv_chunks_have_one_header(tmp_path):
+    output_path = str(tmp_path / "predictions.csv")
+    writer = ChunkWriter(output_path)
+    writer.write(pd.DataFrame({"Title": ["a"]}))
+    writer.write(pd.DataFrame({"Title": ["b"]}))
+    writer.close()
+    assert pd.read_csv(output_path)["Title"].tolist() == ["a", "b"]
@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+from utils.batching import MicroBatcher
+
+
+def submit_concurrently(batcher, items):
+    results = [None] * len(items)
+    errors = [None] * len(items)
+
+    def submit(i):
+        try:
+            results[i] = batcher.submit(items[i])
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(items))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+        assert not thread.is_alive(), "a caller never got its result"
+    return results, errors
+
+
+def test_each_caller_gets_its_own_result():
+    batcher = MicroBatcher(lambda items: [item * 2 for item in items], max_wait_ms=50)
+    results, errors = submit_concurrently(batcher, list(range(8)))
+    assert results == [item * 2 for item in range(8)]
+    assert errors == [None] * 8
+
+
+def test_flush_on_size():
+    sizes = []
+
+    def process_batch(items):
+        sizes.append(len(items))
+        return items
+
+    # A wait far longer than the test: batches can only be flushed by size
+    batcher = MicroBatcher(process_batch, max_batch_size=4, max_wait_ms=60_000)
+    results, _ = submit_concurrently(batcher, list(range(8)))
+    assert results == list(range(8))
+    assert sizes == [4, 4]
+    assert batcher.stats()["batch_size_counts"] == {4: 2}
+
+
+def test_flush_on_timeout():
+    batcher = MicroBatcher(lambda items: items, max_batch_size=32, max_wait_ms=20)
+    start = time.perf_counter()
+    assert batcher.submit("only") == "only"
+    assert time.perf_counter() - start < 2
+    assert batcher.stats()["batch_size_counts"] == {1: 1}
+
+
+def test_errors_reach_every_caller():
+    def process_batch(items):
+        raise ValueError("model failed")
+
+    batcher = MicroBatcher(process_batch, max_wait_ms=20)
+    with pytest.raises(ValueError, match="model failed"):
+        batcher.submit("text")
+
+
+def test_fewer_results_than_items_is_an_error():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=3, max_wait_ms=50)
+    results, errors = submit_concurrently(batcher, ["a", "b", "c"])
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert results == [None, None, None]
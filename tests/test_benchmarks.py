@@ -0,0 +1,26 @@
+from benchmarks.run import compare
+
+
+def results(**benchmarks):
+    return {"benchmarks": benchmarks}
+
+
+def test_compare_flags_slowdowns():
+    baseline = results(fast={"p50": 0.010}, slow={"p50": 0.010})
+    current = results(fast={"p50": 0.011}, slow={"p50": 0.013})
+    rows = {row[0]: row for row in compare(baseline, current, threshold=0.2)}
+    assert not rows["fast"][-1]
+    assert rows["slow"][-1]
+    assert round(rows["slow"][3], 6) == 1.3
+
+
+def test_compare_fails_skipped_and_missing_benchmarks():
+    baseline = results(
+        skipped={"p50": 0.01}, missing={"p50": 0.01}, new_skip={"skipped": "no model"}
+    )
+    current = results(skipped={"skipped": "model failed to load"}, new_skip={"p50": 1})
+    rows = compare(baseline, current)
+    assert rows == [
+        ("skipped", 0.01, None, None, True),
+        ("missing", 0.01, None, None, True),
+    ]
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from gensim.corpora import Dictionary
+from gensim.models import LdaModel
+
+from utils.lda_inference import (
+    LdaInference,
+    bows_to_csr,
+    infer_distributions,
+    synthetic_bows,
+    tokens_to_csr,
+)
+
+
+# A small model trained on documents of three clearly separated vocabularies
+@pytest.fixture(scope="module")
+def lda_model():
+    rng = np.random.default_rng(0)
+    vocabularies = [[f"{name}{i}" for i in range(20)] for name in ["a", "b", "c"]]
+    texts = [list(rng.choice(vocabularies[i % 3], size=40)) for i in range(150)]
+    dictionary = Dictionary(texts)
+    corpus = [dictionary.doc2bow(text) for text in texts]
+    return LdaModel(corpus, id2word=dictionary, num_topics=3, passes=5, random_state=0)
+
+
+def expected_distributions(lda_model, bows):
+    gamma, _ = lda_model.inference(bows)
+    return gamma / gamma.sum(axis=1, keepdims=True)
+
+
+def test_distributions_match_gensim(lda_model):
+    bows = synthetic_bows(lda_model, 200)
+    engine = LdaInference.from_lda(lda_model)
+    actual = engine.distributions(bows_to_csr(bows, lda_model.num_terms))
+    expected = expected_distributions(lda_model, bows)
+
+    assert actual.shape == (200, 3)
+    assert np.allclose(actual.sum(axis=1), 1, atol=1e-5)
+    assert np.abs(actual - expected).mean() < 0.001
+    assert (actual.argmax(axis=1) == expected.argmax(axis=1)).mean() >= 0.99
+
+
+def test_distributions_are_deterministic(lda_model):
+    counts = bows_to_csr(synthetic_bows(lda_model, 20), lda_model.num_terms)
+    engine = LdaInference.from_lda(lda_model, seed=3)
+    assert np.array_equal(engine.distributions(counts), engine.distributions(counts))
+
+
+def test_tokens_to_csr_matches_bows(lda_model):
+    token2id = lda_model.id2word.token2id
+    tokens = ["a1", "a1", "b2", "unknown"]
+    counts = tokens_to_csr([tokens], token2id)
+    expected = bows_to_csr([lda_model.id2word.doc2bow(tokens)], len(token2id))
+    assert (counts != expected).nnz == 0
+
+
+def test_serial_when_one_shard(lda_model):
+    engine = LdaInference.from_lda(lda_model)
+    counts = bows_to_csr(synthetic_bows(lda_model, 10), lda_model.num_terms)
+    # Fewer documents than a shard: no process pool is started
+    assert np.array_equal(
+        infer_distributions(engine, counts, n_jobs=4),
+        engine.distributions(counts),
+    )
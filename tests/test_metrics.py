@@ -0,0 +1,39 @@
+import os
+import threading
+
+from utils import metrics
+
+
+def test_concurrent_metrics_file_writes(tmp_path):
+    path = str(tmp_path / "predtopic.prom")
+    errors = []
+
+    def write():
+        try:
+            for _ in range(20):
+                metrics.write_metrics_file(path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert os.listdir(tmp_path) == ["predtopic.prom"]
+    with open(path, "r") as f:
+        assert f.read().endswith("\n")
+
+
+def test_finish_rerun_survives_metrics_file_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    monkeypatch.setattr(
+        metrics, "metrics_file_path", str(tmp_path / "missing" / "predtopic.prom")
+    )
+    metrics.start_rerun(record=True)
+    with metrics.stage("figure", model="LDA"):
+        pass
+    timings = metrics.finish_rerun()
+    assert [timing["stage"] for timing in timings] == ["figure"]
@@ -0,0 +1,100 @@
+import pickle
+
+from utils.prediction_cache import PredictionCache, normalize_text
+
+
+def test_key_normalization():
+    key = PredictionCache.make_key("LDA", "v1", "Deep  learning\tfor\nsearch ")
+    assert key == PredictionCache.make_key("LDA", "v1", "Deep learning for search")
+    # NFKC: full-width characters match their ASCII forms
+    assert normalize_text("ＡＩ") == "AI"
+    assert key != PredictionCache.make_key("LDA", "v2", "Deep learning for search")
+    assert key != PredictionCache.make_key("BERTopic", "v1", "Deep learning for search")
+    assert key != PredictionCache.make_key("LDA", "v1", "deep learning for search")
+
+
+def test_get_or_compute_computes_once():
+    cache = PredictionCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return (3, 0.5)
+
+    assert cache.get_or_compute("LDA", "v1", "text", compute) == (3, 0.5)
+    assert cache.get_or_compute("LDA", "v1", " text ", compute) == (3, 0.5)
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used_entry():
+    cache = PredictionCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_by_size():
+    value = "x" * 1000
+    entry_size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = PredictionCache(max_bytes=2 * entry_size)
+    for key in ["a", "b", "c"]:
+        cache.put(key, value)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] == 2 * entry_size
+    assert cache.get("a") is None
+
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    disk_path = str(tmp_path / "predictions.sqlite")
+    cache = PredictionCache(disk_path=disk_path)
+    cache.put("a", {"topic_id": 1})
+
+    restarted = PredictionCache(disk_path=disk_path)
+    assert restarted.stats()["entries"] == 0
+    assert restarted.get("a") == {"topic_id": 1}
+    assert restarted.stats()["disk_hits"] == 1
+    # Now also in memory
+    assert restarted.get("a") == {"topic_id": 1}
+    assert restarted.stats()["hits"] == 1
+
+
+def test_sqlite_tier_keeps_evicted_entries(tmp_path):
+    cache = PredictionCache(max_entries=1, disk_path=str(tmp_path / "cache.sqlite"))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    assert cache.stats()["disk_hits"] == 1
+
+
+def disk_keys(cache):
+    return sorted(row[0] for row in cache._disk.execute("SELECT key FROM predictions"))
+
+
+def test_sqlite_tier_evicts_least_recently_used_rows(tmp_path):
+    cache = PredictionCache(
+        max_entries=1, disk_path=str(tmp_path / "cache.sqlite"), max_disk_entries=2
+    )
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # read from disk: "b" is now the least recently used
+    cache.put("c", 3)
+    assert disk_keys(cache) == ["a", "c"]
+    assert cache.stats()["disk_evictions"] == 1
+
+
+def test_sqlite_tier_evicts_by_size(tmp_path):
+    value = "x" * 1000
+    entry_size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = PredictionCache(
+        disk_path=str(tmp_path / "cache.sqlite"), max_disk_bytes=2 * entry_size
+    )
+    for key in ["a", "b", "c"]:
+        cache.put(key, value)
+    assert disk_keys(cache) == ["b", "c"]
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from utils.search_index import (
+    SearchIndex,
+    build_postings,
+    load_search_index,
+    save,
+)
+from utils.topic_index import source_signature
+
+token_lists = [
+    ["topic", "model", "topic"],
+    ["neural", "network", "model"],
+    ["topic", "trend"],
+    ["network", "graph", "network", "network"],
+]
+
+
+def test_build_postings():
+    vocabulary, arrays = build_postings(token_lists)
+    assert vocabulary == sorted(vocabulary)
+    assert arrays["doc_lengths"].tolist() == [3, 3, 2, 4]
+
+    term_id = vocabulary.index("topic")
+    start, end = arrays["offsets"][term_id], arrays["offsets"][term_id + 1]
+    assert arrays["doc_ids"][start:end].tolist() == [0, 2]
+    assert arrays["term_freqs"][start:end].tolist() == [2, 1]
+    assert arrays["offsets"][-1] == len(arrays["doc_ids"])
+
+
+def save_index(path, source_paths):
+    vocabulary, arrays = build_postings(token_lists)
+    arrays["years"] = np.array([2019, 2020, 2021, 2022], dtype=np.int16)
+    arrays["topics_lda"] = np.array([0, 1, 0, 1], dtype=np.int16)
+    arrays["topics_bertopic"] = np.array([5, 6, 5, 7], dtype=np.int16)
+    meta = {
+        "k1": 1.5,
+        "b": 0.75,
+        "title_weight": 2,
+        "avg_doc_length": float(arrays["doc_lengths"].mean()),
+        "source_signature": source_signature(source_paths),
+    }
+    save(str(path), vocabulary, arrays, meta)
+
+
+@pytest.fixture
+def source_paths(tmp_path):
+    source = tmp_path / "topic_df.arrow"
+    source.write_bytes(b"table")
+    return [str(source)]
+
+
+@pytest.fixture
+def index(tmp_path, source_paths):
+    save_index(tmp_path / "index", source_paths)
+    return SearchIndex.open(str(tmp_path / "index"))
+
+
+def test_search_ranks_by_bm25(index):
+    doc_ids, scores = index.search(["topic"])
+    # Document 0 has the term twice
+    assert doc_ids.tolist() == [0, 2]
+    assert scores[0] > scores[1] > 0
+
+    doc_ids, _ = index.search(["network", "model"], k=1)
+    assert doc_ids.tolist() == [1]
+
+
+def test_search_filters(index):
+    doc_ids, _ = index.search(["network"], model_type="bertopic", topic_ids=[7])
+    assert doc_ids.tolist() == [3]
+    doc_ids, _ = index.search(["network"], model_type="lda", topic_ids=[0])
+    assert doc_ids.tolist() == []
+    doc_ids, _ = index.search(["topic", "model"], years=(2020, 2021))
+    assert sorted(doc_ids.tolist()) == [1, 2]
+
+
+def test_empty_query(index):
+    for tokens in [[], ["unknown"]]:
+        doc_ids, scores = index.search(tokens)
+        assert len(doc_ids) == 0
+        assert len(scores) == 0
+
+
+def test_load_checks_source_signature(tmp_path, source_paths):
+    path = str(tmp_path / "index")
+    assert load_search_index(path, source_paths) is None  # not built
+
+    save_index(path, source_paths)
+    assert load_search_index(path, source_paths).num_docs == 4
+
+    # The topic table changed after the index was built
+    with open(source_paths[0], "ab") as f:
+        f.write(b" and ingested papers")
+    assert load_search_index(path, source_paths) is None
+    assert load_search_index(path).num_docs == 4
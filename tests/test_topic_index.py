@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from utils.topic_index import TopicIndex, build_topic_index
+
+
+def make_topic_df():
+    return pd.DataFrame(
+        {
+            "Top Topic ID": [1, 0, 1, 1, 0, 3, 1],
+            "Top Topic Probability": [0.5, 0.9, 0.8, 0.7, 0.4, 0.6, 0.9],
+            "Top Topic Name": ["b", "a", "b", "b", "a", "d", "b2"],
+        },
+        index=[10, 11, 12, 13, 14, 15, 16],
+    )
+
+
+def test_positions_sorted_by_probability():
+    topic_index = build_topic_index(make_topic_df(), k=2)
+    assert topic_index.positions(1).tolist() == [6, 2, 3, 0]
+    assert topic_index.positions(0).tolist() == [1, 4]
+    assert topic_index.count(1) == 4
+    assert topic_index.name(1) == "b"
+    assert topic_index.best_topic == 1
+
+
+def test_representatives_most_probable():
+    topic_index = build_topic_index(make_topic_df(), k=2)
+    assert topic_index.representatives(1).tolist() == [6, 2]
+    # Fewer documents than k
+    assert topic_index.representatives(3).tolist() == [5]
+
+
+def test_representatives_sampled_with_fixed_seed():
+    topic_df = make_topic_df()
+    first = build_topic_index(topic_df, k=2, sample_representatives=True)
+    second = build_topic_index(topic_df, k=2, sample_representatives=True)
+    chosen = first.representatives(1)
+    assert chosen.tolist() == second.representatives(1).tolist()
+    assert len(chosen) == 2
+    assert set(chosen) <= set(first.positions(1).tolist())
+
+
+def test_topic_without_documents_is_empty():
+    topic_index = build_topic_index(make_topic_df(), k=2)
+    assert topic_index.positions(2).tolist() == []
+    assert topic_index.count(2) == 0
+    assert topic_index.representatives(2).tolist() == []
+    assert topic_index.name(2) == ""
+
+
+def test_save_and_load(tmp_path):
+    topic_index = build_topic_index(make_topic_df(), k=2, signature="sig")
+    path = tmp_path / "topic_index.npz"
+    topic_index.save(path)
+    loaded = TopicIndex.load(path)
+    assert loaded.signature == "sig"
+    assert loaded.best_topic_name == topic_index.best_topic_name
+    for topic_id in [0, 1, 2, 3]:
+        assert np.array_equal(
+            loaded.positions(topic_id), topic_index.positions(topic_id)
+        )
@@ -0,0 +1,31 @@
+import json
+
+import numpy as np
+
+from utils.topic_terms import TopicTermIndex
+
+
+def test_top_terms_most_weighted_first():
+    weights = np.array([[0.1, 0.5, 0.2, 0.2], [0.4, 0.0, 0.1, 0.5]])
+    index = TopicTermIndex(weights, ["a", "b", "c", "d"], topn=3)
+    assert index.num_topics == 2
+    assert index.top_terms(0, topn=2)[0] == ("b", 0.5)
+    assert [word for word, _ in index.top_terms(1)] == ["d", "a", "c"]
+    # No more than topn terms are kept
+    assert len(index.top_terms(1, topn=10)) == 3
+
+
+def test_from_bertopic_representations(tmp_path):
+    representations = {
+        "-1": [["noise", 0.9]],
+        "0": [["topic", 0.3], ["model", 0.2]],
+        "1": [["graph", 0.4]],
+    }
+    with open(tmp_path / "topics.json", "w") as f:
+        json.dump({"topic_representations": representations}, f)
+
+    index = TopicTermIndex.from_bertopic_representations(str(tmp_path))
+    assert index.num_topics == 2
+    assert index.top_terms(0) == [("topic", 0.3), ("model", 0.2)]
+    # Words of other topics are not ranked
+    assert index.top_terms(1) == [("graph", 0.4)]
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from utils.topic_trends import (
+    build_topic_trends,
+    read_topic_trends,
+    save_topic_trends,
+    summarize_topic_trends,
+    trend_columns,
+)
+
+
+def make_topic_year_counts():
+    # Topic 1 has no documents in 2021
+    return pd.DataFrame(
+        {
+            "Year": [2020, 2021, 2022, 2020, 2022, 2023],
+            "Top Topic ID": [0, 0, 0, 1, 1, 1],
+            "Top Topic Name": ["a", "a", "a", "b", "b", "b"],
+            "Document_Count": [10, 11, 20, 5, 4, 2],
+        }
+    )
+
+
+def trend(topic_trends, topic_id, year):
+    rows = topic_trends[
+        (topic_trends["Top Topic ID"] == topic_id) & (topic_trends["Year"] == year)
+    ]
+    assert len(rows) == 1
+    return rows.iloc[0]
+
+
+def test_one_row_per_topic_and_year():
+    topic_trends = build_topic_trends(make_topic_year_counts())
+    assert list(topic_trends.columns) == trend_columns
+    assert len(topic_trends) == 2 * 4
+    assert trend(topic_trends, 1, 2021)["Document_Count"] == 0
+    assert trend(topic_trends, 0, 2023)["Document_Count"] == 0
+    assert trend(topic_trends, 1, 2021)["Top Topic Name"] == "b"
+
+
+def test_growth_rate():
+    topic_trends = build_topic_trends(make_topic_year_counts())
+    # First year and years after a zero count have no growth rate
+    assert np.isnan(trend(topic_trends, 0, 2020)["Growth_Rate"])
+    assert np.isnan(trend(topic_trends, 1, 2022)["Growth_Rate"])
+    assert np.isclose(trend(topic_trends, 0, 2021)["Growth_Rate"], 0.1)
+    assert np.isclose(trend(topic_trends, 0, 2022)["Growth_Rate"], 9 / 11)
+    assert trend(topic_trends, 0, 2023)["Growth_Rate"] == -1
+    assert trend(topic_trends, 1, 2021)["Growth_Rate"] == -1
+    assert trend(topic_trends, 1, 2023)["Growth_Rate"] == -0.5
+
+
+def test_significant_changes():
+    topic_trends = build_topic_trends(make_topic_year_counts())
+    assert not trend(topic_trends, 0, 2020)["Significant"]
+    assert not trend(topic_trends, 0, 2021)["Significant"]  # +10%
+    assert trend(topic_trends, 0, 2022)["Significant"]
+    assert trend(topic_trends, 1, 2023)["Significant"]  # -50%
+
+
+def test_share_of_year():
+    topic_trends = build_topic_trends(make_topic_year_counts())
+    assert np.isclose(trend(topic_trends, 0, 2020)["Share"], 10 / 15)
+    assert trend(topic_trends, 0, 2021)["Share"] == 1
+    assert trend(topic_trends, 1, 2023)["Share"] == 1
+
+
+def test_summary():
+    summary = summarize_topic_trends(build_topic_trends(make_topic_year_counts()))
+    assert summary["Top Topic ID"].tolist() == [0, 1]
+    assert summary["Total"].tolist() == [41, 11]
+    assert np.isclose(summary["Share_Of_Corpus"].sum(), 1)
+
+
+def test_save_and_read(tmp_path):
+    topic_trends = build_topic_trends(make_topic_year_counts())
+    path = str(tmp_path / "trends.json")
+    save_topic_trends(path, topic_trends, "sig")
+    loaded, signature = read_topic_trends(path)
+    assert signature == "sig"
+    pd.testing.assert_frame_equal(
+        loaded, topic_trends.reset_index(drop=True), check_dtype=False
+    )
@@ -0,0 +1,58 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils import wordcloud_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(wordcloud_cache, "wordcloud_path", str(tmp_path))
+    monkeypatch.setattr(wordcloud_cache, "_images", {})
+    return tmp_path
+
+
+def read_manifest(cache_dir):
+    with open(cache_dir / "LDA" / "manifest.json", "r") as f:
+        return json.load(f)
+
+
+def test_concurrent_writes_keep_every_topic(cache_dir):
+    def write(topic_id):
+        wordcloud_cache._write_image("LDA", "v1", topic_id, b"png %d" % topic_id)
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(write, range(40)))
+
+    assert read_manifest(cache_dir) == {
+        "model_version": "v1",
+        "topics": list(range(40)),
+    }
+    assert (cache_dir / "LDA" / "topic_7.png").read_bytes() == b"png 7"
+    assert not [name for name in os.listdir(cache_dir / "LDA") if name.endswith(".tmp")]
+
+
+def test_new_model_version_resets_the_manifest(cache_dir):
+    wordcloud_cache._write_image("LDA", "v1", 0, b"old")
+    wordcloud_cache._write_image("LDA", "v2", 1, b"new")
+    assert read_manifest(cache_dir) == {"model_version": "v2", "topics": [1]}
+
+
+def test_images_are_rendered_once(cache_dir, monkeypatch):
+    renders = []
+
+    def render(model_type, topic_id):
+        renders.append(topic_id)
+        return b"png"
+
+    monkeypatch.setattr(wordcloud_cache, "get_model_version", lambda model: "v1")
+    monkeypatch.setattr(wordcloud_cache, "render_wordcloud_png", render)
+    assert wordcloud_cache.get_wordcloud_png("LDA", 3) == b"png"
+    assert wordcloud_cache.get_wordcloud_png("LDA", 3) == b"png"
+
+    # A new process reads the stored image
+    monkeypatch.setattr(wordcloud_cache, "_images", {})
+    assert wordcloud_cache.get_wordcloud_png("LDA", 3) == b"png"
+    assert renders == [3]
@@ -0,0 +1,457 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from utils.asset_bundle import load_asset_bundle
+from utils.corpus_store import CorpusTable, view_columns
+from utils.metrics import stage
+from utils.topic_counts import load_topic_year_counts
+from utils.topic_index import load_topic_index, source_signature
+from utils.topic_terms import TopicTermIndex
+from utils.topic_trends import load_topic_trends
+
+logger = logging.getLogger(__name__)
+
+# Set file path
+data_path = "data/"
+lda_model_path = "models/lda_model/"
+bertopic_model_path = "models/bertopic_model"
+best_lda_model_path = f"{lda_model_path}best_lda_model"
+topic_table_lda_path = f"{data_path}topic_table_LDA-BoW.arrow"
+topic_table_bertopic_path = f"{data_path}topic_table_BERTopic.arrow"
+# Papers appended by python -m utils.ingest, as Arrow segments of the topic tables
+segments_path = f"{data_path}segments/"
+ingest_manifest_path = f"{segments_path}manifest.json"
+topic_year_counts_lda_path = f"{data_path}topic_year_counts_LDA-BoW.json"
+topic_year_counts_bertopic_path = f"{data_path}topic_year_counts_BERTopic.json"
+topic_trends_lda_path = f"{data_path}topic_trends_LDA-BoW.json"
+topic_trends_bertopic_path = f"{data_path}topic_trends_BERTopic.json"
+# Modification time of the manifest when the topic tables were loaded (False: not loaded)
+_corpus_version = {"loaded": False}
+
+# Model files, used to version anything derived from a model
+lda_model_files = [
+    best_lda_model_path,
+    f"{best_lda_model_path}.expElogbeta.npy",
+    f"{best_lda_model_path}.id2word",
+    f"{best_lda_model_path}.state",
+]
+bertopic_model_files = [
+    f"{bertopic_model_path}/config.json",
+    f"{bertopic_model_path}/ctfidf.safetensors",
+    f"{bertopic_model_path}/ctfidf_config.json",
+    f"{bertopic_model_path}/topic_embeddings.safetensors",
+    f"{bertopic_model_path}/topics.json",
+]
+
+
+# Function to get the resident memory of the current process in bytes (None if unknown)
+def current_rss():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Process-wide store that loads each artifact once, on first use.
+# Streamlit re-executes the app script on every interaction, but imported modules
+# stay in memory, so the registry below is shared by every rerun and every session.
+class ArtifactRegistry:
+    def __init__(self):
+        self._loaders = {}
+        self._locks = {}
+        self._artifacts = {}
+        self._stats = {}
+
+    def register(self, name, loader):
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+
+    def is_loaded(self, name):
+        return name in self._artifacts
+
+    # Function to drop loaded artifacts, so they are loaded again on next use
+    # (callers still holding the old objects keep using them)
+    def invalidate(self, *names):
+        for name in names:
+            with self._locks[name]:
+                self._artifacts.pop(name, None)
+                self._stats.pop(name, None)
+
+    def get(self, name):
+        if name in self._artifacts:
+            return self._artifacts[name]
+        if name not in self._loaders:
+            raise KeyError(f"Unknown artifact: {name}")
+
+        # One lock per artifact, so loaders may depend on other artifacts
+        with self._locks[name]:
+            if name not in self._artifacts:
+                rss_before = current_rss()
+                start = time.perf_counter()
+                with stage("artifact_load", artifact=name):
+                    artifact = self._loaders[name]()
+                elapsed = time.perf_counter() - start
+                rss_after = current_rss()
+
+                memory = None
+                if rss_before is not None and rss_after is not None:
+                    memory = max(rss_after - rss_before, 0)
+                self._stats[name] = {
+                    "load_seconds": elapsed,
+                    "memory_bytes": memory,
+                    "loaded_at": time.time(),
+                }
+                self._artifacts[name] = artifact
+                logger.info(
+                    "Loaded artifact %s in %.3fs (%s bytes)", name, elapsed, memory
+                )
+        return self._artifacts[name]
+
+    def stats(self):
+        # Timing and memory are inclusive of artifacts loaded as dependencies
+        rows = []
+        for name in self._loaders:
+            row = {"artifact": name, "loaded": self.is_loaded(name)}
+            row.update(self._stats.get(name, {}))
+            rows.append(row)
+        return rows
+
+
+# LOADERS
+
+
+# Load prepared documents
+def load_data_df():
+    return pd.read_csv(f"{data_path}prepared_data.csv")
+
+
+# Read LDA-clustered documents and merge with dataset
+def read_topic_df_lda_csv():
+    topic_df_lda = pd.read_csv(f"{data_path}topic_probabilities_LDA-BoW.csv")
+    return topic_df_lda.join(
+        registry.get("data_df").drop(columns=["DOI", "Year", "Title", "Text"]),
+        how="left",
+    )
+
+
+# Read BERTopic-clustered documents and merge with dataset
+def read_topic_df_bertopic_csv():
+    topic_df_bertopic = pd.read_csv(f"{data_path}topic_documents_BERTopic.csv")
+    topic_df_bertopic = topic_df_bertopic.join(
+        registry.get("data_df").drop(columns=["DOI", "Year", "Title", "Text"]),
+        how="left",
+    )
+    # fill probability value same for all data in BERTopic model,
+    # since this model does not provide probability for each document.
+    topic_df_bertopic["Top Topic Probability"] = 1
+    return topic_df_bertopic
+
+
+# Function to read the manifest of ingested segments
+def read_ingest_manifest():
+    if not os.path.exists(ingest_manifest_path):
+        return {"version": 0, "segments": {"lda": [], "bertopic": []}}
+    with open(ingest_manifest_path, "r") as f:
+        return json.load(f)
+
+
+def manifest_mtime():
+    try:
+        return os.stat(ingest_manifest_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+# Function to get the ingested segment files of a model's topic table
+def segment_paths(model_type):
+    _corpus_version["loaded"] = manifest_mtime()
+    segments = read_ingest_manifest()["segments"][model_type]
+    return [os.path.join(segments_path, segment) for segment in segments]
+
+
+# Load topic tables, memory-mapped from Arrow when converted
+# (python -m utils.corpus_store convert), otherwise read from the CSVs
+def load_topic_table_lda():
+    segments = segment_paths("lda")
+    if os.path.exists(topic_table_lda_path):
+        return CorpusTable.open(topic_table_lda_path, segments)
+    return CorpusTable.from_frame(
+        read_topic_df_lda_csv(),
+        [
+            f"{data_path}prepared_data.csv",
+            f"{data_path}topic_probabilities_LDA-BoW.csv",
+        ],
+    )
+
+
+def load_topic_table_bertopic():
+    segments = segment_paths("bertopic")
+    if os.path.exists(topic_table_bertopic_path):
+        return CorpusTable.open(topic_table_bertopic_path, segments)
+    return CorpusTable.from_frame(
+        read_topic_df_bertopic_csv(),
+        [
+            f"{data_path}prepared_data.csv",
+            f"{data_path}topic_documents_BERTopic.csv",
+        ],
+    )
+
+
+# Load the columns used by topic views (documents are read per row from the tables)
+def load_topic_df_lda():
+    return registry.get("topic_table_lda").frame(view_columns)
+
+
+def load_topic_df_bertopic():
+    return registry.get("topic_table_bertopic").frame(view_columns)
+
+
+# Load per-topic document indexes (stored in data/, rebuilt when the tables change)
+def load_topic_index_lda():
+    return load_topic_index(
+        f"{data_path}topic_index_LDA-BoW.npz",
+        registry.get("topic_table_lda").source_paths,
+        lambda: registry.get("topic_df_lda"),
+    )
+
+
+def load_topic_index_bertopic():
+    return load_topic_index(
+        f"{data_path}topic_index_BERTopic.npz",
+        registry.get("topic_table_bertopic").source_paths,
+        lambda: registry.get("topic_df_bertopic"),
+        sample_representatives=True,
+    )
+
+
+# Load document counts per year and topic (updated incrementally by ingestion)
+def load_topic_year_counts_lda():
+    return load_topic_year_counts(
+        topic_year_counts_lda_path,
+        registry.get("topic_table_lda").source_paths,
+        lambda: registry.get("topic_df_lda"),
+    )
+
+
+def load_topic_year_counts_bertopic():
+    return load_topic_year_counts(
+        topic_year_counts_bertopic_path,
+        registry.get("topic_table_bertopic").source_paths,
+        lambda: registry.get("topic_df_bertopic"),
+    )
+
+
+# Load trend cubes (counts, shares and growth rates per year and topic)
+def load_topic_trends_lda():
+    return load_topic_trends(
+        topic_trends_lda_path,
+        registry.get("topic_table_lda").source_paths,
+        lambda: registry.get("topic_year_counts_lda"),
+    )
+
+
+def load_topic_trends_bertopic():
+    return load_topic_trends(
+        topic_trends_bertopic_path,
+        registry.get("topic_table_bertopic").source_paths,
+        lambda: registry.get("topic_year_counts_bertopic"),
+    )
+
+
+# Load LDA model. With PREDTOPIC_MMAP_MODELS=1 its large arrays are memory-mapped
+# read-only, so several processes share one physical copy (the compacted arrays of
+# python -m utils.model_store compact when current).
+def load_lda_model():
+    from gensim.models import LdaModel
+
+    from utils.model_store import map_lda_arrays, mmap_enabled
+
+    if not mmap_enabled():
+        return LdaModel.load(best_lda_model_path)
+    lda_model = LdaModel.load(best_lda_model_path, mmap="r")
+    map_lda_arrays(lda_model, registry.get("lda_model_version"))
+    return lda_model
+
+
+# Load the batch LDA inference engine of the LDA model (utils/lda_inference.py)
+def load_lda_engine():
+    from utils.lda_inference import LdaInference
+
+    return LdaInference.from_lda(
+        registry.get("lda_model"), model_version=registry.get("lda_model_version")
+    )
+
+
+# Load LDA dictionary
+def load_dictionary():
+    from gensim import corpora
+
+    return corpora.Dictionary.load(f"{best_lda_model_path}.id2word")
+
+
+# Load BERTopic model (this also loads its sentence-transformers embedding backend).
+# With PREDTOPIC_MMAP_MODELS=1 its topic embeddings and c-TF-IDF matrix are
+# memory-mapped read-only, like the LDA arrays.
+def load_bertopic_model():
+    from bertopic import BERTopic
+
+    from utils.model_store import map_bertopic_arrays, mmap_enabled
+
+    bertopic_model = BERTopic.load(f"{bertopic_model_path}")
+    if mmap_enabled():
+        map_bertopic_arrays(
+            bertopic_model,
+            bertopic_model_path,
+            registry.get("bertopic_model_version"),
+        )
+    return bertopic_model
+
+
+# Load spaCy model for visualization. Only its tokenizer is used, so the
+# pipeline components (tagger, parser, NER, ...) are not loaded at all.
+def load_nlp():
+    import spacy
+
+    return spacy.load(
+        "en_core_web_sm",
+        exclude=[
+            "tok2vec",
+            "tagger",
+            "parser",
+            "senter",
+            "attribute_ruler",
+            "lemmatizer",
+            "ner",
+        ],
+    )
+
+
+# Load topic term indexes (top words and weights of every topic).
+# BERTopic's come from the stored topic representations, without loading the model.
+def load_topic_terms_lda():
+    return TopicTermIndex.from_lda(
+        registry.get("lda_model"), registry.get("dictionary")
+    )
+
+
+def load_topic_terms_bertopic():
+    return TopicTermIndex.from_bertopic_representations(bertopic_model_path)
+
+
+# Load the stored BERTopic embeddings (None until python -m utils.embedding_store build)
+def load_embedding_store():
+    from utils.embedding_store import open_embedding_store
+
+    return open_embedding_store()
+
+
+# Load the similar papers index over the stored corpus embeddings (None if not built)
+def load_similarity_index():
+    from utils.similarity import load_similarity_index
+
+    return load_similarity_index(registry.get("embedding_store"))
+
+
+# Load the full-text search index (None until python -m utils.search_index build,
+# and again after papers are ingested until it is rebuilt)
+def load_search_index():
+    from utils.search_index import corpus_source_paths, load_search_index
+
+    return load_search_index(source_paths=corpus_source_paths())
+
+
+# Load model versions (short hash of the model files' sizes and modification times)
+def load_lda_model_version():
+    return hashlib.sha1(source_signature(lda_model_files).encode()).hexdigest()[:12]
+
+
+def load_bertopic_model_version():
+    return hashlib.sha1(source_signature(bertopic_model_files).encode()).hexdigest()[
+        :12
+    ]
+
+
+# Load the static assets (documentation, topic descriptions, images) of materials/
+def load_assets():
+    return load_asset_bundle()
+
+
+# Load topic descriptions (rows keyed by topic ID)
+def load_topic_desc_bertopic():
+    return registry.get("assets").topic_descriptions["BERTopic"]
+
+
+def load_topic_desc_lda():
+    return registry.get("assets").topic_descriptions["LDA"]
+
+
+registry = ArtifactRegistry()
+registry.register("data_df", load_data_df)
+registry.register("topic_table_lda", load_topic_table_lda)
+registry.register("topic_table_bertopic", load_topic_table_bertopic)
+registry.register("topic_df_lda", load_topic_df_lda)
+registry.register("topic_df_bertopic", load_topic_df_bertopic)
+registry.register("topic_index_lda", load_topic_index_lda)
+registry.register("topic_index_bertopic", load_topic_index_bertopic)
+registry.register("topic_year_counts_lda", load_topic_year_counts_lda)
+registry.register("topic_year_counts_bertopic", load_topic_year_counts_bertopic)
+registry.register("topic_trends_lda", load_topic_trends_lda)
+registry.register("topic_trends_bertopic", load_topic_trends_bertopic)
+registry.register("lda_model", load_lda_model)
+registry.register("lda_engine", load_lda_engine)
+registry.register("dictionary", load_dictionary)
+registry.register("bertopic_model", load_bertopic_model)
+registry.register("nlp", load_nlp)
+registry.register("embedding_store", load_embedding_store)
+registry.register("similarity_index", load_similarity_index)
+registry.register("search_index", load_search_index)
+registry.register("topic_terms_lda", load_topic_terms_lda)
+registry.register("topic_terms_bertopic", load_topic_terms_bertopic)
+registry.register("lda_model_version", load_lda_model_version)
+registry.register("bertopic_model_version", load_bertopic_model_version)
+registry.register("assets", load_assets)
+registry.register("topic_desc_bertopic", load_topic_desc_bertopic)
+registry.register("topic_desc_lda", load_topic_desc_lda)
+
+# Artifacts of the models needed for predictions, per model (loaded at startup by
+# the inference service and by the warm-up)
+model_artifacts = {
+    "bertopic": ["bertopic_model"],
+    "lda": ["lda_model", "dictionary", "nlp"],
+}
+
+# Artifacts derived from the corpus, reloaded when papers are ingested
+corpus_artifacts = [
+    "topic_table_lda",
+    "topic_table_bertopic",
+    "topic_df_lda",
+    "topic_df_bertopic",
+    "topic_index_lda",
+    "topic_index_bertopic",
+    "topic_year_counts_lda",
+    "topic_year_counts_bertopic",
+    "topic_trends_lda",
+    "topic_trends_bertopic",
+    "embedding_store",
+    "similarity_index",
+    "search_index",
+]
+
+
+# Function to reload the corpus artifacts when papers were ingested since they were
+# loaded (a stat call per rerun). Returns True when they were invalidated.
+def refresh_corpus():
+    loaded = _corpus_version["loaded"]
+    if loaded is False or manifest_mtime() == loaded:
+        return False
+    registry.invalidate(*corpus_artifacts)
+    _corpus_version["loaded"] = False
+    logger.info("Ingested papers found, corpus artifacts will be reloaded")
+    return True
@@ -0,0 +1,161 @@
+# Static assets of the app (materials/) compiled into one versioned bundle.
+#
+# Build it once (and again after editing materials/) with:
+#   python -m utils.asset_bundle build
+#
+# The bundle holds the documentation markdown, the topic descriptions parsed into
+# rows keyed by topic ID and the bytes of every image. It is a single pickle file
+# named after the hash of the contents of materials/ (data/assets/bundle.<hash>.pkl),
+# next to bundle.json, which records the current version and the sizes and
+# modification times of the files it was built from. The registry loads it once per
+# process; when materials/ changed since the build, the bundle is rebuilt on load
+# and only written again when the content hash differs.
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import sys
+
+from utils.topic_index import source_signature
+
+logger = logging.getLogger(__name__)
+
+documentation_path = "materials/documentation/"
+images_path = "materials/images/"
+asset_bundle_path = "data/assets/"
+
+
+class AssetBundle:
+    def __init__(self, version, documents, topic_descriptions, images):
+        self.version = version
+        self.documents = documents
+        self.topic_descriptions = topic_descriptions
+        self.images = images
+
+    # Function to get the markdown of a documentation file (name without extension)
+    def document(self, name):
+        return self.documents[name]
+
+    # Function to get the PNG bytes of an image (name without extension)
+    def image(self, name):
+        return self.images[name]
+
+
+# Function to list the files the bundle is built from, in a stable order
+def source_paths():
+    paths = []
+    for directory in [documentation_path, images_path]:
+        paths.extend(
+            os.path.join(directory, name) for name in sorted(os.listdir(directory))
+        )
+    return paths
+
+
+# Function to parse a topic descriptions CSV into rows keyed by topic ID
+def parse_topic_descriptions(content):
+    # The CSV files are saved with a byte order mark
+    reader = csv.DictReader(io.StringIO(content.decode("utf-8-sig")))
+    return {int(row.pop("ID")): row for row in reader}
+
+
+# Function to compile the files of materials/ into a bundle
+def build_bundle(paths=None):
+    paths = source_paths() if paths is None else paths
+    digest = hashlib.sha1()
+    documents, topic_descriptions, images = {}, {}, {}
+    for path in paths:
+        with open(path, "rb") as f:
+            content = f.read()
+        digest.update(f"{path}:{len(content)}:".encode())
+        digest.update(content)
+
+        name, extension = os.path.splitext(os.path.basename(path))
+        if extension == ".md":
+            documents[name] = content.decode("utf-8")
+        elif extension == ".csv" and name.startswith("topic_descriptions_"):
+            model_type = name[len("topic_descriptions_") :]
+            topic_descriptions[model_type] = parse_topic_descriptions(content)
+        elif extension == ".png":
+            images[name] = content
+    return AssetBundle(digest.hexdigest()[:12], documents, topic_descriptions, images)
+
+
+def _bundle_file(path, version):
+    return os.path.join(path, f"bundle.{version}.pkl")
+
+
+def read_bundle_meta(path=asset_bundle_path):
+    meta_path = os.path.join(path, "bundle.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r") as f:
+        return json.load(f)
+
+
+# Function to save a bundle: the bundle file first, bundle.json last (it marks the
+# current version), then the files of older versions are removed
+def save_bundle(bundle, signature, path=asset_bundle_path):
+    os.makedirs(path, exist_ok=True)
+    bundle_file = _bundle_file(path, bundle.version)
+    if not os.path.exists(bundle_file):
+        with open(f"{bundle_file}.tmp", "wb") as f:
+            # Plain fields, so the file loads whatever module built it
+            pickle.dump(vars(bundle), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{bundle_file}.tmp", bundle_file)
+
+    meta_path = os.path.join(path, "bundle.json")
+    with open(f"{meta_path}.tmp", "w") as f:
+        json.dump({"version": bundle.version, "source_signature": signature}, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+    for name in os.listdir(path):
+        if name.startswith("bundle.") and name.endswith(".pkl"):
+            if name != os.path.basename(bundle_file):
+                os.remove(os.path.join(path, name))
+
+
+# Function to load the bundle, rebuilding it when materials/ changed since it was built
+def load_asset_bundle(path=asset_bundle_path):
+    paths = source_paths()
+    signature = source_signature(paths)
+    meta = read_bundle_meta(path)
+    if meta is not None and meta["source_signature"] == signature:
+        bundle_file = _bundle_file(path, meta["version"])
+        if os.path.exists(bundle_file):
+            with open(bundle_file, "rb") as f:
+                return AssetBundle(**pickle.load(f))
+
+    bundle = build_bundle(paths)
+    if meta is None or meta["version"] != bundle.version:
+        logger.info("Asset bundle %s built from materials", bundle.version)
+    try:
+        save_bundle(bundle, signature, path)
+    except OSError:
+        pass  # read-only data directory, keep the bundle in memory only
+    return bundle
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the static asset bundle.")
+    parser.add_argument("command", choices=["build"])
+    parser.parse_args(argv)
+
+    paths = source_paths()
+    bundle = build_bundle(paths)
+    save_bundle(bundle, source_signature(paths))
+    print(
+        f"Bundled {len(bundle.documents)} documents, "
+        f"{sum(len(rows) for rows in bundle.topic_descriptions.values())} topic "
+        f"descriptions and {len(bundle.images)} images as "
+        f"{_bundle_file(asset_bundle_path, bundle.version)}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+# Batch topic prediction for large files of abstracts.
+#
+# Usage:
+#   python -m utils.batch_predict new_abstracts.csv predictions.parquet
+#   python -m utils.batch_predict new_abstracts.jsonl predictions.csv --models lda
+#
+# Input is read in chunks, so memory stays bounded by --chunk-size regardless of file size.
+# For very large corpora (resumable, stages overlapped) see utils/pipeline.py.
+import argparse
+import logging
+import sys
+import time
+from itertools import islice
+
+import pandas as pd
+
+from utils.artifacts import registry
+from utils.prediction import predict_topics_bertopic_batch, predict_topics_lda_batch
+
+logger = logging.getLogger(__name__)
+
+
+# Function to read an input file chunk by chunk (CSV, JSON Lines or Parquet),
+# optionally only the given columns. The first skip_rows rows are skipped without
+# parsing them: whole Parquet row groups are not read, JSON Lines are not decoded,
+# CSV rows are dropped by the tokenizer.
+def read_chunks(input_path, chunk_size, columns=None, skip_rows=0):
+    if input_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(input_path)
+        row_groups = []
+        for i in range(parquet_file.num_row_groups):
+            num_rows = parquet_file.metadata.row_group(i).num_rows
+            if not row_groups and skip_rows >= num_rows:
+                skip_rows -= num_rows
+            else:
+                row_groups.append(i)
+        batches = parquet_file.iter_batches(
+            chunk_size, row_groups=row_groups, columns=columns
+        )
+        return _skip_rows((batch.to_pandas() for batch in batches), skip_rows)
+    if input_path.endswith((".jsonl", ".json")):
+        chunks = _read_json_lines(input_path, chunk_size, skip_rows)
+        if columns is None:
+            return chunks
+        return (chunk[columns] for chunk in chunks)
+    # (a callable: pandas would turn a range into a set of every skipped row number)
+    return pd.read_csv(
+        input_path,
+        chunksize=chunk_size,
+        usecols=columns,
+        skiprows=(lambda i: 0 < i <= skip_rows) if skip_rows else None,
+    )
+
+
+def _read_json_lines(input_path, chunk_size, skip_rows):
+    with open(input_path, "r", encoding="utf-8") as f:
+        next(islice(f, skip_rows, skip_rows), None)  # skip lines, not decoded
+        yield from pd.read_json(f, lines=True, chunksize=chunk_size)
+
+
+# Function to drop the first skip_rows rows of a stream of chunks
+def _skip_rows(chunks, skip_rows):
+    for chunk in chunks:
+        if skip_rows >= len(chunk):
+            skip_rows -= len(chunk)
+            continue
+        if skip_rows:
+            chunk = chunk.iloc[skip_rows:].reset_index(drop=True)
+            skip_rows = 0
+        yield chunk
+
+
+# Writer that appends chunks to a CSV or Parquet file
+class ChunkWriter:
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.is_parquet = output_path.endswith(".parquet")
+        self._parquet_writer = None
+        self._schema = None
+        self._header_written = False
+
+    def write(self, df):
+        if self.is_parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            # Later chunks get the schema of the first one: their dtypes may be
+            # inferred differently (e.g. a column that is all null)
+            table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            if self._parquet_writer is None:
+                self._schema = table.schema
+                self._parquet_writer = pq.ParquetWriter(self.output_path, self._schema)
+            self._parquet_writer.write_table(table)
+        else:
+            df.to_csv(
+                self.output_path,
+                mode="a" if self._header_written else "w",
+                header=not self._header_written,
+                index=False,
+            )
+            self._header_written = True
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+# Functions to add the predictions of a model to the result columns
+def add_bertopic_columns(result, topic_ids, probabilities):
+    result["BERTopic Topic ID"] = topic_ids
+    if probabilities.ndim == 2:
+        result["BERTopic Topic Probability"] = probabilities.max(axis=1)
+        for i in range(probabilities.shape[1]):
+            result[f"BERTopic Topic {i} Probability"] = probabilities[:, i]
+    else:
+        result["BERTopic Topic Probability"] = probabilities
+
+
+def add_lda_columns(result, topic_ids, distributions):
+    result["LDA Topic ID"] = topic_ids
+    result["LDA Topic Probability"] = distributions.max(axis=1)
+    for i in range(distributions.shape[1]):
+        result[f"LDA Topic {i} Probability"] = distributions[:, i]
+
+
+# Function to predict topics of one chunk with the selected models
+def predict_chunk(chunk, text_column, keep_columns, models):
+    texts = chunk[text_column].fillna("").astype(str).tolist()
+    result = chunk[keep_columns].reset_index(drop=True)
+
+    if "bertopic" in models:
+        add_bertopic_columns(
+            result,
+            *predict_topics_bertopic_batch(texts, registry.get("bertopic_model")),
+        )
+
+    if "lda" in models:
+        add_lda_columns(
+            result, *predict_topics_lda_batch(texts, registry.get("lda_model"))
+        )
+
+    return result
+
+
+def run(input_path, output_path, text_column, keep_columns, models, chunk_size):
+    writer = ChunkWriter(output_path)
+    num_docs = 0
+    start = time.perf_counter()
+    try:
+        for chunk in read_chunks(input_path, chunk_size):
+            writer.write(predict_chunk(chunk, text_column, keep_columns, models))
+            num_docs += len(chunk)
+            elapsed = time.perf_counter() - start
+            logger.info(
+                "%d documents in %.1fs (%.1f docs/s)",
+                num_docs,
+                elapsed,
+                num_docs / elapsed if elapsed else 0.0,
+            )
+    finally:
+        writer.close()
+    return num_docs, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Predict BERTopic and LDA topics for a CSV/JSONL file of abstracts."
+    )
+    parser.add_argument("input", help="Input .csv or .jsonl file")
+    parser.add_argument("output", help="Output .csv or .parquet file")
+    parser.add_argument("--text-column", default="Abstract")
+    parser.add_argument(
+        "--keep-columns",
+        nargs="*",
+        default=[],
+        help="Input columns copied to the output (e.g. DOI Title)",
+    )
+    parser.add_argument(
+        "--models", nargs="+", choices=["bertopic", "lda"], default=["bertopic", "lda"]
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    num_docs, elapsed = run(
+        args.input,
+        args.output,
+        args.text_column,
+        args.keep_columns,
+        args.models,
+        args.chunk_size,
+    )
+    logger.info(
+        "Done: %d documents written to %s in %.1fs", num_docs, args.output, elapsed
+    )
+    for row in registry.stats():
+        if row["loaded"]:
+            logger.info(
+                "Artifact %s loaded in %.2fs", row["artifact"], row["load_seconds"]
+            )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
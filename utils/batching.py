@@ -0,0 +1,101 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+# Collects concurrent requests into batches: a background thread waits up to
+# max_wait_ms after the first queued item (or until max_batch_size items are
+# queued), runs process_batch once on the whole batch and hands every caller its
+# own result. process_batch takes a list of items and returns a list of results.
+class MicroBatcher:
+    def __init__(self, process_batch, max_batch_size=32, max_wait_ms=5.0, name=""):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.batches = 0
+        self.items = 0
+        self.batch_size_counts = {}
+        self.queue_seconds_sum = 0.0
+        self.queue_seconds_max = 0.0
+        self.process_seconds_sum = 0.0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name=f"batcher-{self.name}", daemon=True
+                    )
+                    self._thread.start()
+
+    # Function to submit one item and wait for its result
+    def submit(self, item):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            start = time.perf_counter()
+            try:
+                results = list(self.process_batch([item for item, _, _ in batch]))
+                # Every caller gets a result or an error, never waits forever
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"process_batch returned {len(results)} results for "
+                        f"{len(batch)} items"
+                    )
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            self._record(batch, start, time.perf_counter())
+
+    def _record(self, batch, start, end):
+        size = len(batch)
+        self.batches += 1
+        self.items += size
+        self.batch_size_counts[size] = self.batch_size_counts.get(size, 0) + 1
+        for _, _, enqueued in batch:
+            waited = start - enqueued
+            self.queue_seconds_sum += waited
+            self.queue_seconds_max = max(self.queue_seconds_max, waited)
+        self.process_seconds_sum += end - start
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+            "queue_seconds_sum": self.queue_seconds_sum,
+            "queue_seconds_max": self.queue_seconds_max,
+            "process_seconds_sum": self.process_seconds_sum,
+        }
@@ -0,0 +1,85 @@
+# Columnar storage of the topic tables (topic assignments joined with the prepared corpus).
+#
+# Convert the CSVs in data/ once with:
+#   python -m utils.corpus_store convert
+#
+# The tables are written as uncompressed Arrow IPC files, which are memory-mapped on
+# load: columns are zero-copy views of the file, so app worker processes share the
+# OS page cache, and text such as the abstracts is only materialized for the rows
+# being displayed.
+import os
+import sys
+
+import pyarrow as pa
+
+# Columns needed by topic views (topic index, charts)
+view_columns = ["Year", "Top Topic ID", "Top Topic Name", "Top Topic Probability"]
+# Columns needed to display a document
+document_columns = ["DOI", "Year", "Title", "Abstract", "Top Topic Probability"]
+
+
+class CorpusTable:
+    def __init__(self, table, source_paths):
+        self.table = table
+        self.source_paths = source_paths
+
+    # Memory-map a stored table (read-only), followed by its appended segments
+    # (python -m utils.ingest); the segments are concatenated without copying
+    @classmethod
+    def open(cls, path, segment_paths=()):
+        tables = []
+        for table_path in [path, *segment_paths]:
+            with pa.memory_map(table_path, "r") as source:
+                tables.append(pa.ipc.open_file(source).read_all())
+        table = tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+        return cls(table, [path, *segment_paths])
+
+    # Wrap an in-memory DataFrame (used when no converted table is available)
+    @classmethod
+    def from_frame(cls, df, source_paths):
+        return cls(pa.Table.from_pandas(df, preserve_index=False), source_paths)
+
+    @property
+    def columns(self):
+        return self.table.column_names
+
+    def __len__(self):
+        return self.table.num_rows
+
+    # Get the selected columns of all rows as a DataFrame
+    def frame(self, columns=None):
+        table = self.table if columns is None else self.table.select(columns)
+        return table.to_pandas()
+
+    # Get the selected columns of the rows at the given positions as a DataFrame
+    def rows(self, positions, columns=None):
+        table = self.table if columns is None else self.table.select(columns)
+        return table.take(pa.array(positions, type=pa.int64())).to_pandas()
+
+    def save(self, path):
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, self.table.schema) as writer:
+                writer.write_table(self.table)
+
+
+def main(argv=None):
+    import argparse
+
+    from utils import artifacts
+
+    parser = argparse.ArgumentParser(description="Convert topic tables to Arrow.")
+    parser.add_argument("command", choices=["convert"])
+    parser.parse_args(argv)
+
+    for path, read in [
+        (artifacts.topic_table_lda_path, artifacts.read_topic_df_lda_csv),
+        (artifacts.topic_table_bertopic_path, artifacts.read_topic_df_bertopic_csv),
+    ]:
+        topic_df = read()
+        CorpusTable.from_frame(topic_df, []).save(path)
+        print(f"Wrote {len(topic_df)} rows to {path} ({os.path.getsize(path)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# Persistent store of document embeddings for the BERTopic model.
+#
+# Vectors are kept in one append-only binary file, memory-mapped as a (count x dim)
+# float32 or float16 matrix, with a hash of each (whitespace-normalized) text as key.
+# Embed the corpus once, in batches, with:
+#   python -m utils.embedding_store build --batch-size 64 [--dtype float16]
+# Re-running build only embeds documents that are not in the store yet.
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+from utils.prediction_cache import normalize_text
+
+embedding_store_path = "data/embeddings/"
+
+
+def text_hash(text):
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.dtype = np.dtype(meta["dtype"])
+        self.dim = meta["dim"]
+        self._vectors = None
+        self._rows = {}
+
+        # Only the first meta["count"] records are valid (meta is written last)
+        with open(self._file("hashes.bin"), "rb") as f:
+            hashes = f.read(20 * meta["count"])
+        for row in range(meta["count"]):
+            self._rows.setdefault(hashes[20 * row : 20 * (row + 1)], row)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @classmethod
+    def create(cls, path, dim, model_name, dtype="float32"):
+        os.makedirs(path, exist_ok=True)
+        meta = {
+            "dim": dim,
+            "dtype": np.dtype(dtype).name,
+            "count": 0,
+            "model": model_name,
+        }
+        for name in ["vectors.bin", "hashes.bin"]:
+            open(os.path.join(path, name), "wb").close()
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        return cls(path, meta)
+
+    @classmethod
+    def open(cls, path):
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            return cls(path, json.load(f))
+
+    @property
+    def count(self):
+        return self.meta["count"]
+
+    # All vectors as a read-only memory-mapped (count x dim) matrix
+    @property
+    def vectors(self):
+        if self._vectors is None or len(self._vectors) != self.count:
+            if self.count == 0:
+                return np.empty((0, self.dim), dtype=self.dtype)
+            self._vectors = np.memmap(
+                self._file("vectors.bin"),
+                dtype=self.dtype,
+                mode="r",
+                shape=(self.count, self.dim),
+            )
+        return self._vectors
+
+    # Function to get the store rows of texts (-1 when not stored)
+    def lookup(self, texts):
+        return np.array([self._rows.get(text_hash(text), -1) for text in texts])
+
+    # Function to append embeddings of texts that are not stored yet
+    def add(self, texts, embeddings):
+        new = {}
+        for text, embedding in zip(texts, embeddings):
+            key = text_hash(text)
+            if key not in self._rows and key not in new:
+                new[key] = embedding
+        if not new:
+            return 0
+
+        # Data first, then the count in meta.json, so a crash never exposes partial rows
+        vectors = np.asarray(list(new.values()), dtype=self.dtype)
+        with open(self._file("vectors.bin"), "r+b") as f:
+            f.seek(self.count * self.dim * self.dtype.itemsize)
+            f.write(vectors.tobytes())
+        with open(self._file("hashes.bin"), "r+b") as f:
+            f.seek(self.count * 20)
+            f.write(b"".join(new))
+        for key in new:
+            self._rows[key] = self.meta["count"]
+            self.meta["count"] += 1
+        with open(self._file("meta.json.tmp"), "w") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(self._file("meta.json.tmp"), self._file("meta.json"))
+        return len(new)
+
+    # Function to get float32 embeddings of texts, computing missing ones with
+    # embed_fn (list of texts -> 2-D array) and appending them when add is True
+    def embed(self, texts, embed_fn, add=False):
+        texts = list(texts)
+        rows = self.lookup(texts)
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+        stored = rows >= 0
+        if stored.any():
+            embeddings[stored] = self.vectors[rows[stored]]
+        if not stored.all():
+            missing = [text for text, is_stored in zip(texts, stored) if not is_stored]
+            computed = np.asarray(embed_fn(missing), dtype=np.float32)
+            embeddings[~stored] = computed
+            if add:
+                self.add(missing, computed)
+        return embeddings
+
+
+# Function to get the name of BERTopic's embedding model (from its saved config)
+def embedding_model_name():
+    from utils.artifacts import bertopic_model_path
+
+    with open(f"{bertopic_model_path}/config.json", "r") as f:
+        return json.load(f)["embedding_model"]
+
+
+# Function to open the store, or None when no compatible store has been built
+def open_embedding_store():
+    if not os.path.exists(os.path.join(embedding_store_path, "meta.json")):
+        return None
+    store = EmbeddingStore.open(embedding_store_path)
+    if store.meta["model"] != embedding_model_name():
+        return None
+    return store
+
+
+# Function to embed the BERTopic corpus in batches, appending only new documents.
+# Also writes corpus_rows.npy, the store row of every corpus document.
+def build(text_column="Abstract", batch_size=64, dtype="float32"):
+    from utils.artifacts import registry
+
+    bertopic_model = registry.get("bertopic_model")
+    texts = registry.get("topic_table_bertopic").frame([text_column])[text_column]
+    texts = texts.fillna("").astype(str).tolist()
+    model_name = embedding_model_name()
+
+    if os.path.exists(os.path.join(embedding_store_path, "meta.json")):
+        store = EmbeddingStore.open(embedding_store_path)
+        if store.meta["model"] != model_name:
+            raise ValueError(
+                f"Store holds {store.meta['model']} embeddings, model uses {model_name}"
+            )
+    else:
+        dim = len(bertopic_model.embedding_model.embed_documents(["dimension"])[0])
+        store = EmbeddingStore.create(embedding_store_path, dim, model_name, dtype)
+
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start : start + batch_size]
+        store.embed(batch, bertopic_model.embedding_model.embed_documents, add=True)
+        print(f"{min(start + batch_size, len(texts))}/{len(texts)} documents")
+
+    np.save(os.path.join(embedding_store_path, "corpus_rows.npy"), store.lookup(texts))
+    return store
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Embed the corpus for BERTopic.")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--text-column", default="Abstract")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    args = parser.parse_args(argv)
+
+    store = build(args.text_column, args.batch_size, args.dtype)
+    print(f"{store.count} embeddings stored in {embedding_store_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
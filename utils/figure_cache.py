@@ -0,0 +1,182 @@
+# Plotly figures of the topic views, built once per model, topic and version.
+#
+# The topic over time and top 10 words charts of a topic only change when the corpus
+# (trend cube) or the model changes. Each figure is built once, serialized to JSON
+# and kept in memory and in data/figures/, keyed by the version of what it was
+# built from; later renders only rebuild a Figure object from the JSON, without
+# validation. Build every topic's figures ahead of time (thread pool) with:
+#   python -m utils.figure_cache build --workers 4
+# The app also starts this in the background when it starts.
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import plotly.graph_objects as go
+
+from utils.artifacts import registry
+from utils.metrics import stage
+from utils.topic_index import source_signature
+from utils.visualization import (
+    visualize_top10words_bertopic,
+    visualize_top10words_lda,
+    visualize_topic_over_time,
+)
+
+logger = logging.getLogger(__name__)
+
+figure_cache_path = "data/figures/"
+charts = ["topic_over_time", "top10words"]
+# Part of every version: increase it when the charts of utils/visualization.py change
+figure_format = 2
+
+_figures = {}
+_lock = threading.Lock()
+_precompute = {"thread": None}
+
+
+# Function to get the version of what a chart is built from: the topic table (trend
+# cube) for topic over time, the model for the top 10 words
+def figure_version(model_type, chart):
+    if chart == "topic_over_time":
+        table = registry.get(f"topic_table_{model_type.lower()}")
+        source = source_signature(table.source_paths)
+    elif model_type == "BERTopic":
+        source = registry.get("bertopic_model_version")
+    else:
+        source = registry.get("lda_model_version")
+    return hashlib.sha1(f"{figure_format}:{source}".encode()).hexdigest()[:12]
+
+
+def build_figure(model_type, chart, topic_id):
+    if chart == "topic_over_time":
+        return visualize_topic_over_time(
+            topic_id, registry.get(f"topic_trends_{model_type.lower()}")
+        )
+    if model_type == "BERTopic":
+        return visualize_top10words_bertopic(
+            topic_terms=registry.get("topic_terms_bertopic"), topic_id=topic_id
+        )
+    return visualize_top10words_lda(
+        topic_terms=registry.get("topic_terms_lda"), topic_id=topic_id
+    )
+
+
+def _figure_file(model_type, chart, topic_id, version="*"):
+    return os.path.join(
+        figure_cache_path, f"{model_type}_{chart}_{topic_id}.{version}.json"
+    )
+
+
+def _read_figure(model_type, chart, topic_id, version):
+    try:
+        with open(_figure_file(model_type, chart, topic_id, version), "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+# Function to write the JSON of a figure, removing the files of older versions
+def _write_figure(model_type, chart, topic_id, version, figure_json):
+    os.makedirs(figure_cache_path, exist_ok=True)
+    path = _figure_file(model_type, chart, topic_id, version)
+    # One temporary file per thread, as precompute may build the same figure
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(figure_json)
+    os.replace(tmp_path, path)
+    for old_path in glob.glob(_figure_file(model_type, chart, topic_id)):
+        if old_path != path:
+            os.remove(old_path)
+
+
+# Function to get the JSON of a figure, building it only once per version
+def get_figure_json(model_type, chart, topic_id):
+    topic_id = int(topic_id)
+    version = figure_version(model_type, chart)
+    key = (model_type, chart, topic_id, version)
+    if key in _figures:
+        return _figures[key]
+
+    figure_json = _read_figure(model_type, chart, topic_id, version)
+    if figure_json is None:
+        with stage("figure_build", model=model_type, chart=chart):
+            figure_json = build_figure(model_type, chart, topic_id).to_json()
+        try:
+            _write_figure(model_type, chart, topic_id, version, figure_json)
+        except OSError:
+            pass  # read-only data directory, keep the figure in memory only
+    with _lock:
+        # Figures of older versions are not needed anymore
+        for old_key in [k for k in _figures if k[:3] == key[:3] and k != key]:
+            del _figures[old_key]
+        _figures[key] = figure_json
+    return figure_json
+
+
+# Function to get a figure of a topic view, a new Figure object on every call (so
+# callers may change it), rebuilt from the cached JSON without validation
+def get_figure(model_type, chart, topic_id):
+    return go.Figure(
+        json.loads(get_figure_json(model_type, chart, topic_id)), _validate=False
+    )
+
+
+# Function to build the figures of every topic of the given models in a thread pool
+def precompute(models=("BERTopic", "LDA"), workers=4):
+    jobs = [
+        (model_type, chart, topic_id)
+        for model_type in models
+        for chart in charts
+        for topic_id in range(
+            registry.get(f"topic_terms_{model_type.lower()}").num_topics
+        )
+    ]
+    with ThreadPoolExecutor(workers, thread_name_prefix="figure-cache") as executor:
+        list(executor.map(lambda job: get_figure_json(*job), jobs))
+    return len(jobs)
+
+
+def _precompute_in_background(models, workers):
+    try:
+        logger.info("Precomputed %d figures", precompute(models, workers))
+    except Exception:
+        logger.exception("Figure precomputation failed")
+
+
+# Function to start precompute() in a background thread, once per process
+def start_precompute(models=("BERTopic", "LDA"), workers=4):
+    with _lock:
+        if _precompute["thread"] is None:
+            _precompute["thread"] = threading.Thread(
+                target=_precompute_in_background,
+                args=(models, workers),
+                name="figure-precompute",
+                daemon=True,
+            )
+            _precompute["thread"].start()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the topic view figures.")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument(
+        "--models", nargs="+", choices=["BERTopic", "LDA"], default=["BERTopic", "LDA"]
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    print(
+        f"Built {precompute(args.models, args.workers)} figures in {figure_cache_path}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+# Incremental ingestion of new papers into the topic tables.
+#
+# Usage:
+#   python -m utils.ingest new_papers.csv
+#   python -m utils.ingest new_papers.jsonl --text-column Abstract --batch-size 256
+#
+# The input needs DOI, Year, Title and the text column. Only the new papers are
+# preprocessed and predicted (batched BERTopic transform and LDA inference), so the
+# cost follows the size of the batch, not of the corpus. Their rows are written as
+# new Arrow segments of both topic tables (data/segments/), the document counts per
+# year and topic are updated with the new rows only, and the segment manifest is
+# replaced last: a running app picks the papers up on its next rerun, no restart.
+# Papers whose DOI is already in the corpus are skipped.
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from utils import artifacts
+from utils.artifacts import read_ingest_manifest, registry
+from utils.batch_predict import read_chunks
+from utils.corpus_store import CorpusTable
+from utils.prediction import predict_topics_bertopic_batch, predict_topics_lda_batch
+from utils.search_index import search_index_path
+from utils.topic_counts import (
+    add_topic_year_counts,
+    count_topic_years,
+    save_topic_year_counts,
+)
+from utils.topic_index import source_signature
+
+logger = logging.getLogger(__name__)
+
+required_columns = ["DOI", "Year", "Title"]
+topic_year_counts_paths = {
+    "lda": artifacts.topic_year_counts_lda_path,
+    "bertopic": artifacts.topic_year_counts_bertopic_path,
+}
+
+
+# Function to convert the topic tables to Arrow if not done yet (segments are
+# appended to the converted tables)
+def ensure_converted():
+    for path, read in [
+        (artifacts.topic_table_lda_path, artifacts.read_topic_df_lda_csv),
+        (artifacts.topic_table_bertopic_path, artifacts.read_topic_df_bertopic_csv),
+    ]:
+        if not os.path.exists(path):
+            logger.info("Converting %s to Arrow first", path)
+            CorpusTable.from_frame(read(), []).save(path)
+    registry.invalidate(*artifacts.corpus_artifacts)
+
+
+# Function to read the new papers, without duplicates or papers already ingested
+def read_new_papers(input_path, text_column):
+    papers = pd.concat(read_chunks(input_path, 10000), ignore_index=True)
+    missing = [c for c in required_columns + [text_column] if c not in papers]
+    if missing:
+        raise ValueError(f"Missing columns in {input_path}: {', '.join(missing)}")
+
+    existing = set(registry.get("topic_table_bertopic").table.column("DOI").to_pylist())
+    papers = papers.drop_duplicates("DOI")
+    return papers[~papers["DOI"].isin(existing)].reset_index(drop=True)
+
+
+# Function to predict the top topic (and its probability) of every text, in batches
+def predict_topics(model_type, texts, batch_size):
+    topic_ids, probabilities = [], []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start : start + batch_size]
+        if model_type == "bertopic":
+            batch_ids, _ = predict_topics_bertopic_batch(
+                batch, registry.get("bertopic_model")
+            )
+            # Same as the stored table: BERTopic gives no per-document probability
+            batch_probabilities = np.ones(len(batch))
+        else:
+            batch_ids, distributions = predict_topics_lda_batch(
+                batch, registry.get("lda_model")
+            )
+            batch_probabilities = distributions.max(axis=1)
+        topic_ids.append(np.asarray(batch_ids))
+        probabilities.append(batch_probabilities)
+        logger.info(
+            "%s: %d/%d papers",
+            model_type,
+            min(start + batch_size, len(texts)),
+            len(texts),
+        )
+    return np.concatenate(topic_ids), np.concatenate(probabilities)
+
+
+# Function to get the rows of the new papers in the schema of a topic table.
+# Topic names are the ones the topic index shows for the predicted topics.
+def topic_rows(papers, topic_ids, probabilities, table, topic_index):
+    rows = papers.copy()
+    rows["Top Topic ID"] = topic_ids
+    rows["Top Topic Probability"] = probabilities
+    names = {}
+    for topic_id in np.unique(topic_ids):
+        names[topic_id] = topic_index.name(topic_id) or str(topic_id)
+    rows["Top Topic Name"] = [names[topic_id] for topic_id in topic_ids]
+
+    schema = table.table.schema
+    for column in schema.names:
+        if column not in rows:
+            rows[column] = None
+    return rows[schema.names]
+
+
+# Function to write the rows as a new segment of a topic table, returns its file name
+def write_segment(model_type, version, rows, schema):
+    os.makedirs(artifacts.segments_path, exist_ok=True)
+    segment = f"topic_table_{model_type}.{version:06d}.arrow"
+    table = pa.Table.from_pandas(rows, schema=schema, preserve_index=False)
+    CorpusTable(table, []).save(os.path.join(artifacts.segments_path, segment))
+    return segment
+
+
+# Function to add the new papers' embeddings to the embedding store (when built),
+# and their store rows to the corpus rows of the similarity index
+def add_embeddings(texts, num_rows_before):
+    store = registry.get("embedding_store")
+    if store is None:
+        return
+    embed_documents = registry.get("bertopic_model").embedding_model.embed_documents
+    store.embed(texts, embed_documents, add=True)
+
+    corpus_rows_path = os.path.join(
+        artifacts.data_path, "embeddings", "corpus_rows.npy"
+    )
+    if not os.path.exists(corpus_rows_path):
+        return
+    corpus_rows = np.load(corpus_rows_path)
+    if len(corpus_rows) != num_rows_before:
+        logger.warning(
+            "corpus_rows.npy is stale, run python -m utils.embedding_store build"
+        )
+        return
+    with open(f"{corpus_rows_path}.tmp", "wb") as f:
+        np.save(f, np.concatenate([corpus_rows, store.lookup(texts)]))
+    os.replace(f"{corpus_rows_path}.tmp", corpus_rows_path)
+
+
+def write_manifest(manifest):
+    os.makedirs(artifacts.segments_path, exist_ok=True)
+    tmp_path = f"{artifacts.ingest_manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, artifacts.ingest_manifest_path)
+
+
+# Function to ingest the papers of a CSV/JSONL file, returns the number ingested
+def ingest(input_path, text_column="Abstract", batch_size=256):
+    ensure_converted()
+    papers = read_new_papers(input_path, text_column)
+    if papers.empty:
+        return 0
+    texts = papers[text_column].fillna("").astype(str).tolist()
+
+    manifest = read_ingest_manifest()
+    version = manifest["version"] + 1
+    for model_type in ["bertopic", "lda"]:
+        table = registry.get(f"topic_table_{model_type}")
+        if model_type == "bertopic":
+            # Embedded once: the store serves the embeddings to the transform
+            add_embeddings(texts, len(table))
+        topic_ids, probabilities = predict_topics(model_type, texts, batch_size)
+        rows = topic_rows(
+            papers,
+            topic_ids,
+            probabilities,
+            table,
+            registry.get(f"topic_index_{model_type}"),
+        )
+        segment = write_segment(model_type, version, rows, table.table.schema)
+        manifest["segments"][model_type].append(segment)
+
+        # Counts of the new rows only, added to the stored counts
+        counts = add_topic_year_counts(
+            registry.get(f"topic_year_counts_{model_type}"), count_topic_years(rows)
+        )
+        source_paths = table.source_paths + [
+            os.path.join(artifacts.segments_path, segment)
+        ]
+        save_topic_year_counts(
+            topic_year_counts_paths[model_type], counts, source_signature(source_paths)
+        )
+
+    manifest["version"] = version
+    manifest.setdefault("batches", []).append(
+        {
+            "version": version,
+            "source": os.path.basename(input_path),
+            "papers": len(papers),
+            "ingested_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }
+    )
+    write_manifest(manifest)
+    if os.path.exists(os.path.join(search_index_path, "meta.json")):
+        logger.warning(
+            "Paper search is disabled until the index is rebuilt with the new papers: "
+            "python -m utils.search_index build"
+        )
+    return len(papers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append new papers to the corpus.")
+    parser.add_argument("input", help="Input .csv or .jsonl file of papers")
+    parser.add_argument("--text-column", default="Abstract")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    start = time.perf_counter()
+    num_papers = ingest(args.input, args.text_column, args.batch_size)
+    logger.info(
+        "Ingested %d new papers in %.1fs", num_papers, time.perf_counter() - start
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+# Batch LDA inference (variational E-step) with sparse matrix operations.
+#
+# gensim's LdaModel.inference runs the E-step document by document in a Python
+# loop. Here the bags of words of a whole batch form one sparse (documents x terms)
+# matrix and every iteration updates all unconverged documents at once against the
+# stored expElogbeta; large batches are sharded across a process pool.
+# The update rule, stopping rule (mean change of gamma per document below
+# gamma_threshold, at most `iterations` times) and the initialization of gamma are
+# the ones of gensim. As the initialization is random and documents stop early,
+# gensim does not agree with itself exactly either (a re-seeded run moves single
+# probabilities by up to ~0.05): the engine must stay within the same spread on
+# average and pick the same top topic. Check that, and the speed-up, with:
+#   python -m utils.lda_inference check --docs 2000 --n-jobs 4
+# The engine of the app's LDA model is built once per process by the registry
+# ("lda_engine"), tagged with the model version.
+import math
+import sys
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.special import psi
+
+from utils.preprocessing import process_pool, resolve_n_jobs
+
+
+# Function to compute E[log theta] of every row of gamma
+def dirichlet_expectation(gamma):
+    return psi(gamma) - psi(gamma.sum(axis=1))[:, np.newaxis]
+
+
+# Function to build a sparse (documents x terms) count matrix from bags of words
+def bows_to_csr(bows, num_terms, dtype=np.float32):
+    indptr = np.zeros(len(bows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(bow) for bow in bows])
+    indices = np.fromiter(
+        (term_id for bow in bows for term_id, _ in bow), np.int64, indptr[-1]
+    )
+    counts = np.fromiter((count for bow in bows for _, count in bow), dtype, indptr[-1])
+    matrix = sp.csr_matrix((counts, indices, indptr), shape=(len(bows), num_terms))
+    matrix.sum_duplicates()
+    return matrix
+
+
+# Function to build the count matrix straight from token lists with
+# dictionary.token2id (tokens outside the dictionary are ignored, like doc2bow)
+def tokens_to_csr(token_lists, token2id, dtype=np.float32):
+    bows = []
+    for tokens in token_lists:
+        ids = [token2id[token] for token in tokens if token in token2id]
+        term_ids, counts = np.unique(
+            np.asarray(ids, dtype=np.int64), return_counts=True
+        )
+        bows.append(list(zip(term_ids, counts)))
+    return bows_to_csr(bows, len(token2id), dtype)
+
+
+class LdaInference:
+    def __init__(
+        self,
+        expElogbeta,
+        alpha,
+        iterations=50,
+        gamma_threshold=0.001,
+        seed=0,
+        model_version=None,
+    ):
+        self.expElogbeta = np.asarray(expElogbeta)
+        self.model_version = model_version
+        # Computed in at least float32 (expElogbeta may be compacted to float16)
+        self.dtype = np.result_type(self.expElogbeta.dtype, np.float32)
+        self.alpha = np.asarray(alpha, dtype=self.dtype)
+        self.iterations = iterations
+        self.gamma_threshold = gamma_threshold
+        self.seed = seed
+        self.epsilon = np.finfo(self.dtype).eps
+        # (terms x topics) copy, so the rows of a document's terms are contiguous
+        self.expElogbeta_t = np.ascontiguousarray(self.expElogbeta.T, dtype=self.dtype)
+
+    @classmethod
+    def from_lda(cls, lda_model, seed=0, model_version=None):
+        return cls(
+            lda_model.expElogbeta,
+            lda_model.alpha,
+            lda_model.iterations,
+            lda_model.gamma_threshold,
+            seed,
+            model_version,
+        )
+
+    @property
+    def num_topics(self):
+        return self.expElogbeta.shape[0]
+
+    # Function to run the E-step for every row of a sparse count matrix.
+    # Returns gamma (documents x topics), like LdaModel.inference.
+    def gamma(self, counts):
+        counts = sp.csr_matrix(counts, dtype=self.dtype)
+        rng = np.random.default_rng(self.seed)
+        gamma = rng.gamma(100.0, 1.0 / 100.0, (counts.shape[0], self.num_topics))
+        gamma = gamma.astype(self.dtype)
+        exp_elogtheta = np.exp(dirichlet_expectation(gamma))
+
+        # Only the terms of the batch: a small, cache friendly copy of expElogbeta
+        terms, local_indices = np.unique(counts.indices, return_inverse=True)
+        expElogbeta_t = self.expElogbeta_t[terms]
+        counts = sp.csr_matrix(
+            (counts.data, local_indices, counts.indptr),
+            shape=(counts.shape[0], len(terms)),
+        )
+
+        active = np.arange(counts.shape[0])
+        for _ in range(self.iterations):
+            if len(active) == 0:
+                break
+            if len(active) < counts.shape[0]:
+                batch = counts[active]
+            else:
+                batch = counts
+            theta = exp_elogtheta[active]
+
+            # phinorm of every (document, term) non-zero: sum_k theta_dk * beta_kw
+            rows = np.repeat(np.arange(len(active)), np.diff(batch.indptr))
+            # (np.take gathers rows much faster than fancy indexing)
+            phinorm = (
+                np.einsum(
+                    "ij,ij->i",
+                    np.take(theta, rows, axis=0),
+                    np.take(expElogbeta_t, batch.indices, axis=0),
+                )
+                + self.epsilon
+            )
+            ratios = sp.csr_matrix(
+                (batch.data / phinorm, batch.indices, batch.indptr), shape=batch.shape
+            )
+            new_gamma = self.alpha + theta * (ratios @ expElogbeta_t)
+
+            # Documents whose gamma barely changed are done, as in gensim
+            change = np.abs(new_gamma - gamma[active]).mean(axis=1)
+            gamma[active] = new_gamma
+            exp_elogtheta[active] = np.exp(dirichlet_expectation(new_gamma))
+            active = active[change >= self.gamma_threshold]
+        return gamma
+
+    # Function to get normalized topic distributions (documents x topics)
+    def distributions(self, counts):
+        gamma = self.gamma(counts)
+        return gamma / gamma.sum(axis=1, keepdims=True)
+
+
+# PROCESS POOL
+
+_engine = None
+
+
+def _init_worker(engine):
+    global _engine
+    _engine = engine
+
+
+# Function to get the engine of a worker: the one the pool was created with, or
+# else (pools shared with other stages) the registry's, which must be of the same
+# model version as the caller's
+def _worker_engine(model_version):
+    if _engine is not None:
+        return _engine
+    from utils.artifacts import registry
+
+    engine = registry.get("lda_engine")
+    if engine.model_version != model_version:
+        raise RuntimeError(
+            f"LDA model {engine.model_version} in the worker, {model_version} in "
+            "the caller: pass the registry's engine with a shared process pool"
+        )
+    return engine
+
+
+def _distributions_shard(model_version, counts):
+    return _worker_engine(model_version).distributions(counts)
+
+
+# Function to get topic distributions of a count matrix, sharded across n_jobs
+# processes (n_jobs=-1 uses all CPUs): by default one shard per process, of at least
+# min_shard_size documents. Pass the executor of a process_pool to reuse it (its
+# workers use the registry's engine), otherwise a pool is created for this call.
+def infer_distributions(
+    engine, counts, n_jobs=1, shard_size=None, executor=None, min_shard_size=64
+):
+    n_jobs = resolve_n_jobs(n_jobs)
+    if shard_size is None:
+        shard_size = max(min_shard_size, math.ceil(counts.shape[0] / max(n_jobs, 1)))
+    if n_jobs <= 1 or counts.shape[0] <= shard_size:
+        return engine.distributions(counts)
+
+    shards = [
+        counts[start : start + shard_size]
+        for start in range(0, counts.shape[0], shard_size)
+    ]
+    versions = [engine.model_version] * len(shards)
+    if executor is None:
+        with process_pool(n_jobs, _init_worker, (engine,)) as executor:
+            return np.vstack(list(executor.map(_distributions_shard, versions, shards)))
+    return np.vstack(list(executor.map(_distributions_shard, versions, shards)))
+
+
+# CHECK AGAINST GENSIM
+
+
+# Function to sample documents from the model itself (theta ~ Dir(alpha), words
+# from the topics), so the check runs without the corpus or NLTK data
+def synthetic_bows(lda_model, num_docs, doc_length=120, seed=0):
+    rng = np.random.default_rng(seed)
+    topics = lda_model.get_topics().astype(np.float64)
+    topics /= topics.sum(axis=1, keepdims=True)
+    bows = []
+    for _ in range(num_docs):
+        theta = rng.dirichlet(lda_model.alpha)
+        word_dist = theta @ topics
+        word_ids = rng.choice(len(word_dist), size=doc_length, p=word_dist)
+        term_ids, counts = np.unique(word_ids, return_counts=True)
+        bows.append([(int(t), int(c)) for t, c in zip(term_ids, counts)])
+    return bows
+
+
+# Function to compare the engine with gensim on the same documents: differences of
+# the distributions (next to gensim's own run-to-run differences), top topic
+# agreement and throughput
+def check(lda_model, bows, n_jobs=1, shard_size=None):
+    engine = LdaInference.from_lda(lda_model)
+    counts = bows_to_csr(bows, lda_model.num_terms, engine.dtype)
+
+    start = time.perf_counter()
+    gamma, _ = lda_model.inference(bows)
+    gensim_seconds = time.perf_counter() - start
+    expected = gamma / gamma.sum(axis=1, keepdims=True)
+
+    random_state = lda_model.random_state
+    lda_model.random_state = np.random.RandomState(1)
+    try:
+        gamma, _ = lda_model.inference(bows)
+    finally:
+        lda_model.random_state = random_state
+    reseeded = gamma / gamma.sum(axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    actual = engine.distributions(counts)
+    engine_seconds = time.perf_counter() - start
+
+    report = {
+        "documents": len(bows),
+        "max_abs_diff": float(np.abs(actual - expected).max()),
+        "mean_abs_diff": float(np.abs(actual - expected).mean()),
+        "gensim_reseeded_max_abs_diff": float(np.abs(reseeded - expected).max()),
+        "gensim_reseeded_mean_abs_diff": float(np.abs(reseeded - expected).mean()),
+        "top_topic_agreement": float(
+            (actual.argmax(axis=1) == expected.argmax(axis=1)).mean()
+        ),
+        "gensim_docs_per_second": len(bows) / gensim_seconds,
+        "engine_docs_per_second": len(bows) / engine_seconds,
+    }
+    if n_jobs != 1:
+        start = time.perf_counter()
+        infer_distributions(engine, counts, n_jobs, shard_size)
+        report[f"engine_{n_jobs}_jobs_docs_per_second"] = len(bows) / (
+            time.perf_counter() - start
+        )
+    return report
+
+
+def main(argv=None):
+    import argparse
+
+    from utils.artifacts import registry
+
+    parser = argparse.ArgumentParser(
+        description="Check the batch LDA inference engine against gensim."
+    )
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--n-jobs", type=int, default=1)
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=None,
+        help="documents per shard (default: one shard per process)",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.001,
+        help="maximum allowed mean absolute difference of topic probabilities",
+    )
+    parser.add_argument(
+        "--min-agreement",
+        type=float,
+        default=0.99,
+        help="minimum share of documents with the same top topic",
+    )
+    args = parser.parse_args(argv)
+
+    lda_model = registry.get("lda_model")
+    report = check(
+        lda_model,
+        synthetic_bows(lda_model, args.docs),
+        args.n_jobs,
+        args.shard_size,
+    )
+    for key, value in report.items():
+        print(f"{key:<36} {value:.6g}")
+    if report["mean_abs_diff"] > args.tolerance:
+        print(f"FAILED: mean difference above tolerance {args.tolerance}")
+        return 1
+    if report["top_topic_agreement"] < args.min_agreement:
+        print(f"FAILED: top topic agreement below {args.min_agreement}")
+        return 1
+    print(
+        f"OK: within tolerance {args.tolerance}, "
+        f"{report['engine_docs_per_second'] / report['gensim_docs_per_second']:.1f}x "
+        "gensim throughput"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
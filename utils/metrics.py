@@ -0,0 +1,291 @@
+# Stage timing instrumentation for the app, the service and the CLIs.
+#
+# Wrap a stage with `with stage("figure", model="LDA", chart="top10words"):`.
+# With PREDTOPIC_METRICS=1 every stage updates a latency histogram and a counter
+# per stage and labels, and is logged as one JSON line (logger utils.metrics).
+# The metrics are exported in the Prometheus text format: the service serves them
+# at /metrics, the app writes them to PREDTOPIC_METRICS_FILE after every rerun.
+# A rerun started with start_rerun(record=True) also keeps its own timing
+# breakdown, shown by the app's debug panel (?debug=1 or PREDTOPIC_DEBUG=1).
+# When neither is on, stage() returns a shared no-op context manager.
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+enabled = os.environ.get("PREDTOPIC_METRICS", "0") == "1"
+debug_panel = os.environ.get("PREDTOPIC_DEBUG", "0") == "1"
+metrics_file_path = os.environ.get("PREDTOPIC_METRICS_FILE")
+# Histogram buckets (seconds)
+buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# Per-thread state of the current rerun (Streamlit runs each session in a thread)
+class RerunState(threading.local):
+    timings = None
+    depth = 0
+    rerun_start = None
+
+
+_noop = contextlib.nullcontext()
+_local = RerunState()
+_lock = threading.Lock()
+_file_lock = threading.Lock()
+# (stage, sorted label items) -> {"buckets": [...], "sum": float, "count": int, "errors": int}
+_histograms = {}
+_reruns = {"count": 0, "seconds_sum": 0.0}
+
+
+class Stage:
+    def __init__(self, name, labels, timings):
+        self.name = name
+        self.labels = labels
+        self.timings = timings
+
+    def __enter__(self):
+        self.depth = _local.depth
+        _local.depth = self.depth + 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _local.depth = self.depth
+        status = "ok" if exc_type is None else "error"
+        if self.timings is not None:
+            self.timings.append(
+                {
+                    "stage": self.name,
+                    **self.labels,
+                    "seconds": seconds,
+                    "depth": self.depth,
+                    "status": status,
+                }
+            )
+        if enabled:
+            observe(self.name, self.labels, seconds, status)
+        return False
+
+
+# Function to time a stage; labels (e.g. model="LDA") become metric labels
+def stage(name, **labels):
+    timings = _local.timings
+    if not enabled and timings is None:
+        return _noop
+    return Stage(name, {k: str(v) for k, v in labels.items()}, timings)
+
+
+# Function to add one observation to the histogram and counters of a stage
+def observe(name, labels, seconds, status="ok"):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+            histogram["errors"] = 0
+            _histograms[key] = histogram
+        for i, bound in enumerate(buckets):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+        if status != "ok":
+            histogram["errors"] += 1
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            json.dumps(
+                {
+                    "event": "stage",
+                    "stage": name,
+                    **labels,
+                    "seconds": round(seconds, 6),
+                    "status": status,
+                }
+            )
+        )
+
+
+# Function to start recording the stages of the current rerun (current thread)
+def start_rerun(record=False):
+    _local.timings = [] if record else None
+    _local.depth = 0
+    _local.rerun_start = time.perf_counter()
+
+
+# Function to end the current rerun: returns its stage timings (None when not
+# recorded), updates the rerun metrics and rewrites the metrics file
+def finish_rerun():
+    timings = _local.timings
+    _local.timings = None
+    start = _local.rerun_start
+    if not enabled or start is None:
+        return timings
+
+    seconds = time.perf_counter() - start
+    with _lock:
+        _reruns["count"] += 1
+        _reruns["seconds_sum"] += seconds
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": "rerun", "seconds": round(seconds, 6)}))
+    if metrics_file_path:
+        # The metrics file must never break the app
+        try:
+            write_metrics_file(metrics_file_path)
+        except Exception:
+            logger.exception("Could not write the metrics file %s", metrics_file_path)
+    return timings
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = [
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in items
+    ]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value is not None else "NaN"
+
+
+# Function to render every metric in the Prometheus text exposition format:
+# stage histograms and counters, artifact loading, micro-batching and caches
+def render_prometheus():
+    lines = [
+        "# HELP predtopic_stage_seconds Latency of app and service stages.",
+        "# TYPE predtopic_stage_seconds histogram",
+    ]
+    with _lock:
+        histograms = [
+            (key, dict(h, buckets=list(h["buckets"])))
+            for key, h in sorted(_histograms.items())
+        ]
+        reruns = dict(_reruns)
+    for (name, labels), histogram in histograms:
+        labels = (("stage", name),) + labels
+        for bound, count in zip(buckets, histogram["buckets"]):
+            lines.append(
+                f"predtopic_stage_seconds_bucket{_format_labels(labels, [('le', bound)])} {count}"
+            )
+        lines.append(
+            f"predtopic_stage_seconds_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}"
+        )
+        lines.append(
+            f"predtopic_stage_seconds_sum{_format_labels(labels)} {histogram['sum']!r}"
+        )
+        lines.append(
+            f"predtopic_stage_seconds_count{_format_labels(labels)} {histogram['count']}"
+        )
+
+    lines += [
+        "# HELP predtopic_stage_errors_total Stages that raised an exception.",
+        "# TYPE predtopic_stage_errors_total counter",
+    ]
+    for (name, labels), histogram in histograms:
+        labels = (("stage", name),) + labels
+        lines.append(
+            f"predtopic_stage_errors_total{_format_labels(labels)} {histogram['errors']}"
+        )
+
+    lines += [
+        "# HELP predtopic_reruns_total Streamlit script reruns.",
+        "# TYPE predtopic_reruns_total counter",
+        f"predtopic_reruns_total {reruns['count']}",
+        "# HELP predtopic_rerun_seconds_total Total time of Streamlit script reruns.",
+        "# TYPE predtopic_rerun_seconds_total counter",
+        f"predtopic_rerun_seconds_total {reruns['seconds_sum']!r}",
+    ]
+    lines += _render_components()
+    return "\n".join(lines) + "\n"
+
+
+# Gauges of the artifact registry, the BERTopic micro-batcher and the caches
+def _render_components():
+    from utils.artifacts import registry
+    from utils.prediction import (
+        bertopic_batcher,
+        prediction_cache,
+        query_embedding_cache,
+    )
+
+    lines = [
+        "# HELP predtopic_artifact_loaded Whether an artifact is loaded.",
+        "# TYPE predtopic_artifact_loaded gauge",
+    ]
+    rows = registry.stats()
+    for row in rows:
+        labels = _format_labels([("artifact", row["artifact"])])
+        lines.append(f"predtopic_artifact_loaded{labels} {int(row['loaded'])}")
+    for metric, field in [
+        ("predtopic_artifact_load_seconds", "load_seconds"),
+        ("predtopic_artifact_memory_bytes", "memory_bytes"),
+    ]:
+        lines.append(f"# TYPE {metric} gauge")
+        for row in rows:
+            if row.get(field) is not None:
+                labels = _format_labels([("artifact", row["artifact"])])
+                lines.append(f"{metric}{labels} {_format_value(row[field])}")
+
+    batcher = bertopic_batcher.stats()
+    labels = _format_labels([("batcher", batcher["name"])])
+    for field, kind in [
+        ("batches", "counter"),
+        ("items", "counter"),
+        ("queue_seconds_sum", "counter"),
+        ("queue_seconds_max", "gauge"),
+        ("process_seconds_sum", "counter"),
+    ]:
+        metric = f"predtopic_batcher_{field}"
+        if kind == "counter":
+            metric = metric.replace("_sum", "") + "_total"
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric}{labels} {_format_value(batcher[field])}")
+
+    caches = [
+        ("prediction", prediction_cache),
+        ("query_embedding", query_embedding_cache),
+    ]
+    for field in [
+        "entries",
+        "bytes",
+        "hits",
+        "disk_hits",
+        "misses",
+        "evictions",
+        "disk_evictions",
+    ]:
+        kind = "gauge" if field in ["entries", "bytes"] else "counter"
+        metric = f"predtopic_cache_{field}" + ("_total" if kind == "counter" else "")
+        lines.append(f"# TYPE {metric} {kind}")
+        for cache_name, cache in caches:
+            labels = _format_labels([("cache", cache_name)])
+            lines.append(f"{metric}{labels} {_format_value(cache.stats()[field])}")
+    return lines
+
+
+# Function to write the metrics file atomically (e.g. for a textfile collector).
+# Reruns of concurrent sessions finish in different threads: each writes its own
+# temporary file, one at a time.
+def write_metrics_file(path):
+    content = render_prometheus()
+    with _file_lock:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path) or ".", prefix=".metrics.", suffix=".tmp"
+        )
+        try:
+            os.fchmod(fd, 0o644)  # mkstemp creates it readable by the owner only
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,285 @@
+# Read-only, memory-mapped model arrays shared by all app and service processes.
+#
+# With PREDTOPIC_MMAP_MODELS=1 the large model matrices are memory-mapped instead of
+# copied into every process: LDA's expElogbeta (gensim mmap="r"), BERTopic's topic
+# embeddings (mapped straight from the .safetensors file).
+# Pages of a mapped file live once in the OS page cache, so N workers share one
+# physical copy.
+#
+# Optionally compact the matrices to float16 (or float32) once with:
+#   python -m utils.model_store compact --dtype float16
+# This writes .npy files to models/compact/ (also LDA's topic-word statistics, which
+# gensim keeps inside its pickled state, and BERTopic's c-TF-IDF matrix) and reports
+# the accuracy impact. When they are current, the mmap mode maps them instead.
+# The gensim dictionary is a pickled Python object and cannot be mapped.
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+import scipy.sparse as sp
+
+compact_path = "models/compact/"
+safetensors_dtypes = {
+    "F64": np.float64,
+    "F32": np.float32,
+    "F16": np.float16,
+    "I64": np.int64,
+    "I32": np.int32,
+}
+
+
+def mmap_enabled():
+    return os.environ.get("PREDTOPIC_MMAP_MODELS") == "1"
+
+
+# Function to memory-map every tensor of a .safetensors file as a read-only array
+def map_safetensors(path):
+    with open(path, "rb") as f:
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size))
+    arrays = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        start, end = info["data_offsets"]
+        dtype = np.dtype(safetensors_dtypes[info["dtype"]])
+        arrays[name] = np.memmap(
+            path,
+            dtype=dtype,
+            mode="r",
+            offset=8 + header_size + start,
+            shape=((end - start) // dtype.itemsize,),
+        ).reshape(info["shape"])
+    return arrays
+
+
+# Function to read the compaction metadata, or None when missing or made from other
+# model files than the current ones
+def read_compact_meta(model_type, model_version):
+    meta_path = os.path.join(compact_path, f"{model_type}.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    return meta if meta["model_version"] == model_version else None
+
+
+def _compact_file(model_type, name):
+    return os.path.join(compact_path, f"{model_type}.{name}.npy")
+
+
+def _load_compact(model_type, name):
+    return np.load(_compact_file(model_type, name), mmap_mode="r")
+
+
+# Function to switch a loaded LDA model to compacted, memory-mapped arrays.
+# Returns the dtype used, or None when no current compaction exists.
+def map_lda_arrays(lda_model, model_version):
+    meta = read_compact_meta("lda", model_version)
+    if meta is None:
+        return None
+    lda_model.expElogbeta = _load_compact("lda", "expElogbeta")
+    lda_model.state.sstats = _load_compact("lda", "sstats")
+    return meta["dtype"]
+
+
+# Function to switch a loaded BERTopic model to memory-mapped topic embeddings and
+# c-TF-IDF matrix when compacted, otherwise to the topic embeddings of the
+# .safetensors file (its c-TF-IDF indices are unsorted, and scipy sorts them in
+# place, so that matrix stays in memory)
+def map_bertopic_arrays(bertopic_model, model_path, model_version):
+    meta = read_compact_meta("bertopic", model_version)
+    if meta is None:
+        bertopic_model.topic_embeddings_ = map_safetensors(
+            f"{model_path}/topic_embeddings.safetensors"
+        )["topic_embeddings"]
+        return None
+
+    bertopic_model.topic_embeddings_ = _load_compact("bertopic", "topic_embeddings")
+    ctfidf = {
+        name: _load_compact("bertopic", f"ctfidf_{name}")
+        for name in ["data", "indices", "indptr", "shape"]
+    }
+    c_tf_idf = sp.csr_matrix(
+        (ctfidf["data"], ctfidf["indices"], ctfidf["indptr"]),
+        shape=tuple(int(n) for n in ctfidf["shape"]),
+        copy=False,
+    )
+    c_tf_idf.has_sorted_indices = True  # sorted by compact_bertopic
+    bertopic_model.c_tf_idf_ = c_tf_idf
+    return meta["dtype"]
+
+
+# COMPACTION
+
+
+def _save(model_type, name, array):
+    path = _compact_file(model_type, name)
+    with open(f"{path}.tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(f"{path}.tmp", path)
+
+
+def _save_meta(model_type, meta):
+    path = os.path.join(compact_path, f"{model_type}.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+# Function to get the differences between two sets of topic distributions
+def distribution_report(expected, actual):
+    return {
+        "max_abs_diff": float(np.abs(actual - expected).max()),
+        "mean_abs_diff": float(np.abs(actual - expected).mean()),
+        "top_topic_agreement": float(
+            (actual.argmax(axis=1) == expected.argmax(axis=1)).mean()
+        ),
+    }
+
+
+# Function to get the cosine similarities of queries (rows) with vectors (rows)
+def cosine_similarities(queries, vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries @ (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).T
+
+
+# Function to compact the LDA arrays and report the accuracy impact: topic
+# distributions of documents sampled from the model (same deterministic E-step,
+# full vs compacted expElogbeta) and top 10 words per topic
+def compact_lda(lda_model, model_version, dtype, num_docs=2000):
+    from utils.lda_inference import LdaInference, bows_to_csr, synthetic_bows
+
+    expElogbeta = np.asarray(lda_model.expElogbeta)
+    sstats = np.asarray(lda_model.state.sstats)
+    compact_expElogbeta = expElogbeta.astype(dtype)
+    # Topic-word counts may exceed the float16 range, then they stay float32
+    sstats_dtype = dtype
+    if np.abs(sstats).max() > np.finfo(dtype).max:
+        sstats_dtype = np.float32
+    compact_sstats = sstats.astype(sstats_dtype)
+
+    counts = bows_to_csr(synthetic_bows(lda_model, num_docs), lda_model.num_terms)
+    engine = LdaInference.from_lda(lda_model)
+    expected = engine.distributions(counts)
+    engine = LdaInference(
+        compact_expElogbeta,
+        lda_model.alpha,
+        lda_model.iterations,
+        lda_model.gamma_threshold,
+    )
+    report = distribution_report(expected, engine.distributions(counts))
+
+    lambdas = lda_model.eta + sstats
+    compact_lambdas = lda_model.eta + compact_sstats.astype(np.float32)
+    top_words = np.argsort(-lambdas, axis=1)[:, :10]
+    compact_top_words = np.argsort(-compact_lambdas, axis=1)[:, :10]
+    report["top_words_agreement"] = float((top_words == compact_top_words).mean())
+
+    os.makedirs(compact_path, exist_ok=True)
+    _save("lda", "expElogbeta", compact_expElogbeta)
+    _save("lda", "sstats", compact_sstats)
+    report["bytes_before"] = expElogbeta.nbytes + sstats.nbytes
+    report["bytes_after"] = compact_expElogbeta.nbytes + compact_sstats.nbytes
+    _save_meta(
+        "lda", {"model_version": model_version, "dtype": dtype, "report": report}
+    )
+    return report
+
+
+# Function to compact the BERTopic arrays and report the accuracy impact: nearest
+# topic of query embeddings (stored corpus embeddings, or noisy topic embeddings
+# when none were built) and c-TF-IDF values
+def compact_bertopic(model_path, model_version, dtype, num_queries=2000):
+    from utils.embedding_store import open_embedding_store
+
+    embeddings = np.asarray(
+        map_safetensors(f"{model_path}/topic_embeddings.safetensors")[
+            "topic_embeddings"
+        ]
+    )
+    ctfidf = map_safetensors(f"{model_path}/ctfidf.safetensors")
+    c_tf_idf = sp.csr_matrix(
+        (np.array(ctfidf["data"]), np.array(ctfidf["indices"]), ctfidf["indptr"]),
+        shape=tuple(int(n) for n in ctfidf["shape"]),
+    )
+    c_tf_idf.sort_indices()
+    compact_embeddings = embeddings.astype(dtype)
+    # scipy.sparse has no float16 support, c-TF-IDF values are kept in float32
+    compact_data = c_tf_idf.data.astype(np.result_type(dtype, np.float32))
+
+    store = open_embedding_store()
+    if store is not None and store.count:
+        queries = np.asarray(store.vectors[:num_queries], dtype=np.float32)
+    else:
+        rng = np.random.default_rng(0)
+        queries = embeddings[rng.integers(0, len(embeddings), num_queries)]
+        queries = queries + rng.normal(0, queries.std(), queries.shape)
+
+    report = distribution_report(
+        cosine_similarities(queries, embeddings),
+        cosine_similarities(queries, compact_embeddings),
+    )
+    data = c_tf_idf.data
+    report["ctfidf_max_rel_diff"] = float(
+        (np.abs(compact_data - data) / np.maximum(np.abs(data), 1e-12)).max()
+    )
+
+    os.makedirs(compact_path, exist_ok=True)
+    _save("bertopic", "topic_embeddings", compact_embeddings)
+    _save("bertopic", "ctfidf_data", compact_data)
+    _save("bertopic", "ctfidf_indices", c_tf_idf.indices)
+    _save("bertopic", "ctfidf_indptr", c_tf_idf.indptr)
+    _save("bertopic", "ctfidf_shape", np.asarray(c_tf_idf.shape))
+    report["bytes_before"] = embeddings.nbytes + data.nbytes
+    report["bytes_after"] = compact_embeddings.nbytes + compact_data.nbytes
+    _save_meta(
+        "bertopic", {"model_version": model_version, "dtype": dtype, "report": report}
+    )
+    return report
+
+
+def main(argv=None):
+    import argparse
+
+    from gensim.models import LdaModel
+
+    from utils import artifacts
+    from utils.artifacts import registry
+
+    parser = argparse.ArgumentParser(
+        description="Compact model matrices for memory-mapped loading."
+    )
+    parser.add_argument("command", choices=["compact"])
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    parser.add_argument(
+        "--models", nargs="+", choices=["bertopic", "lda"], default=["bertopic", "lda"]
+    )
+    args = parser.parse_args(argv)
+
+    reports = {}
+    if "lda" in args.models:
+        # The stored model, not the registry's (which may use compacted arrays)
+        reports["lda"] = compact_lda(
+            LdaModel.load(artifacts.best_lda_model_path),
+            registry.get("lda_model_version"),
+            args.dtype,
+        )
+    if "bertopic" in args.models:
+        reports["bertopic"] = compact_bertopic(
+            artifacts.bertopic_model_path,
+            registry.get("bertopic_model_version"),
+            args.dtype,
+        )
+    for model_type, report in reports.items():
+        print(f"{model_type} ({args.dtype}, written to {compact_path})")
+        for key, value in report.items():
+            print(f"  {key:<24} {value:.6g}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+# Offline management of the NLTK resources used by utils/preprocessing.py.
+#
+# Resources are looked up in the local NLTK data paths (plus ./nltk_data, or the
+# directory in $PREDTOPIC_NLTK_DATA) only when a preprocessing function first
+# needs them; nothing is downloaded implicitly. Fill the local directory once with:
+#   python -m utils.nltk_resources prepare --download       # on a machine with network
+# For machines without network, build nltk_data.zip where the resources are
+# prepared and copy it next to the app there:
+#   python -m utils.nltk_resources pack                     # build nltk_data.zip
+#   python -m utils.nltk_resources prepare                  # extract nltk_data.zip
+#   python -m utils.nltk_resources check                    # report status and cold-start time
+import argparse
+import importlib
+import os
+import shutil
+import sys
+import tarfile
+import threading
+import time
+import zipfile
+
+nltk_data_dir = os.environ.get("PREDTOPIC_NLTK_DATA", "nltk_data")
+archive_path = "nltk_data.zip"
+
+# Resource name -> path inside an NLTK data directory
+resources = {
+    "punkt": "tokenizers/punkt",
+    "punkt_tab": "tokenizers/punkt_tab",
+    "stopwords": "corpora/stopwords",
+    "wordnet": "corpora/wordnet",
+    "averaged_perceptron_tagger": "taggers/averaged_perceptron_tagger",
+    "averaged_perceptron_tagger_eng": "taggers/averaged_perceptron_tagger_eng",
+}
+
+_available = set()
+_lock = threading.Lock()
+load_times = {}
+
+
+# Function to add the local data directory to NLTK's search path
+def configure_data_path():
+    import nltk
+
+    data_dir = os.path.abspath(nltk_data_dir)
+    if data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+
+
+# Function to make sure resources are available locally, without any network I/O
+def require(*names):
+    missing = [name for name in names if name not in _available]
+    if not missing:
+        return
+    with _lock:
+        import nltk
+
+        configure_data_path()
+        for name in missing:
+            start = time.perf_counter()
+            try:
+                nltk.data.find(resources[name])
+            except LookupError:
+                raise LookupError(
+                    f"NLTK resource '{name}' is not installed locally. "
+                    "Run: python -m utils.nltk_resources prepare --download (or "
+                    "prepare, to extract nltk_data.zip)"
+                ) from None
+            _available.add(name)
+            load_times[name] = time.perf_counter() - start
+
+
+# Function to check that the members of an archive stay inside the target directory
+def check_member_paths(names, target):
+    root = os.path.realpath(target)
+    for name in names:
+        path = os.path.realpath(os.path.join(root, name))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"Archive member outside the target directory: {name}")
+
+
+# Function to extract an archive built by pack (.zip, or .tar.gz) into the data directory
+def prepare_from_archive(archive, target):
+    if not os.path.isfile(archive):
+        raise FileNotFoundError(
+            f"Archive {archive} not found. Build it with "
+            "python -m utils.nltk_resources pack on a machine with the resources "
+            "(or network: prepare --download), or pass --archive"
+        )
+    os.makedirs(target, exist_ok=True)
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as f:
+            check_member_paths(f.namelist(), target)
+            f.extractall(target)
+    else:
+        with tarfile.open(archive) as f:
+            members = f.getmembers()
+            check_member_paths([member.name for member in members], target)
+            if hasattr(tarfile, "data_filter"):
+                # Also rejects links pointing outside target, special files, etc.
+                f.extractall(target, filter="data")
+            else:
+                if any(member.issym() or member.islnk() for member in members):
+                    raise ValueError("Links are not supported in the archive")
+                f.extractall(target, members=members)
+
+
+# Function to download every resource into the data directory (needs network)
+def prepare_from_download(target):
+    import nltk
+
+    for name in resources:
+        if not nltk.download(name, download_dir=target, quiet=True):
+            raise RuntimeError(f"Failed to download NLTK resource '{name}'")
+
+
+# Function to pack the data directory into an archive for air-gapped machines
+def pack(target, archive):
+    base_name = archive[: -len(".zip")] if archive.endswith(".zip") else archive
+    return shutil.make_archive(base_name, "zip", root_dir=target)
+
+
+# Function to get this module as preprocessing imports it: run with python -m, this
+# file is __main__, a second instance whose lookups and load_times are not used
+def _imported_module():
+    return importlib.import_module("utils.nltk_resources")
+
+
+# Function to measure cold-start cost: import, resource lookup and first use
+def measure_cold_start():
+    timings = {}
+    start = time.perf_counter()
+    from utils import preprocessing
+
+    timings["import utils.preprocessing"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _imported_module().require(*resources)
+    timings["resource lookup"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    preprocessing.single_text_preprocessing("Cold start check for topic modeling.")
+    timings["first preprocessing call"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    preprocessing.single_text_preprocessing("Warm check for topic modeling.")
+    timings["second preprocessing call"] = time.perf_counter() - start
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage local NLTK resources.")
+    parser.add_argument("command", choices=["prepare", "pack", "check"])
+    parser.add_argument("--target", default=nltk_data_dir)
+    parser.add_argument("--archive", default=archive_path)
+    parser.add_argument(
+        "--download",
+        action="store_true",
+        help="Download the resources instead of extracting the archive",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "prepare":
+        if args.download:
+            prepare_from_download(args.target)
+        else:
+            try:
+                prepare_from_archive(args.archive, args.target)
+            except (FileNotFoundError, ValueError) as e:
+                print(e)
+                return 1
+        print(f"NLTK resources prepared in {args.target}")
+    elif args.command == "pack":
+        print(f"Packed {args.target} into {pack(args.target, args.archive)}")
+    else:
+        try:
+            timings = measure_cold_start()
+        except LookupError as e:
+            print(e)
+            return 1
+        for name, seconds in timings.items():
+            print(f"{name:<28}{seconds * 1000:>10.1f} ms")
+        for name, seconds in _imported_module().load_times.items():
+            print(f"  lookup {name:<30}{seconds * 1000:>8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+# Streaming topic prediction for corpora that do not fit in memory.
+#
+# Usage:
+#   python -m utils.pipeline corpus.parquet predictions/ --keep-columns DOI Year
+#   python -m utils.pipeline corpus.csv predictions/ --models lda --n-jobs 4
+#
+# Stages are generators: read chunks -> preprocess (LDA bags of words) -> predict
+# (BERTopic transform and LDA inference, one call per chunk) -> write. Each stage
+# runs in its own thread and hands chunks over through a bounded queue, so a fast
+# stage blocks when the next one falls behind (backpressure). At most about
+# stages * (queue_size + 1) chunks are in memory, whatever the corpus size.
+#
+# Output is a directory of Parquet files, one per chunk, read back with
+# pd.read_parquet("predictions/"). Every part is written atomically and recorded in
+# predictions/_checkpoint.json; running the same command again after a crash resumes
+# after the last written chunk, skipping the rows already written without parsing
+# them. With --n-jobs > 1 one process pool is created per run and shared by the
+# stages.
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.artifacts import current_rss, registry
+from utils.batch_predict import add_bertopic_columns, add_lda_columns, read_chunks
+from utils.prediction import (
+    predict_topics_bertopic_batch,
+    predict_topics_lda_bows,
+    texts_to_bows,
+)
+from utils.preprocessing import process_pool, resolve_n_jobs
+from utils.topic_index import source_signature
+
+logger = logging.getLogger(__name__)
+
+checkpoint_name = "_checkpoint.json"
+_done = object()
+
+
+# Function to put an item on a queue, giving up when the consumer stopped
+def _put(items, item, stop):
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+# Function to run a generator in a background thread, buffering at most maxsize
+# items ahead of the consumer. Errors of the generator are raised in the consumer.
+def buffered(iterable, maxsize=2, name="stage"):
+    items = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                if not _put(items, (item, None), stop):
+                    return
+            _put(items, (_done, None), stop)
+        except BaseException as e:
+            _put(items, (_done, e), stop)
+
+    thread = threading.Thread(target=produce, name=f"pipeline-{name}", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is _done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+# STAGES
+# Chunks flow through the stages as dicts: number, frame (kept columns), texts,
+# and the outputs of the previous stages.
+
+
+# Function to read the input in chunks, after the skip_rows rows (in skip_chunks
+# chunks) already written before a restart
+def read_stage(
+    input_path, text_column, keep_columns, chunk_size, skip_chunks=0, skip_rows=0
+):
+    columns = list(dict.fromkeys(keep_columns + [text_column]))
+    frames = read_chunks(input_path, chunk_size, columns, skip_rows)
+    for number, frame in enumerate(frames, start=skip_chunks):
+        yield {
+            "number": number,
+            "frame": frame[keep_columns].reset_index(drop=True),
+            "texts": frame[text_column].fillna("").astype(str).tolist(),
+        }
+
+
+def preprocess_stage(chunks, models, n_jobs=1, executor=None):
+    for chunk in chunks:
+        if "lda" in models:
+            chunk["bows"] = texts_to_bows(chunk["texts"], n_jobs, executor)
+        yield chunk
+
+
+def predict_stage(chunks, models, n_jobs=1, executor=None):
+    for chunk in chunks:
+        result = chunk["frame"]
+        if "bertopic" in models:
+            add_bertopic_columns(
+                result,
+                *predict_topics_bertopic_batch(
+                    chunk["texts"], registry.get("bertopic_model")
+                ),
+            )
+        if "lda" in models:
+            add_lda_columns(
+                result,
+                *predict_topics_lda_bows(
+                    chunk["bows"], registry.get("lda_model"), n_jobs, executor
+                ),
+            )
+        yield {"number": chunk["number"], "result": result}
+
+
+# Function to write every chunk as a Parquet part, then record it in the checkpoint.
+# Parts get the schema of the first part, so they read back as one dataset.
+def write_stage(chunks, output_dir, checkpoint):
+    schema = None
+    first_part_path = os.path.join(output_dir, "part-000000.parquet")
+    if os.path.exists(first_part_path):
+        schema = pq.read_schema(first_part_path)
+    for chunk in chunks:
+        part_path = os.path.join(output_dir, f"part-{chunk['number']:06d}.parquet")
+        table = pa.Table.from_pandas(
+            chunk["result"], schema=schema, preserve_index=False
+        )
+        schema = table.schema
+        pq.write_table(table, f"{part_path}.tmp")
+        os.replace(f"{part_path}.tmp", part_path)
+
+        checkpoint["completed_chunks"] = chunk["number"] + 1
+        checkpoint["documents"] += len(chunk["result"])
+        save_checkpoint(output_dir, checkpoint)
+        yield chunk["number"], len(chunk["result"])
+
+
+# CHECKPOINT
+
+
+def save_checkpoint(output_dir, checkpoint):
+    path = os.path.join(output_dir, checkpoint_name)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+# Function to load the checkpoint of a previous run with the same settings, or
+# start a new one. A checkpoint of other settings or another input is an error.
+def load_checkpoint(output_dir, settings, restart=False):
+    path = os.path.join(output_dir, checkpoint_name)
+    if os.path.exists(path) and not restart:
+        with open(path, "r") as f:
+            checkpoint = json.load(f)
+        if checkpoint["settings"] != settings:
+            raise ValueError(
+                f"{output_dir} holds a run with other settings or input, "
+                "use another output directory or --restart"
+            )
+        return checkpoint
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(output_dir):
+        if name.startswith("part-") and name.endswith((".parquet", ".tmp")):
+            os.remove(os.path.join(output_dir, name))
+    return {"settings": settings, "completed_chunks": 0, "documents": 0}
+
+
+def run(
+    input_path,
+    output_dir,
+    text_column="Abstract",
+    keep_columns=(),
+    models=("bertopic", "lda"),
+    chunk_size=1000,
+    queue_size=2,
+    n_jobs=1,
+    restart=False,
+):
+    keep_columns = list(keep_columns)
+    settings = {
+        "input": os.path.abspath(input_path),
+        "input_signature": source_signature([input_path]),
+        "text_column": text_column,
+        "keep_columns": keep_columns,
+        "models": sorted(models),
+        "chunk_size": chunk_size,
+    }
+    checkpoint = load_checkpoint(output_dir, settings, restart)
+    if checkpoint["completed_chunks"]:
+        logger.info(
+            "Resuming after chunk %d (%d documents written)",
+            checkpoint["completed_chunks"] - 1,
+            checkpoint["documents"],
+        )
+
+    # One process pool for the whole run, created before the stage threads start
+    n_jobs = resolve_n_jobs(n_jobs)
+    executor = process_pool(n_jobs) if n_jobs > 1 else None
+    try:
+        chunks = read_stage(
+            input_path,
+            text_column,
+            keep_columns,
+            chunk_size,
+            checkpoint["completed_chunks"],
+            checkpoint["documents"],
+        )
+        chunks = buffered(chunks, queue_size, "read")
+        chunks = buffered(
+            preprocess_stage(chunks, models, n_jobs, executor),
+            queue_size,
+            "preprocess",
+        )
+        chunks = buffered(
+            predict_stage(chunks, models, n_jobs, executor), queue_size, "predict"
+        )
+
+        start = time.perf_counter()
+        num_docs = 0
+        for number, size in write_stage(chunks, output_dir, checkpoint):
+            num_docs += size
+            elapsed = time.perf_counter() - start
+            rss = current_rss()
+            logger.info(
+                "Chunk %d: %d documents in %.1fs (%.1f docs/s, RSS %s MB)",
+                number,
+                num_docs,
+                elapsed,
+                num_docs / elapsed if elapsed else 0.0,
+                f"{rss / 2**20:.0f}" if rss is not None else "?",
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return num_docs, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Predict topics of a large corpus with bounded memory."
+    )
+    parser.add_argument("input", help="Input .csv, .jsonl or .parquet file")
+    parser.add_argument("output", help="Output directory of Parquet parts")
+    parser.add_argument("--text-column", default="Abstract")
+    parser.add_argument("--keep-columns", nargs="*", default=[])
+    parser.add_argument(
+        "--models", nargs="+", choices=["bertopic", "lda"], default=["bertopic", "lda"]
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument(
+        "--queue-size", type=int, default=2, help="chunks buffered between stages"
+    )
+    parser.add_argument(
+        "--n-jobs",
+        type=int,
+        default=1,
+        help="preprocessing (and batch LDA inference) processes (-1: all CPUs)",
+    )
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore the checkpoint, start over"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    num_docs, elapsed = run(
+        args.input,
+        args.output,
+        args.text_column,
+        args.keep_columns,
+        args.models,
+        args.chunk_size,
+        args.queue_size,
+        args.n_jobs,
+        args.restart,
+    )
+    logger.info(
+        "Done: %d documents written to %s in %.1fs", num_docs, args.output, elapsed
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
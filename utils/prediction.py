@@ -0,0 +1,303 @@
+import os
+
+import numpy as np
+
+from utils.artifacts import registry
+from utils.batching import MicroBatcher
+from utils.corpus_store import document_columns
+from utils.metrics import stage
+from utils.prediction_cache import PredictionCache
+from utils.preprocessing import batch_text_preprocessing, single_text_preprocessing
+
+
+# Function for new prediction using BERTopic
+def predict_topic_bertopic(new_text, bertopic_model):
+    with stage("inference", model="BERTopic"):
+        [topic_id], [probability] = bertopic_model.transform([new_text])
+    return topic_id, probability
+
+
+# Function for new prediction using LDA
+# (minimum_probability=0 keeps every topic in the distribution)
+def predict_topic_lda(new_text, lda_model, minimum_probability=None):
+    # Preprocessed new text
+    with stage("preprocessing", model="LDA"):
+        processed_new_text = single_text_preprocessing(new_text)
+
+    # Convert new text to BoW (feature extraction)
+    new_bow = registry.get("dictionary").doc2bow(processed_new_text)
+
+    # Get topic distribution of the new text (prediction)
+    with stage("inference", model="LDA"):
+        new_topic_distribution, per_word_topics, _ = lda_model.get_document_topics(
+            new_bow, minimum_probability=minimum_probability, per_word_topics=True
+        )
+
+    # Sort topic distribution
+    sorted_topic_distribution = sorted(
+        new_topic_distribution, key=lambda x: x[1], reverse=True
+    )
+    topic_id = sorted_topic_distribution[0][0]
+
+    # Create tokens for visualization (tokenizer only, no tagging or parsing)
+    with stage("tokenization", model="LDA"):
+        tokens = [token.text for token in registry.get("nlp").tokenizer(new_text)]
+
+    return topic_id, sorted_topic_distribution, per_word_topics, tokens
+
+
+# Inference service (python -m utils.service) used as prediction backend when set
+api_url = os.environ.get("PREDTOPIC_API_URL")
+# Batch LDA inference: "gensim" (LdaModel.inference) or "batch" (utils.lda_inference,
+# the E-step of all documents at once with sparse matrix operations)
+lda_engine = os.environ.get("PREDTOPIC_LDA_ENGINE", "gensim")
+
+
+# Function for new prediction through the inference service, returns the same
+# values as predict_topic_bertopic / predict_topic_lda
+def predict_topic_remote(model_type, new_text):
+    import requests
+
+    with stage("remote_inference", model=model_type):
+        response = requests.post(
+            f"{api_url.rstrip('/')}/predict/{model_type.lower()}",
+            json={"text": new_text},
+            timeout=60,
+        )
+    response.raise_for_status()
+    result = response.json()
+    if model_type == "BERTopic":
+        distribution = None
+        if len(result["distribution"]) > 1:  # full distribution, ordered by topic
+            distribution = np.array(
+                [p["probability"] for p in result["distribution"]], dtype=np.float64
+            )
+        return result["topic_id"], result["probability"], distribution
+
+    distribution = [(p["topic_id"], p["probability"]) for p in result["distribution"]]
+    per_word_topics = [
+        (word_id, topics) for word_id, topics in result["per_word_topics"]
+    ]
+    return result["topic_id"], distribution, per_word_topics, result["tokens"]
+
+
+# Function to run one BERTopic transform for a micro-batch of texts
+def transform_batch_bertopic(texts):
+    topic_ids, probabilities = predict_topics_bertopic_batch(
+        texts, registry.get("bertopic_model"), use_query_cache=True
+    )
+    return list(zip(topic_ids, probabilities))
+
+
+# Concurrent BERTopic predictions (app sessions, service requests) are grouped into
+# one transform call, waiting at most max_wait_ms for other requests to join
+bertopic_batcher = MicroBatcher(
+    transform_batch_bertopic,
+    max_batch_size=int(os.environ.get("PREDTOPIC_BATCH_MAX_SIZE", "32")),
+    max_wait_ms=float(os.environ.get("PREDTOPIC_BATCH_MAX_WAIT_MS", "5")),
+    name="bertopic",
+)
+
+
+# Function for new prediction using BERTopic, batched with concurrent requests
+def predict_topic_bertopic_batched(new_text):
+    return bertopic_batcher.submit(new_text)
+
+
+# Function to split a BERTopic probability into the probability of the top topic
+# and the full topic distribution (None when the model only returns the former)
+def split_bertopic_probability(probability):
+    if getattr(probability, "ndim", 0) == 1:
+        return float(probability.max()), np.asarray(probability, dtype=np.float64)
+    return float(probability), None
+
+
+# Function for new prediction using BERTopic, locally or through the service.
+# Returns the topic id, its probability and the full distribution (or None).
+def predict_topic_bertopic_backend(new_text):
+    if api_url:
+        return predict_topic_remote("BERTopic", new_text)
+    topic_id, probability = predict_topic_bertopic_batched(new_text)
+    return (topic_id, *split_bertopic_probability(probability))
+
+
+# Function for new prediction using LDA, locally or through the service
+def predict_topic_lda_backend(new_text):
+    if api_url:
+        return predict_topic_remote("LDA", new_text)
+    return predict_topic_lda(new_text, registry.get("lda_model"))
+
+
+# Cache of predictions shared by all sessions, optionally persisted to a SQLite file
+prediction_cache = PredictionCache(
+    disk_path=os.environ.get("PREDTOPIC_PREDICTION_CACHE")
+)
+
+
+# Function for new prediction using BERTopic, served from the cache for repeated texts.
+# Entries hold the topic id, its probability and the full distribution (or None).
+def predict_topic_bertopic_cached(new_text):
+    return prediction_cache.get_or_compute(
+        "BERTopic-distribution",
+        registry.get("bertopic_model_version"),
+        new_text,
+        lambda: predict_topic_bertopic_backend(new_text),
+    )
+
+
+# Function for new prediction using LDA, served from the cache for repeated texts
+def predict_topic_lda_cached(new_text):
+    return prediction_cache.get_or_compute(
+        "LDA",
+        registry.get("lda_model_version"),
+        new_text,
+        lambda: predict_topic_lda_backend(new_text),
+    )
+
+
+# Recent query embeddings, so a text is not embedded again right after its
+# prediction (e.g. to search similar papers)
+query_embedding_cache = PredictionCache(max_entries=512, max_bytes=16 * 1024 * 1024)
+
+
+# Function to embed texts with BERTopic's embedding model. Embeddings in the
+# embedding store are reused instead of recomputed, and with use_query_cache those
+# in the query embedding cache (interactive queries only: for bulk scoring, hashing
+# and pickling every vector costs more than it saves).
+def embed_texts_bertopic(texts, bertopic_model, use_query_cache=False):
+    texts = list(texts)
+    version = registry.get("bertopic_model_version")
+
+    def embed_documents(texts_to_embed):
+        if not use_query_cache:
+            return np.asarray(
+                bertopic_model.embedding_model.embed_documents(texts_to_embed),
+                dtype=np.float32,
+            )
+        keys = [
+            query_embedding_cache.make_key("embedding", version, text)
+            for text in texts_to_embed
+        ]
+        embeddings = [query_embedding_cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = bertopic_model.embedding_model.embed_documents(
+                [texts_to_embed[i] for i in missing]
+            )
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+                query_embedding_cache.put(keys[i], embedding)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    embedding_store = registry.get("embedding_store")
+    if embedding_store is not None:
+        return embedding_store.embed(texts, embed_documents)
+    return embed_documents(texts)
+
+
+# Function to find the corpus papers most similar to a text, optionally only among
+# the papers of one BERTopic topic. Returns a DataFrame with a Similarity column, or
+# None when no corpus embeddings were built or predictions run on the service.
+def find_similar_papers(new_text, k=10, topic_id=None):
+    similarity_index = None if api_url else registry.get("similarity_index")
+    if similarity_index is None:
+        return None
+
+    query = embed_texts_bertopic(
+        [new_text], registry.get("bertopic_model"), use_query_cache=True
+    )[0]
+    positions = None
+    if topic_id is not None:
+        positions = registry.get("topic_index_bertopic").positions(topic_id)
+    with stage("similarity_search", model="BERTopic"):
+        found, similarities = similarity_index.search(query, k, positions)
+
+    papers = registry.get("topic_table_bertopic").rows(
+        found, document_columns + ["Top Topic ID"]
+    )
+    papers["Similarity"] = similarities
+    return papers
+
+
+# Function to search the corpus for a query (BM25 over titles and abstracts),
+# optionally only among the papers of some topics of a model ("LDA" or "BERTopic")
+# and of a range of years. Returns a DataFrame with a Score column, or None when
+# the search index has not been built.
+def search_papers(query, k=10, model_type="BERTopic", topic_ids=None, years=None):
+    search_index = registry.get("search_index")
+    if search_index is None:
+        return None
+
+    model_type = model_type.lower()
+    with stage("search", model=model_type):
+        found, scores = search_index.search(
+            single_text_preprocessing(query), k, model_type, topic_ids, years
+        )
+    papers = registry.get(f"topic_table_{model_type}").rows(
+        found, document_columns + ["Top Topic ID"]
+    )
+    papers["Score"] = scores
+    return papers
+
+
+# Function for batch prediction using BERTopic, texts are embedded in one transform call.
+# Probabilities are 1-D (top topic only) unless the model calculates full distributions.
+# use_query_cache is for interactive predictions (see embed_texts_bertopic).
+def predict_topics_bertopic_batch(texts, bertopic_model, use_query_cache=False):
+    texts = list(texts)
+    with stage("embedding", model="BERTopic"):
+        embeddings = embed_texts_bertopic(texts, bertopic_model, use_query_cache)
+    with stage("inference", model="BERTopic"):
+        topic_ids, probabilities = bertopic_model.transform(
+            texts, embeddings=embeddings
+        )
+    return topic_ids, probabilities
+
+
+# Function to convert texts to bags of words for LDA (preprocessing included),
+# optionally in the process pool of the caller (see batch_text_preprocessing)
+def texts_to_bows(texts, n_jobs=1, executor=None):
+    dictionary = registry.get("dictionary")
+    with stage("preprocessing", model="LDA"):
+        return [
+            dictionary.doc2bow(tokens)
+            for tokens in batch_text_preprocessing(
+                texts, n_jobs=n_jobs, executor=executor
+            )
+        ]
+
+
+# Function for batch prediction using LDA on bags of words, returns top topic ids
+# and the full (n_texts x n_topics) distribution. Equals get_document_topics
+# without the minimum probability filter, as gamma is normalized the same way.
+# The batch engine shards batches across n_jobs processes, in the process pool of
+# the caller when given (see infer_distributions).
+def predict_topics_lda_bows(bows, lda_model, n_jobs=1, executor=None):
+    with stage("inference", model="LDA", engine=lda_engine):
+        if lda_engine == "batch":
+            from utils.lda_inference import (
+                LdaInference,
+                bows_to_csr,
+                infer_distributions,
+            )
+
+            # The registry's engine is built once per process for the app's model
+            if registry.is_loaded("lda_model") and lda_model is registry.get(
+                "lda_model"
+            ):
+                engine = registry.get("lda_engine")
+            else:
+                engine = LdaInference.from_lda(lda_model)
+            counts = bows_to_csr(bows, lda_model.num_terms, engine.dtype)
+            distributions = infer_distributions(
+                engine, counts, n_jobs, executor=executor
+            )
+        else:
+            gamma, _ = lda_model.inference(bows)
+            distributions = gamma / gamma.sum(axis=1, keepdims=True)
+    return distributions.argmax(axis=1), distributions
+
+
+# Function for batch prediction using LDA
+def predict_topics_lda_batch(texts, lda_model):
+    return predict_topics_lda_bows(texts_to_bows(texts), lda_model)
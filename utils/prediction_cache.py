@@ -0,0 +1,177 @@
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+# Function to normalize input text, so trivially different submissions share an entry
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+# Bounded LRU cache of topic predictions, keyed by model, model version and a hash
+# of the normalized input text. Entries are evicted when either the number of entries
+# or their total (pickled) size exceeds its limit. An optional SQLite file keeps
+# entries across restarts, bounded the same way (max_disk_entries, max_disk_bytes):
+# on insert, the rows least recently written or read from disk are deleted.
+class PredictionCache:
+    def __init__(
+        self,
+        max_entries=1024,
+        max_bytes=64 * 1024 * 1024,
+        disk_path=None,
+        max_disk_entries=100_000,
+        max_disk_bytes=256 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._disk = None
+        self.total_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, value BLOB)"
+            )
+            # Files written before the disk tier was bounded lack these columns
+            columns = [
+                row[1] for row in self._disk.execute("PRAGMA table_info(predictions)")
+            ]
+            if "size" not in columns:
+                self._disk.execute("ALTER TABLE predictions ADD COLUMN size INTEGER")
+                self._disk.execute("UPDATE predictions SET size = length(value)")
+            if "accessed_at" not in columns:
+                self._disk.execute(
+                    "ALTER TABLE predictions ADD COLUMN accessed_at REAL DEFAULT 0"
+                )
+            self._disk.execute(
+                "CREATE INDEX IF NOT EXISTS predictions_accessed_at "
+                "ON predictions (accessed_at)"
+            )
+            self._disk.commit()
+
+    @staticmethod
+    def make_key(model_name, model_version, text):
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{model_name}:{model_version}:{digest}"
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pickle.loads(self._entries[key])
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT value FROM predictions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self.disk_hits += 1
+                    self._disk.execute(
+                        "UPDATE predictions SET accessed_at = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+                    self._disk.commit()
+                    self._store(key, row[0])
+                    return pickle.loads(row[0])
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._store(key, blob)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO predictions (key, value, size, accessed_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, blob, len(blob), time.time()),
+                )
+                self._evict_disk()
+                self._disk.commit()
+
+    # Function to return the cached value, or compute, store and return it
+    def get_or_compute(self, model_name, model_version, text, compute):
+        key = self.make_key(model_name, model_version, text)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def _store(self, key, blob):
+        if key in self._entries:
+            self.total_bytes -= self._sizes[key]
+        self._entries[key] = blob
+        self._entries.move_to_end(key)
+        self._sizes[key] = len(blob)
+        self.total_bytes += len(blob)
+
+        while self._entries and (
+            len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            evicted, _ = self._entries.popitem(last=False)
+            self.total_bytes -= self._sizes.pop(evicted)
+            self.evictions += 1
+
+    # Function to delete the least recently used rows of the SQLite file while it
+    # holds more than max_disk_entries rows or max_disk_bytes bytes
+    def _evict_disk(self):
+        count, total_bytes = self._disk.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM predictions"
+        ).fetchone()
+        if count <= self.max_disk_entries and total_bytes <= self.max_disk_bytes:
+            return
+        deleted = self._disk.execute(
+            """
+            DELETE FROM predictions WHERE key IN (
+                SELECT key FROM (
+                    SELECT
+                        key,
+                        ROW_NUMBER() OVER newest AS position,
+                        SUM(size) OVER newest AS kept_bytes
+                    FROM predictions
+                    WINDOW newest AS (
+                        ORDER BY accessed_at DESC, rowid DESC
+                        ROWS UNBOUNDED PRECEDING
+                    )
+                )
+                WHERE position > ? OR kept_bytes > ?
+            )
+            """,
+            (self.max_disk_entries, self.max_disk_bytes),
+        ).rowcount
+        self.disk_evictions += deleted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+        }
@@ -1,17 +1,64 @@
+import multiprocessing
+import os
 import re
-import nltk
-from nltk.corpus import stopwords, wordnet
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
-from nltk import pos_tag
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
-# Ensure necessary NLTK data is downloaded
-nltk.download("punkt")
-nltk.download("punkt_tab")
-nltk.download("stopwords")
-nltk.download("wordnet")
-nltk.download("averaged_perceptron_tagger")
-nltk.download("averaged_perceptron_tagger_eng")
+from utils.nltk_resources import require
+
+# NLTK and its data are loaded lazily by the getters below, so importing this
+# module does no network or disk I/O (see utils/nltk_resources.py).
+
+# WordNet POS constants (same values as nltk.corpus.wordnet.ADJ, VERB, NOUN, ADV)
+ADJ, VERB, NOUN, ADV = "a", "v", "n", "r"
+
+
+# Precompiled cleaning patterns
+url_pattern = re.compile(r"http\S+|www\S+|https\S+", flags=re.MULTILINE)
+punctuation_pattern = re.compile(r"[^\w\s]")
+number_pattern = re.compile(r"\d+")
+whitespace_pattern = re.compile(r"\s+")
+
+# Resources kept resident per process (each worker of a process pool builds its own)
+_resources = {}
+
+
+def get_word_tokenize():
+    if "word_tokenize" not in _resources:
+        require("punkt", "punkt_tab")
+        from nltk.tokenize import word_tokenize
+
+        _resources["word_tokenize"] = word_tokenize
+    return _resources["word_tokenize"]
+
+
+def get_stopword_set():
+    if "stopwords" not in _resources:
+        require("stopwords")
+        from nltk.corpus import stopwords
+
+        _resources["stopwords"] = frozenset(stopwords.words("english"))
+    return _resources["stopwords"]
+
+
+def get_lemmatizer():
+    if "lemmatizer" not in _resources:
+        require("wordnet")
+        from nltk.stem import WordNetLemmatizer
+
+        _resources["lemmatizer"] = WordNetLemmatizer()
+    return _resources["lemmatizer"]
+
+
+# nltk.pos_tag loads the tagger model from disk on every call, so keep one instance
+def get_pos_tagger():
+    if "pos_tagger" not in _resources:
+        require("averaged_perceptron_tagger", "averaged_perceptron_tagger_eng")
+        from nltk.tag import PerceptronTagger
+
+        _resources["pos_tagger"] = PerceptronTagger()
+    return _resources["pos_tagger"]
 
 
 # Define preprocessing functions
@@ -21,41 +68,42 @@ def case_folding(text):
 
 def cleaning(text):
     # Remove URL
-    text = re.sub(r"http\S+|www\S+|https\S+", "", text, flags=re.MULTILINE)
+    text = url_pattern.sub("", text)
     # Remove punctuation
-    text = re.sub(r"[^\w\s]", "", text)
+    text = punctuation_pattern.sub("", text)
     # Remove numbers
-    text = re.sub(r"\d+", "", text)
+    text = number_pattern.sub("", text)
     # Remove extra whitespace
-    text = re.sub(r"\s+", " ", text).strip()
+    text = whitespace_pattern.sub(" ", text).strip()
     return text
 
 
 def tokenization(text):
-    return word_tokenize(text)
+    return get_word_tokenize()(text)
 
 
 def remove_stopwords(tokens):
-    return [word for word in tokens if word not in stopwords.words("english")]
+    stopword_set = get_stopword_set()
+    return [word for word in tokens if word not in stopword_set]
 
 
 # Function to map NLTK POS tags to WordNet POS tags (used in lemmatization process)
 def get_wordnet_pos(tag):
     if tag.startswith("J"):
-        return wordnet.ADJ
+        return ADJ
     elif tag.startswith("V"):
-        return wordnet.VERB
+        return VERB
     elif tag.startswith("N"):
-        return wordnet.NOUN
+        return NOUN
     elif tag.startswith("R"):
-        return wordnet.ADV
+        return ADV
     else:
-        return wordnet.NOUN  # Default to NOUN if no match
+        return NOUN  # Default to NOUN if no match
 
 
 def lemmatization(tokens):
-    lemmatizer = WordNetLemmatizer()
-    pos_tagged = pos_tag(tokens)
+    lemmatizer = get_lemmatizer()
+    pos_tagged = get_pos_tagger().tag(tokens)
     lemmatized_tokens = [
         lemmatizer.lemmatize(word, get_wordnet_pos(tag)) for word, tag in pos_tagged
     ]
@@ -74,3 +122,65 @@ def single_text_preprocessing(text):
     # Apply lemmatization function
     text = lemmatization(text)
     return text
+
+
+# Function to preprocess a list of texts in the current process
+def _preprocess_chunk(texts):
+    return [single_text_preprocessing(text) for text in texts]
+
+
+# Function to get the number of processes of n_jobs (-1: all CPUs)
+def resolve_n_jobs(n_jobs):
+    if n_jobs == -1:
+        return os.cpu_count() or 1
+    return n_jobs
+
+
+# Function to create a process pool for preprocessing (and batch LDA inference).
+# Workers are started with forkserver (spawn where unavailable) instead of fork, so
+# they do not inherit locks held by other threads of the parent (pipeline stages,
+# torch), and keep their NLTK resources for the lifetime of the pool.
+def process_pool(n_jobs, initializer=None, initargs=()):
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn"
+    )
+    return ProcessPoolExecutor(
+        max_workers=resolve_n_jobs(n_jobs),
+        mp_context=context,
+        initializer=initializer,
+        initargs=initargs,
+    )
+
+
+# Function to preprocess many texts, yielding token lists in input order.
+# Output is identical to single_text_preprocessing. With n_jobs > 1 chunks of
+# chunk_size texts are fanned out to a process pool (n_jobs=-1 uses all CPUs);
+# only a few chunks per worker are in flight, so memory stays bounded.
+# Pass the executor of a process_pool to reuse it across calls, otherwise a pool
+# is created for this call.
+def batch_text_preprocessing(texts, n_jobs=1, chunk_size=256, executor=None):
+    texts = iter(texts)
+    chunks = iter(lambda: list(islice(texts, chunk_size)), [])
+
+    n_jobs = resolve_n_jobs(n_jobs)
+    if n_jobs <= 1:
+        for chunk in chunks:
+            yield from _preprocess_chunk(chunk)
+        return
+
+    if executor is None:
+        with process_pool(n_jobs) as executor:
+            yield from _preprocess_in_pool(executor, chunks, n_jobs)
+    else:
+        yield from _preprocess_in_pool(executor, chunks, n_jobs)
+
+
+def _preprocess_in_pool(executor, chunks, n_jobs):
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(_preprocess_chunk, chunk))
+        if len(pending) >= n_jobs * 2:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
@@ -0,0 +1,254 @@
+# Full-text search of the corpus (titles and abstracts) with BM25 ranking.
+#
+# Build the inverted index once (and again after ingesting papers) with:
+#   python -m utils.search_index build --n-jobs 4
+#
+# Documents are tokenized with the project's preprocessing (the LDA tokens), the title
+# counting title_weight times. Posting lists are stored as flat arrays (CSR layout):
+# offsets[term] .. offsets[term + 1] index the documents and term frequencies of a
+# term, sorted by document. Year and topic of every document (both models) are
+# stored next to them for filtering. All arrays are .npy files memory-mapped on load,
+# so a query only reads the posting lists of its terms.
+# Document ids are row positions of the topic tables: an index built from other
+# topic tables (e.g. before papers were ingested) is not loaded.
+import json
+import logging
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+
+from utils.topic_index import source_signature
+
+logger = logging.getLogger(__name__)
+
+search_index_path = "data/search_index/"
+array_names = [
+    "offsets",
+    "doc_ids",
+    "term_freqs",
+    "doc_lengths",
+    "years",
+    "topics_lda",
+    "topics_bertopic",
+]
+
+
+class SearchIndex:
+    def __init__(self, path, meta, arrays):
+        self.path = path
+        self.meta = meta
+        self.terms = {term: term_id for term_id, term in enumerate(meta["terms"])}
+        for name in array_names:
+            setattr(self, name, arrays[name])
+        self.k1 = meta["k1"]
+        self.b = meta["b"]
+        self.avg_doc_length = meta["avg_doc_length"]
+
+    @classmethod
+    def open(cls, path=search_index_path, meta=None):
+        if meta is None:
+            meta = read_meta(path)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in array_names
+        }
+        return cls(path, meta, arrays)
+
+    @property
+    def num_docs(self):
+        return len(self.doc_lengths)
+
+    # Function to get the BM25 score of every document containing a query term.
+    # Returns document positions and scores (unsorted).
+    def _scores(self, term_ids, allowed=None):
+        doc_ids, weights = [], []
+        for term_id, query_count in Counter(term_ids).items():
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            ids = np.asarray(self.doc_ids[start:end])
+            tfs = np.asarray(self.term_freqs[start:end], dtype=np.float32)
+            if allowed is not None:
+                keep = allowed[ids]
+                ids, tfs = ids[keep], tfs[keep]
+            idf = np.log(
+                1 + (self.num_docs - (end - start) + 0.5) / (end - start + 0.5)
+            )
+            norm = 1 - self.b + self.b * self.doc_lengths[ids] / self.avg_doc_length
+            doc_ids.append(ids)
+            weights.append(
+                query_count * idf * tfs * (self.k1 + 1) / (tfs + self.k1 * norm)
+            )
+        if not doc_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        found, inverse = np.unique(np.concatenate(doc_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        return found, scores.astype(np.float32)
+
+    # Function to get the mask of documents passing the filters (None: no filter)
+    def _filter_mask(self, model_type, topic_ids, years):
+        mask = None
+        if topic_ids is not None:
+            topics = getattr(self, f"topics_{model_type}")
+            mask = np.isin(topics, list(topic_ids))
+        if years is not None:
+            first_year, last_year = years
+            in_years = (self.years >= first_year) & (self.years <= last_year)
+            mask = in_years if mask is None else mask & in_years
+        return mask
+
+    # Function to search the tokens of a query, optionally only among the documents
+    # of some topics of a model ("lda" or "bertopic") and of a range of years.
+    # Returns corpus positions and BM25 scores, best first.
+    def search(self, tokens, k=10, model_type="bertopic", topic_ids=None, years=None):
+        term_ids = [self.terms[token] for token in tokens if token in self.terms]
+        found, scores = self._scores(
+            term_ids, self._filter_mask(model_type, topic_ids, years)
+        )
+        k = min(k, len(found))
+        if k == 0:
+            return found[:0], scores[:0]
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return found[top], scores[top]
+
+
+# Function to build the posting arrays from the token lists of all documents
+def build_postings(token_lists):
+    terms = {}
+    term_ids, doc_ids, term_freqs = [], [], []
+    doc_lengths = np.zeros(len(token_lists), dtype=np.int32)
+    for doc_id, tokens in enumerate(token_lists):
+        counts = Counter(tokens)
+        doc_lengths[doc_id] = len(tokens)
+        for token, count in counts.items():
+            term_ids.append(terms.setdefault(token, len(terms)))
+            doc_ids.append(doc_id)
+            term_freqs.append(count)
+
+    # Terms in alphabetical order, postings grouped by term and sorted by document
+    vocabulary = sorted(terms)
+    new_ids = np.empty(len(terms), dtype=np.int64)
+    new_ids[[terms[term] for term in vocabulary]] = np.arange(len(vocabulary))
+    term_ids = new_ids[np.asarray(term_ids, dtype=np.int64)]
+    doc_ids = np.asarray(doc_ids, dtype=np.int32)
+    order = np.lexsort((doc_ids, term_ids))
+
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)))
+    arrays = {
+        "offsets": offsets,
+        "doc_ids": doc_ids[order],
+        "term_freqs": np.minimum(np.asarray(term_freqs)[order], 65535).astype(
+            np.uint16
+        ),
+        "doc_lengths": doc_lengths,
+    }
+    return vocabulary, arrays
+
+
+# Function to save the index: arrays first, meta.json last (it marks a complete index)
+def save(path, vocabulary, arrays, meta):
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        with open(os.path.join(path, f"{name}.npy.tmp"), "wb") as f:
+            np.save(f, array)
+        os.replace(
+            os.path.join(path, f"{name}.npy.tmp"), os.path.join(path, f"{name}.npy")
+        )
+    with open(os.path.join(path, "meta.json.tmp"), "w") as f:
+        json.dump(dict(meta, terms=vocabulary), f)
+    os.replace(os.path.join(path, "meta.json.tmp"), os.path.join(path, "meta.json"))
+
+
+def read_meta(path=search_index_path):
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        return json.load(f)
+
+
+# Function to get the files the index is built from (both topic tables, segments
+# of ingested papers included)
+def corpus_source_paths():
+    from utils.artifacts import registry
+
+    return (
+        registry.get("topic_table_bertopic").source_paths
+        + registry.get("topic_table_lda").source_paths
+    )
+
+
+# Function to build the index of the corpus from the topic tables
+def build(path=search_index_path, n_jobs=1, title_weight=2, k1=1.5, b=0.75):
+    from utils.artifacts import registry
+    from utils.preprocessing import batch_text_preprocessing
+
+    table_bertopic = registry.get("topic_table_bertopic")
+    table_lda = registry.get("topic_table_lda")
+    corpus = table_bertopic.frame(["Title", "Abstract", "Year", "Top Topic ID"])
+    titles = corpus["Title"].fillna("").astype(str).tolist()
+    abstracts = corpus["Abstract"].fillna("").astype(str).tolist()
+
+    # Titles and abstracts preprocessed in one pass (one process pool)
+    tokens = list(batch_text_preprocessing(titles + abstracts, n_jobs=n_jobs))
+    token_lists = [
+        title_tokens * title_weight + abstract_tokens
+        for title_tokens, abstract_tokens in zip(
+            tokens[: len(titles)], tokens[len(titles) :]
+        )
+    ]
+    vocabulary, arrays = build_postings(token_lists)
+    arrays["years"] = corpus["Year"].to_numpy(dtype=np.int16)
+    arrays["topics_bertopic"] = corpus["Top Topic ID"].to_numpy(dtype=np.int16)
+    arrays["topics_lda"] = table_lda.frame(["Top Topic ID"])["Top Topic ID"].to_numpy(
+        dtype=np.int16
+    )
+    meta = {
+        "k1": k1,
+        "b": b,
+        "title_weight": title_weight,
+        "avg_doc_length": float(arrays["doc_lengths"].mean()) if len(corpus) else 0.0,
+        "source_signature": source_signature(corpus_source_paths()),
+    }
+    save(path, vocabulary, arrays, meta)
+    return SearchIndex.open(path)
+
+
+# Function to load the search index, or None when it has not been built or, given
+# the current source paths, was built from other topic tables
+def load_search_index(path=search_index_path, source_paths=None):
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    meta = read_meta(path)
+    if source_paths is not None:
+        if meta["source_signature"] != source_signature(source_paths):
+            logger.warning(
+                "Search index in %s is outdated (the topic tables changed), search "
+                "is disabled until: python -m utils.search_index build",
+                path,
+            )
+            return None
+    return SearchIndex.open(path, meta)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the corpus search index.")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument(
+        "--n-jobs", type=int, default=1, help="preprocessing processes (-1: all CPUs)"
+    )
+    parser.add_argument("--title-weight", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    index = build(n_jobs=args.n_jobs, title_weight=args.title_weight)
+    print(
+        f"Indexed {index.num_docs} documents, {len(index.terms)} terms, "
+        f"{len(index.doc_ids)} postings in {search_index_path}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
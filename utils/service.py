@@ -0,0 +1,235 @@
+# Headless HTTP inference service for the PREDTopic models.
+#
+# Usage:
+#   python -m utils.service --workers 4 --port 8000
+#
+# Every worker process loads the models once at startup. The model matrices (LDA's
+# topic-word matrix, BERTopic's topic embeddings and c-TF-IDF matrix) are
+# memory-mapped read-only, so the workers share one physical copy of them; the
+# gensim dictionary, the spaCy tokenizer and BERTopic's sentence-transformer are
+# loaded privately by every worker.
+# Point the Streamlit app to the service with PREDTOPIC_API_URL=http://host:8000.
+import os
+import sys
+import threading
+import time
+from typing import List
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field, constr
+
+from utils import metrics, warmup
+from utils.artifacts import model_artifacts, registry
+from utils.prediction import (
+    bertopic_batcher,
+    predict_topic_bertopic_batched,
+    predict_topic_lda,
+    predict_topics_bertopic_batch,
+    predict_topics_lda_batch,
+    split_bertopic_probability,
+)
+
+max_batch_size = int(os.environ.get("PREDTOPIC_MAX_BATCH_SIZE", "256"))
+max_text_length = 3000
+
+# Stage metrics are on by default in the service (PREDTOPIC_METRICS=0 turns them off)
+metrics.enabled = os.environ.get("PREDTOPIC_METRICS", "1") == "1"
+
+app = FastAPI(title="PREDTopic inference service")
+_load_errors = {}
+
+
+class TextRequest(BaseModel):
+    text: str = Field(..., max_length=max_text_length)
+
+
+class BatchRequest(BaseModel):
+    texts: List[constr(max_length=max_text_length)]
+
+
+# Function to load every model artifact, then warm up the preprocessing and both
+# models with a dummy prediction (runs in a background thread at startup)
+def load_models():
+    for model_type, names in model_artifacts.items():
+        for name in names:
+            try:
+                registry.get(name)
+            except Exception as e:
+                _load_errors[name] = repr(e)
+    warmup.warm_up(["nltk", "predict_lda", "predict_bertopic"])
+
+
+def is_ready(model_type):
+    return all(registry.is_loaded(name) for name in model_artifacts[model_type])
+
+
+def check_model(model_type):
+    if model_type not in model_artifacts:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {model_type}")
+    if not is_ready(model_type):
+        raise HTTPException(status_code=503, detail=f"Model {model_type} not loaded")
+
+
+# Function to convert (topic_id, probability) pairs to JSON
+def distribution_to_json(distribution):
+    return [
+        {"topic_id": int(topic_id), "probability": float(probability)}
+        for topic_id, probability in distribution
+    ]
+
+
+# Function to convert a BERTopic prediction to JSON, with the full distribution
+# when the model returns one (otherwise only the top topic)
+def bertopic_result(topic_id, probability):
+    probability, distribution = split_bertopic_probability(probability)
+    if distribution is None:
+        distribution = [(topic_id, probability)]
+    else:
+        distribution = enumerate(distribution)
+    return {
+        "topic_id": int(topic_id),
+        "probability": probability,
+        "distribution": distribution_to_json(distribution),
+    }
+
+
+@app.on_event("startup")
+def startup():
+    # Use memory-mapped, read-only model arrays shared by all worker processes
+    os.environ.setdefault("PREDTOPIC_MMAP_MODELS", "1")
+    threading.Thread(target=load_models, daemon=True).start()
+
+
+@app.middleware("http")
+async def add_timing_header(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    response.headers["X-Process-Time"] = f"{elapsed:.6f}"
+    # Request latency per endpoint (and model), once routing has resolved them
+    endpoint = request.scope.get("endpoint")
+    if metrics.enabled and endpoint is not None:
+        labels = {"endpoint": endpoint.__name__}
+        if "model_type" in request.path_params:
+            labels["model"] = request.path_params["model_type"]
+        status = "ok" if response.status_code < 500 else "error"
+        metrics.observe("request", labels, elapsed, status)
+    response.headers["X-Worker-Pid"] = str(os.getpid())
+    return response
+
+
+@app.get("/health")
+def health():
+    return {
+        "status": "ok",
+        "models": {model_type: is_ready(model_type) for model_type in model_artifacts},
+        "artifacts": registry.stats(),
+        "errors": _load_errors,
+    }
+
+
+@app.get("/metrics/batching")
+def batching_metrics():
+    return bertopic_batcher.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(
+        metrics.render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/ready")
+def ready(response: Response):
+    models = {model_type: is_ready(model_type) for model_type in model_artifacts}
+    is_service_ready = all(models.values()) and warmup.is_ready()
+    if not is_service_ready:
+        response.status_code = 503
+    return {
+        "ready": is_service_ready,
+        "models": models,
+        "warmup": warmup.state(),
+        "errors": _load_errors,
+    }
+
+
+@app.post("/predict/{model_type}")
+def predict(model_type: str, request: TextRequest, response: Response):
+    check_model(model_type)
+    start = time.perf_counter()
+    if model_type == "bertopic":
+        topic_id, probability = predict_topic_bertopic_batched(request.text)
+        result = dict(bertopic_result(topic_id, probability), model=model_type)
+    else:
+        # Same minimum probability filter as the app's local predictions
+        topic_id, distribution, per_word_topics, tokens = predict_topic_lda(
+            request.text, registry.get("lda_model")
+        )
+        result = {
+            "model": model_type,
+            "topic_id": int(topic_id),
+            "probability": float(distribution[0][1]),
+            "distribution": distribution_to_json(distribution),
+            "per_word_topics": [
+                [int(word_id), [int(topic) for topic in topics]]
+                for word_id, topics in per_word_topics
+            ],
+            "tokens": tokens,
+        }
+    response.headers["X-Inference-Time"] = f"{time.perf_counter() - start:.6f}"
+    return result
+
+
+@app.post("/predict/{model_type}/batch")
+def predict_batch(model_type: str, request: BatchRequest, response: Response):
+    check_model(model_type)
+    if len(request.texts) > max_batch_size:
+        raise HTTPException(
+            status_code=413, detail=f"At most {max_batch_size} texts per batch"
+        )
+    start = time.perf_counter()
+    results = []
+    if model_type == "bertopic":
+        topic_ids, probabilities = predict_topics_bertopic_batch(
+            request.texts, registry.get("bertopic_model")
+        )
+        for topic_id, probability in zip(topic_ids, probabilities):
+            results.append(bertopic_result(topic_id, probability))
+    else:
+        topic_ids, distributions = predict_topics_lda_batch(
+            request.texts, registry.get("lda_model")
+        )
+        for topic_id, distribution in zip(topic_ids, distributions):
+            results.append(
+                {
+                    "topic_id": int(topic_id),
+                    "probability": float(distribution[topic_id]),
+                    "distribution": distribution_to_json(enumerate(distribution)),
+                }
+            )
+    response.headers["X-Inference-Time"] = f"{time.perf_counter() - start:.6f}"
+    return {"model": model_type, "results": results}
+
+
+def main(argv=None):
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the PREDTopic inference service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("PREDTOPIC_MMAP_MODELS", "1")
+    uvicorn.run(
+        "utils.service:app", host=args.host, port=args.port, workers=args.workers
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# Nearest-neighbour search of corpus papers for a submitted text, over the document
+# embeddings of the embedding store (python -m utils.embedding_store build).
+#
+# Search is exact (cosine similarity against the memory-mapped matrix, in chunks).
+# For large corpora build an approximate index once with:
+#   python -m utils.similarity build-ann
+import os
+import pickle
+import sys
+
+import numpy as np
+
+from utils.embedding_store import embedding_store_path
+
+chunk_rows = 65536
+ann_index_path = os.path.join(embedding_store_path, "ann_index.pkl")
+# Candidates fetched from the approximate index per requested result, when the
+# results are restricted to one topic
+ann_oversampling = 20
+
+
+# Function to get the norm of every row of a (possibly memory-mapped) matrix in chunks
+def row_norms(vectors):
+    norms = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), chunk_rows):
+        chunk = np.asarray(vectors[start : start + chunk_rows], dtype=np.float32)
+        norms[start : start + chunk_rows] = np.linalg.norm(chunk, axis=1)
+    norms[norms == 0] = 1.0
+    return norms
+
+
+class SimilarityIndex:
+    # corpus_rows maps corpus document positions to embedding store rows (-1: missing)
+    def __init__(self, store, corpus_rows, ann_index=None):
+        self.store = store
+        self.corpus_rows = corpus_rows
+        self.norms = row_norms(store.vectors)
+        self.ann_index = ann_index
+
+        # Inverse mapping, from store rows to corpus positions
+        self.corpus_positions = np.full(store.count, -1, dtype=np.int64)
+        stored = corpus_rows >= 0
+        self.corpus_positions[corpus_rows[stored]] = np.flatnonzero(stored)
+
+    # Function to get cosine similarities of the query with the given store rows
+    def _scores(self, query, rows=None):
+        vectors = self.store.vectors
+        if rows is not None:
+            chunk = np.asarray(vectors[rows], dtype=np.float32)
+            return chunk @ query / self.norms[rows]
+
+        scores = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), chunk_rows):
+            chunk = np.asarray(vectors[start : start + chunk_rows], dtype=np.float32)
+            scores[start : start + chunk_rows] = chunk @ query
+        return scores / self.norms
+
+    # Function to find the k most similar corpus documents, optionally only among the
+    # given corpus positions (e.g. the documents of one topic).
+    # Returns corpus positions and cosine similarities, most similar first.
+    def search(self, query, k=10, positions=None):
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        if self.ann_index is not None:
+            result = self._search_ann(query, k, positions)
+            if result is not None:
+                return result
+
+        if positions is None:
+            candidates = np.flatnonzero(self.corpus_rows >= 0)
+        else:
+            positions = np.asarray(positions)
+            # Papers ingested after the corpus was embedded have no row yet
+            positions = positions[positions < len(self.corpus_rows)]
+            candidates = positions[self.corpus_rows[positions] >= 0]
+        rows = self.corpus_rows[candidates]
+        scores = self._scores(query, None if positions is None else rows)
+        if positions is None:
+            scores = scores[rows]
+
+        k = min(k, len(candidates))
+        if k == 0:
+            return candidates[:0], scores[:0]
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return candidates[top], scores[top]
+
+    def _search_ann(self, query, k, positions):
+        n_neighbors = k if positions is None else k * ann_oversampling
+        n_neighbors = min(n_neighbors, self.store.count)
+        rows, distances = self.ann_index.query(query[None, :], k=n_neighbors)
+        found = self.corpus_positions[rows[0]]
+        similarities = 1 - distances[0]
+
+        keep = found >= 0
+        if positions is not None:
+            keep &= np.isin(found, positions)
+        found, similarities = found[keep][:k], similarities[keep][:k]
+        if len(found) < k and positions is not None:
+            return None  # not enough candidates in the topic, search it exactly
+        return found, similarities
+
+
+# Function to build the approximate (NN-descent) index over the stored embeddings
+def build_ann_index(store):
+    from pynndescent import NNDescent
+
+    data = np.asarray(store.vectors, dtype=np.float32)
+    ann_index = NNDescent(data, metric="cosine")
+    ann_index.prepare()
+    with open(ann_index_path, "wb") as f:
+        pickle.dump(ann_index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return ann_index
+
+
+# Function to load the similarity index, or None when no embeddings were built
+def load_similarity_index(store):
+    corpus_rows_path = os.path.join(embedding_store_path, "corpus_rows.npy")
+    if store is None or not os.path.exists(corpus_rows_path):
+        return None
+
+    ann_index = None
+    if os.path.exists(ann_index_path):
+        with open(ann_index_path, "rb") as f:
+            ann_index = pickle.load(f)
+    return SimilarityIndex(store, np.load(corpus_rows_path), ann_index)
+
+
+def main(argv=None):
+    import argparse
+
+    from utils.artifacts import registry
+
+    parser = argparse.ArgumentParser(description="Manage the similar papers index.")
+    parser.add_argument("command", choices=["build-ann"])
+    parser.parse_args(argv)
+
+    store = registry.get("embedding_store")
+    if store is None:
+        print("No embeddings, run: python -m utils.embedding_store build")
+        return 1
+    build_ann_index(store)
+    print(f"Approximate index of {store.count} embeddings written to {ann_index_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
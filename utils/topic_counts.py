@@ -0,0 +1,59 @@
+import json
+import os
+
+import pandas as pd
+
+from utils.topic_index import source_signature
+
+count_columns = ["Year", "Top Topic ID", "Top Topic Name"]
+
+
+# Function to count the documents of a topic table per year and topic
+def count_topic_years(topic_df):
+    return topic_df.groupby(count_columns).size().reset_index(name="Document_Count")
+
+
+# Function to add the counts of new documents to existing counts
+def add_topic_year_counts(counts, new_counts):
+    return (
+        pd.concat([counts, new_counts])
+        .groupby(count_columns, as_index=False)["Document_Count"]
+        .sum()
+    )
+
+
+def save_topic_year_counts(path, counts, signature):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(
+            {
+                "signature": signature,
+                "columns": list(counts.columns),
+                "data": counts.values.tolist(),
+            },
+            f,
+        )
+    os.replace(tmp_path, path)
+
+
+def read_topic_year_counts(path):
+    with open(path, "r") as f:
+        stored = json.load(f)
+    return pd.DataFrame(stored["data"], columns=stored["columns"]), stored["signature"]
+
+
+# Function to load stored per-year topic counts (kept up to date by ingestion),
+# recounting the whole table only when the sources changed otherwise
+def load_topic_year_counts(counts_path, source_paths, topic_df_loader):
+    signature = source_signature(source_paths)
+    if os.path.exists(counts_path):
+        counts, stored_signature = read_topic_year_counts(counts_path)
+        if stored_signature == signature:
+            return counts
+
+    counts = count_topic_years(topic_df_loader())
+    try:
+        save_topic_year_counts(counts_path, counts, signature)
+    except OSError:
+        pass  # read-only data directory, keep the counts in memory only
+    return counts
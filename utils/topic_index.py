@@ -0,0 +1,146 @@
+import os
+
+import numpy as np
+
+
+# Function to build a signature of the source files, used to invalidate a stored index
+def source_signature(paths):
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(signature)
+
+
+# Per-topic document index of a topic table (topic_df_lda or topic_df_bertopic).
+# For every topic it holds the row positions sorted by probability (descending),
+# the dominant topic name and the representative rows shown in the app, so a topic
+# view is a few array slices instead of filtering and sorting the whole table.
+class TopicIndex:
+    def __init__(
+        self,
+        topic_ids,
+        offsets,
+        positions,
+        names,
+        representatives,
+        best_topic,
+        best_topic_name,
+        signature="",
+    ):
+        self.topic_ids = topic_ids
+        self.offsets = offsets
+        self.positions_sorted = positions
+        self.names = names
+        self.representatives_table = representatives
+        self.best_topic = int(best_topic)
+        self.best_topic_name = str(best_topic_name)
+        self.signature = signature
+        self._slot = {int(topic_id): i for i, topic_id in enumerate(topic_ids)}
+
+    # Row positions of a topic, most probable first (empty for a topic of the model
+    # without documents in the table)
+    def positions(self, topic_id):
+        slot = self._slot.get(int(topic_id))
+        if slot is None:
+            return self.positions_sorted[:0]
+        return self.positions_sorted[self.offsets[slot] : self.offsets[slot + 1]]
+
+    def count(self, topic_id):
+        return len(self.positions(topic_id))
+
+    # Most common "Top Topic Name" of a topic ("" for a topic without documents)
+    def name(self, topic_id):
+        slot = self._slot.get(int(topic_id))
+        return "" if slot is None else str(self.names[slot])
+
+    # Row positions of the representative documents of a topic
+    def representatives(self, topic_id):
+        slot = self._slot.get(int(topic_id))
+        if slot is None:
+            return self.representatives_table[:0, 0]
+        row = self.representatives_table[slot]
+        return row[row >= 0]
+
+    def save(self, path):
+        np.savez(
+            path,
+            topic_ids=self.topic_ids,
+            offsets=self.offsets,
+            positions=self.positions_sorted,
+            names=self.names,
+            representatives=self.representatives_table,
+            best_topic=self.best_topic,
+            best_topic_name=self.best_topic_name,
+            signature=self.signature,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(
+                f["topic_ids"],
+                f["offsets"],
+                f["positions"],
+                f["names"],
+                f["representatives"],
+                f["best_topic"],
+                f["best_topic_name"],
+                str(f["signature"]),
+            )
+
+
+# Function to build the index. Representatives are the k most probable documents
+# (LDA), or k documents sampled with a fixed seed when probabilities are not
+# informative (BERTopic), matching what the app has always displayed.
+def build_topic_index(topic_df, k=10, sample_representatives=False, signature=""):
+    ids = topic_df["Top Topic ID"].to_numpy()
+    probabilities = topic_df["Top Topic Probability"].to_numpy()
+
+    # Sort rows by topic, then by probability descending, in one pass
+    order = np.lexsort((-probabilities, ids))
+    topic_ids, starts = np.unique(ids[order], return_index=True)
+    offsets = np.append(starts, len(order))
+
+    names = []
+    representatives = np.full((len(topic_ids), k), -1, dtype=np.int64)
+    for slot, topic_id in enumerate(topic_ids):
+        positions = order[offsets[slot] : offsets[slot + 1]]
+        topic_rows = topic_df.iloc[positions]
+        names.append(topic_rows["Top Topic Name"].value_counts().idxmax())
+
+        if sample_representatives:
+            sampled = topic_rows.sample(min(k, len(positions)), random_state=42)
+            chosen = topic_df.index.get_indexer(sampled.index)
+        else:
+            chosen = positions[:k]
+        representatives[slot, : len(chosen)] = chosen
+
+    return TopicIndex(
+        topic_ids,
+        offsets,
+        order,
+        np.array(names),
+        representatives,
+        topic_df["Top Topic ID"].value_counts().idxmax(),
+        topic_df["Top Topic Name"].value_counts().idxmax(),
+        signature,
+    )
+
+
+# Function to load a stored index, rebuilding and storing it when the sources changed
+def load_topic_index(index_path, source_paths, topic_df_loader, **build_kwargs):
+    signature = source_signature(source_paths)
+    if os.path.exists(index_path):
+        topic_index = TopicIndex.load(index_path)
+        if topic_index.signature == signature:
+            return topic_index
+
+    topic_index = build_topic_index(
+        topic_df_loader(), signature=signature, **build_kwargs
+    )
+    try:
+        topic_index.save(index_path)
+    except OSError:
+        pass  # read-only data directory, keep the index in memory only
+    return topic_index
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+
+
+# Top-N terms and weights of every topic, computed once from a (topics x vocabulary)
+# weight matrix with one vectorized argpartition, so bar charts and wordclouds of any
+# topic are served by slicing instead of re-ranking the vocabulary on every render.
+class TopicTermIndex:
+    def __init__(self, weights, vocab, topn=50):
+        weights = np.asarray(weights)
+        n = min(topn, weights.shape[1])
+
+        # Unordered top-n columns per row, then order those n by weight (descending)
+        top = np.argpartition(-weights, n - 1, axis=1)[:, :n]
+        top_weights = np.take_along_axis(weights, top, axis=1)
+        order = np.argsort(-top_weights, axis=1, kind="stable")
+
+        self.term_ids = np.take_along_axis(top, order, axis=1)
+        self.term_weights = np.take_along_axis(top_weights, order, axis=1)
+        self.vocab = np.asarray(vocab, dtype=object)
+        self.topn = n
+
+    @property
+    def num_topics(self):
+        return self.term_ids.shape[0]
+
+    # Top terms of a topic as (word, weight) pairs, most weighted first
+    def top_terms(self, topic_id, topn=10):
+        ids = self.term_ids[topic_id, :topn]
+        weights = self.term_weights[topic_id, :topn]
+        ids, weights = ids[np.isfinite(weights)], weights[np.isfinite(weights)]
+        return list(zip(self.vocab[ids].tolist(), weights.tolist()))
+
+    # LDA topic-word probabilities, same values as LdaModel.show_topic
+    @classmethod
+    def from_lda(cls, lda_model, dictionary, topn=50):
+        vocab = [dictionary[i] for i in range(len(dictionary))]
+        return cls(lda_model.get_topics(), vocab, topn)
+
+    # BERTopic topic representations (what BERTopic.get_topic returns, after any
+    # representation model was applied) from topics.json, without loading the model
+    @classmethod
+    def from_bertopic_representations(cls, bertopic_model_path, topn=50):
+        with open(f"{bertopic_model_path}/topics.json", "r") as f:
+            representations = json.load(f)["topic_representations"]
+        # Rows are topics 0..n-1, the outlier topic (-1) is left out
+        topic_ids = sorted(int(t) for t in representations if int(t) >= 0)
+
+        vocab = {}
+        for topic_id in topic_ids:
+            for word, _ in representations[str(topic_id)]:
+                vocab.setdefault(word, len(vocab))
+
+        # Words outside a topic's representation get -inf, so they are never ranked
+        weights = np.full((len(topic_ids), len(vocab)), -np.inf)
+        for row, topic_id in enumerate(topic_ids):
+            for word, score in representations[str(topic_id)]:
+                weights[row, vocab[word]] = score
+        return cls(weights, list(vocab), topn)
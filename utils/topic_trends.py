@@ -0,0 +1,164 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.topic_index import source_signature
+
+# A year-over-year change of at least 20% (up or down) is a significant change
+significant_change = 0.2
+trend_columns = [
+    "Year",
+    "Top Topic ID",
+    "Top Topic Name",
+    "Document_Count",
+    "Share",
+    "Growth_Rate",
+    "Significant",
+]
+
+
+# Function to build the trend cube of a model from its per-year topic counts: one row
+# per topic and year (zero counts included) with the document count, the share of
+# the year's documents, the growth rate against the previous year
+# ((current - previous) / previous, NaN for the first year or after a zero count)
+# and whether the change is significant
+def build_topic_trends(topic_year_counts):
+    counts = (
+        topic_year_counts.pivot_table(
+            index="Top Topic ID",
+            columns="Year",
+            values="Document_Count",
+            aggfunc="sum",
+            fill_value=0,
+        )
+        .sort_index(axis=0)
+        .sort_index(axis=1)
+    )
+    matrix = counts.to_numpy(dtype=np.float64)
+
+    year_totals = matrix.sum(axis=0)
+    share = np.divide(
+        matrix, year_totals, out=np.zeros_like(matrix), where=year_totals > 0
+    )
+    growth = np.full_like(matrix, np.nan)
+    previous = matrix[:, :-1]
+    np.divide(matrix[:, 1:] - previous, previous, out=growth[:, 1:], where=previous > 0)
+
+    names = topic_year_counts.drop_duplicates("Top Topic ID").set_index("Top Topic ID")[
+        "Top Topic Name"
+    ]
+    num_topics, num_years = matrix.shape
+    trends = pd.DataFrame(
+        {
+            "Year": np.tile(counts.columns.to_numpy(), num_topics),
+            "Top Topic ID": np.repeat(counts.index.to_numpy(), num_years),
+            "Document_Count": matrix.ravel().astype(np.int64),
+            "Share": share.ravel(),
+            "Growth_Rate": growth.ravel(),
+        }
+    )
+    trends["Top Topic Name"] = trends["Top Topic ID"].map(names)
+    trends["Significant"] = np.abs(trends["Growth_Rate"]) >= significant_change
+    return trends[trend_columns]
+
+
+# Function to summarize the trend of every topic: total documents, average yearly
+# growth rate and number of significant changes
+def summarize_topic_trends(topic_trends):
+    summary = topic_trends.groupby(["Top Topic ID", "Top Topic Name"]).agg(
+        Total=("Document_Count", "sum"),
+        Average_Growth_Rate=("Growth_Rate", "mean"),
+        Significant_Changes=("Significant", "sum"),
+    )
+    summary["Share_Of_Corpus"] = summary["Total"] / summary["Total"].sum()
+    return summary.reset_index().sort_values("Total", ascending=False)
+
+
+def save_topic_trends(path, topic_trends, signature):
+    tmp_path = f"{path}.tmp"
+    data = topic_trends.astype(object).where(topic_trends.notna(), None)
+    with open(tmp_path, "w") as f:
+        json.dump(
+            {
+                "signature": signature,
+                "columns": list(topic_trends.columns),
+                "data": data.values.tolist(),
+            },
+            f,
+        )
+    os.replace(tmp_path, path)
+
+
+def read_topic_trends(path):
+    with open(path, "r") as f:
+        stored = json.load(f)
+    topic_trends = pd.DataFrame(stored["data"], columns=stored["columns"])
+    topic_trends["Growth_Rate"] = topic_trends["Growth_Rate"].astype(np.float64)
+    return topic_trends, stored["signature"]
+
+
+# Function to load the stored trend cube of a model, rebuilding it from the per-year
+# topic counts only when the topic table changed (e.g. after ingestion)
+def load_topic_trends(trends_path, source_paths, topic_year_counts_loader):
+    signature = source_signature(source_paths)
+    if os.path.exists(trends_path):
+        topic_trends, stored_signature = read_topic_trends(trends_path)
+        if stored_signature == signature:
+            return topic_trends
+
+    topic_trends = build_topic_trends(topic_year_counts_loader())
+    try:
+        save_topic_trends(trends_path, topic_trends, signature)
+    except OSError:
+        pass  # read-only data directory, keep the cube in memory only
+    return topic_trends
+
+
+# DOCUMENTATION TABLES
+
+
+def _format_growth(growth_rate, significant):
+    if pd.isna(growth_rate):
+        return "–"
+    text = f"{growth_rate:+.0%}"
+    return f"**{text}**" if significant else text
+
+
+# Function to render the yearly growth rates of every topic as a markdown table,
+# significant changes in bold
+def growth_table_markdown(topic_trends):
+    years = sorted(topic_trends["Year"].unique())
+    lines = [
+        "| Topic | " + " | ".join(str(year) for year in years) + " |",
+        "|---|" + "---:|" * len(years),
+    ]
+    for (topic_id, topic_name), rows in topic_trends.groupby(
+        ["Top Topic ID", "Top Topic Name"]
+    ):
+        rows = rows.sort_values("Year")
+        cells = [
+            f"{count} ({_format_growth(growth, significant)})"
+            for count, growth, significant in zip(
+                rows["Document_Count"], rows["Growth_Rate"], rows["Significant"]
+            )
+        ]
+        lines.append(f"| {topic_name} | " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+
+# Function to render the topic summary as a markdown table
+def summary_table_markdown(topic_trends):
+    lines = [
+        "| Topic | Documents | Share | Average Growth | Significant Changes |",
+        "|---|---:|---:|---:|---:|",
+    ]
+    for _, row in summarize_topic_trends(topic_trends).iterrows():
+        average_growth = _format_growth(row["Average_Growth_Rate"], False)
+        lines.append(
+            f"| {row['Top Topic Name']} | {row['Total']} | "
+            f"{row['Share_Of_Corpus']:.1%} | {average_growth} | "
+            f"{row['Significant_Changes']} |"
+        )
+    return "\n".join(lines)
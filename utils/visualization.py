@@ -1,21 +1,31 @@
 import plotly.express as px
 import plotly.graph_objects as go
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import pandas as pd
 from wordcloud import WordCloud
 
 
-# Plot the topic over time
-def visualize_topic_over_time(topic_id, topic_df_to_show):
-    # Group by Year and Top Topic, then count documents
-    topic_year_counts = (
-        topic_df_to_show.groupby(["Year", "Top Topic Name"])
-        .size()
-        .reset_index(name="Document_Count")
-    )
+# Function to format growth rates for hover labels (blank when there is no previous
+# year to compare with)
+def growth_labels(growth_rates):
+    return [
+        "" if pd.isna(growth) else f"<br>Growth: {growth:+.0%}"
+        for growth in growth_rates
+    ]
+
+
+# Plot the topic over time, from the trend cube of the model (counts, shares and
+# growth rates per year and topic). Significant changes are marked. Years without
+# documents of the topic are left out.
+def visualize_topic_over_time(topic_id, topic_trends):
+    # Trend of the selected topic, in the years it has documents
+    topic_trends = topic_trends[
+        (topic_trends["Top Topic ID"] == topic_id)
+        & (topic_trends["Document_Count"] > 0)
+    ].assign(Growth=lambda df: growth_labels(df["Growth_Rate"]))
     # Plotting using plotly line plot
     fig = px.line(
-        topic_year_counts,
+        topic_trends,
         x="Year",
         y="Document_Count",
         color="Top Topic Name",
@@ -25,10 +35,26 @@ def visualize_topic_over_time(topic_id, topic_df_to_show):
             "Document_Count": "Number of Documents",
             "Top Topic Name": "Topic ID & Top Words",
         },
+        custom_data=["Share", "Growth"],
         height=400,
     )
 
-    fig.update_traces(mode="lines")
+    fig.update_traces(
+        mode="lines",
+        hovertemplate="%{x}: %{y} documents<br>Share: %{customdata[0]:.1%}"
+        "%{customdata[1]}<extra></extra>",
+    )
+    significant = topic_trends[topic_trends["Significant"]]
+    fig.add_trace(
+        go.Scatter(
+            x=significant["Year"],
+            y=significant["Document_Count"],
+            mode="markers",
+            marker=dict(size=9, symbol="diamond"),
+            name="Change of 20% or more",
+            hoverinfo="skip",
+        )
+    )
     fig.update_layout(
         xaxis=dict(type="category"),
         showlegend=False,
@@ -37,11 +63,41 @@ def visualize_topic_over_time(topic_id, topic_df_to_show):
     return fig
 
 
-def visualize_top10words_lda(model, topic_id):
-    # Build dataframe of word_prob for topic_id
-    word_prob = model.show_topics(
-        num_topics=23, num_words=10, log=False, formatted=False
-    )[topic_id][1]
+# Plot several topics over time in one chart, as number of documents ("Document_Count")
+# or share of the year's documents ("Share")
+def visualize_topic_comparison(topic_ids, topic_trends, measure="Document_Count"):
+    topic_trends = topic_trends[topic_trends["Top Topic ID"].isin(topic_ids)].assign(
+        Growth=lambda df: growth_labels(df["Growth_Rate"])
+    )
+    fig = px.line(
+        topic_trends,
+        x="Year",
+        y=measure,
+        color="Top Topic Name",
+        markers=True,
+        title="Topics Over The Years",
+        labels={
+            "Year": "Year",
+            "Document_Count": "Number of Documents",
+            "Share": "Share of Documents",
+            "Top Topic Name": "Topic ID & Top Words",
+        },
+        custom_data=["Growth"],
+        height=450,
+    )
+    fig.update_traces(hovertemplate="%{x}: %{y}%{customdata[0]}<extra></extra>")
+    fig.update_layout(
+        xaxis=dict(type="category"),
+        yaxis=dict(tickformat=".0%" if measure == "Share" else None),
+        legend=dict(orientation="h", yanchor="top", y=-0.2),
+        template="plotly_white",
+    )
+    return fig
+
+
+def visualize_top10words_lda(topic_terms, topic_id):
+    # Build dataframe of word_prob for topic_id (from the LDA topic term index)
+    word_prob = topic_terms.top_terms(topic_id, 10)
     df = pd.DataFrame(word_prob, columns=["Word", "Probability"]).sort_values(
         "Probability"
     )
@@ -65,9 +121,9 @@ def visualize_top10words_lda(model, topic_id):
     return fig
 
 
-def visualize_top10words_bertopic(model, topic_id):
-    # Get the topic's words and their c-TF-IDF scores
-    words_scores = model.get_topic(topic_id)[:10]
+def visualize_top10words_bertopic(topic_terms, topic_id):
+    # Get the topic's words and their c-TF-IDF scores (from the BERTopic topic term index)
+    words_scores = topic_terms.top_terms(topic_id, 10)
 
     # Build dataframe from the words and scores
     df = pd.DataFrame(words_scores, columns=["Word", "c-TF-IDF Score"]).sort_values(
@@ -96,49 +152,43 @@ def visualize_top10words_bertopic(model, topic_id):
     return fig
 
 
-# Function to create wordcloud for a given topic
-def visualize_wordcloud_lda(model, topic_id, num_words=50):
-    # Get the top words for the topic
-    topic_words = model.show_topic(topic_id, topn=num_words)
-    wordcloud_dict = {word: freq for word, freq in topic_words}
-
+# Function to draw a wordcloud on its own figure (not the shared pyplot state)
+def create_wordcloud_figure(wordcloud_dict, topic_id):
     # Generate wordcloud
     wordcloud = WordCloud(
         width=1400, height=200, background_color="white"
     ).generate_from_frequencies(wordcloud_dict)
 
-    plt.title(
+    fig = Figure()
+    ax = fig.subplots()
+    ax.set_title(
         f"Top 50 Words of Topic {topic_id} in a Wordcloud",
         fontdict={"fontsize": 6, "fontweight": "semibold", "fontfamily": "sans-serif"},
     )
-    plt.imshow(wordcloud, interpolation="bilinear")
-    plt.axis("off")
+    ax.imshow(wordcloud, interpolation="bilinear")
+    ax.axis("off")
 
-    return plt
+    return fig
+
+
+# Function to create wordcloud for a given topic
+def visualize_wordcloud_lda(topic_terms, topic_id, num_words=50):
+    # Get the top words for the topic
+    topic_words = topic_terms.top_terms(topic_id, num_words)
+    wordcloud_dict = {word: freq for word, freq in topic_words}
+
+    return create_wordcloud_figure(wordcloud_dict, topic_id)
 
 
 # Function to create wordcloud for a given topic in BERTopic
-def visualize_wordcloud_bertopic(model, topic_id, num_words=50):
+def visualize_wordcloud_bertopic(topic_terms, topic_id, num_words=50):
     # Get the top words for the topic and their c-TF-IDF scores
-    topic_words_scores = model.get_topic(topic_id)
+    topic_words_scores = topic_terms.top_terms(topic_id, num_words)
 
     # Create a dictionary of word frequencies
-    wordcloud_dict = {word: score for word, score in topic_words_scores[:num_words]}
-
-    # Generate wordcloud
-    wordcloud = WordCloud(
-        width=1400, height=200, background_color="white"
-    ).generate_from_frequencies(wordcloud_dict)
+    wordcloud_dict = {word: score for word, score in topic_words_scores}
 
-    # Display the wordcloud
-    plt.title(
-        f"Top 50 Words of Topic {topic_id} in a Wordcloud",
-        fontdict={"fontsize": 6, "fontweight": "semibold", "fontfamily": "sans-serif"},
-    )
-    plt.imshow(wordcloud, interpolation="bilinear")
-    plt.axis("off")
-
-    return plt
+    return create_wordcloud_figure(wordcloud_dict, topic_id)
 
 
 # Fungsi untuk memberi warna berdasarkan topik
@@ -202,23 +252,22 @@ def visualize_topic_distribution(distribution):
     return fig
 
 
-def create_colored_text(doc, dictionary, per_word_topics):
-    # Display colored text
-    colored_text = ""
-    for i, token in enumerate(doc):
-        j = 0
-        while (
-            j < len(per_word_topics)
-            and dictionary[per_word_topics[j][0]] != token.text.lower()
-        ):
-            j += 1
-        if j < len(per_word_topics):  # found the token in word topic distribution
-            word_topics = per_word_topics[j][1]
-            if word_topics:
-                colored_text += colorize(token.text, word_topics[0]) + " "
-            else:
-                colored_text += token.text + " "
-        else:
-            colored_text += token.text + " "
-
-    return colored_text
+# Function to map each word of the text to its most likely topic,
+# from the per word topics of LdaModel.get_document_topics
+def create_word_topic_index(per_word_topics):
+    topic_by_word_id = {}
+    for word_id, word_topics in per_word_topics:
+        topic_by_word_id.setdefault(word_id, word_topics[0] if word_topics else None)
+    return topic_by_word_id
+
+
+def create_colored_text(tokens, dictionary, per_word_topics):
+    # Display colored text (tokens are the token texts of the input)
+    topic_by_word_id = create_word_topic_index(per_word_topics)
+    token2id = dictionary.token2id
+    parts = []
+    for token in tokens:
+        topic = topic_by_word_id.get(token2id.get(token.lower()))
+        parts.append(colorize(token, topic) if topic is not None else token)
+
+    return "".join(f"{part} " for part in parts)
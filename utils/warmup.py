@@ -0,0 +1,202 @@
+# Warm-up of a process before it takes traffic.
+#
+# Usage:
+#   python -m utils.warmup                    # run every step, exit 1 if one failed
+#   python -m utils.warmup --steps nltk models predict_lda
+#
+# Loads the NLTK resources, the corpus artifacts, the static assets and both models
+# (the artifact lists of utils.artifacts), runs a dummy prediction through
+# predict_topic_lda and predict_topic_bertopic (the first sentence-transformer
+# forward pass is the slow one) and builds the figures and wordclouds of every topic
+# of both models. Each step is timed and logged.
+# The app runs it in a background thread at process start with PREDTOPIC_WARMUP=1,
+# the inference service always does (its /ready answers 200 only once it is done).
+# With PREDTOPIC_READY_FILE set, that file is written when the process is ready,
+# for readiness probes (e.g. test -f /tmp/predtopic.ready).
+import logging
+import os
+import sys
+import threading
+import time
+
+from utils.artifacts import corpus_artifacts, model_artifacts, registry
+from utils.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+warmup_text = (
+    "A machine learning approach to predict research topics from the titles and "
+    "abstracts of computer science papers."
+)
+enabled = os.environ.get("PREDTOPIC_WARMUP", "0") == "1"
+ready_file_path = os.environ.get("PREDTOPIC_READY_FILE")
+
+_lock = threading.Lock()
+_state = {"status": "not started", "steps": {}, "errors": {}, "seconds": None}
+
+
+def warm_nltk():
+    from utils.preprocessing import single_text_preprocessing
+
+    single_text_preprocessing(warmup_text)
+
+
+def warm_corpus():
+    for name in corpus_artifacts:
+        registry.get(name)
+
+
+def warm_assets():
+    for name in ["assets", "topic_desc_lda", "topic_desc_bertopic"]:
+        registry.get(name)
+
+
+def warm_models():
+    for names in model_artifacts.values():
+        for name in names:
+            registry.get(name)
+
+
+def warm_predict_lda():
+    from utils.prediction import predict_topic_lda
+    from utils.visualization import create_colored_text
+
+    _, _, per_word_topics, tokens = predict_topic_lda(
+        warmup_text, registry.get("lda_model")
+    )
+    create_colored_text(tokens, registry.get("dictionary"), per_word_topics)
+
+
+def warm_predict_bertopic():
+    from utils.prediction import predict_topic_bertopic
+
+    predict_topic_bertopic(warmup_text, registry.get("bertopic_model"))
+
+
+def warm_figures():
+    from utils.figure_cache import precompute
+
+    precompute()
+
+
+def warm_wordclouds():
+    from utils.wordcloud_cache import get_wordcloud_png
+
+    for model_type in ["LDA", "BERTopic"]:
+        for topic_id in range(
+            registry.get(f"topic_terms_{model_type.lower()}").num_topics
+        ):
+            get_wordcloud_png(model_type, topic_id)
+
+
+steps = {
+    "nltk": warm_nltk,
+    "corpus": warm_corpus,
+    "assets": warm_assets,
+    "models": warm_models,
+    "predict_lda": warm_predict_lda,
+    "predict_bertopic": warm_predict_bertopic,
+    "figures": warm_figures,
+    "wordclouds": warm_wordclouds,
+}
+
+
+# Steps of the app: without the models and predictions when the app predicts through
+# the inference service (PREDTOPIC_API_URL), which warms up its own
+def app_steps():
+    from utils.prediction import api_url
+
+    if api_url:
+        return ["corpus", "assets", "figures", "wordclouds"]
+    return list(steps)
+
+
+# Function to get the warm-up state: status ("not started", "running", "ready" or
+# "failed"), seconds per finished step, errors per failed step, total seconds
+def state():
+    with _lock:
+        return {
+            "status": _state["status"],
+            "steps": dict(_state["steps"]),
+            "errors": dict(_state["errors"]),
+            "seconds": _state["seconds"],
+        }
+
+
+def is_ready():
+    return _state["status"] == "ready"
+
+
+# Function to run the warm-up steps in order (all by default). Failed steps are
+# logged and skipped; the process is ready only when every step succeeded.
+def warm_up(step_names=None):
+    step_names = list(steps) if step_names is None else step_names
+    with _lock:
+        _state.update(status="running", steps={}, errors={}, seconds=None)
+    start = time.perf_counter()
+    for name in step_names:
+        step_start = time.perf_counter()
+        try:
+            with stage("warmup", step=name):
+                steps[name]()
+        except Exception as e:
+            logger.exception("Warm-up step %s failed", name)
+            with _lock:
+                _state["errors"][name] = repr(e)
+            continue
+        seconds = time.perf_counter() - step_start
+        logger.info("Warm-up step %s done in %.2fs", name, seconds)
+        with _lock:
+            _state["steps"][name] = seconds
+
+    seconds = time.perf_counter() - start
+    with _lock:
+        _state["seconds"] = seconds
+        _state["status"] = "failed" if _state["errors"] else "ready"
+    if _state["status"] == "ready":
+        logger.info("Ready after %.2fs of warm-up", seconds)
+        if ready_file_path:
+            with open(ready_file_path, "w") as f:
+                f.write(f"{time.strftime('%Y-%m-%dT%H:%M:%S%z')}\n")
+    else:
+        logger.error(
+            "Warm-up finished in %.2fs with failed steps: %s",
+            seconds,
+            ", ".join(_state["errors"]),
+        )
+    return state()
+
+
+# Function to run warm_up() in a background thread, once per process
+def start_warm_up(step_names=None):
+    with _lock:
+        if _state["status"] != "not started":
+            return
+        _state["status"] = "running"
+    threading.Thread(
+        target=warm_up, args=(step_names,), name="warmup", daemon=True
+    ).start()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Preload artifacts and prime caches before serving."
+    )
+    parser.add_argument("--steps", nargs="+", choices=list(steps), default=list(steps))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    result = warm_up(args.steps)
+    for name in args.steps:
+        if name in result["steps"]:
+            print(f"{name:<18} {result['steps'][name]:8.2f}s")
+        else:
+            print(f"{name:<18}   FAILED {result['errors'][name]}")
+    print(f"{'total':<18} {result['seconds']:8.2f}s  {result['status']}")
+    return 0 if result["status"] == "ready" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
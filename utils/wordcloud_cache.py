@@ -0,0 +1,166 @@
+# Pre-rendered wordcloud images per model and topic.
+#
+# Images are stored as PNG files in models/wordclouds/<model>/, next to the models,
+# together with the version of the model they were rendered from. Render them all
+# ahead of time with:
+#   python -m utils.wordcloud_cache build
+# Anything missing or stale (model files changed) is rendered on first request.
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: the manifest is only locked within the process
+    fcntl = None
+
+from utils.artifacts import registry
+from utils.metrics import stage
+from utils.visualization import visualize_wordcloud_bertopic, visualize_wordcloud_lda
+
+wordcloud_path = "models/wordclouds/"
+
+_images = {}
+_lock = threading.Lock()
+_manifest_thread_lock = threading.Lock()
+
+
+def get_model_version(model_type):
+    if model_type == "BERTopic":
+        return registry.get("bertopic_model_version")
+    return registry.get("lda_model_version")
+
+
+# Function to render a wordcloud to PNG bytes (same settings st.pyplot uses)
+def render_wordcloud_png(model_type, topic_id):
+    if model_type == "BERTopic":
+        fig = visualize_wordcloud_bertopic(
+            registry.get("topic_terms_bertopic"), topic_id
+        )
+    else:
+        fig = visualize_wordcloud_lda(registry.get("topic_terms_lda"), topic_id)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight", dpi=200)
+    return buffer.getvalue()
+
+
+def _model_dir(model_type):
+    return os.path.join(wordcloud_path, model_type)
+
+
+def _read_manifest(model_type):
+    try:
+        with open(os.path.join(_model_dir(model_type), "manifest.json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Function to write a file atomically: a unique temporary file in the same
+# directory, then os.replace, so readers never see a partly written file
+def _write_atomic(path, content):
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+# Lock of the manifest of a model, across the threads and processes (app sessions,
+# the build command) writing to it
+@contextlib.contextmanager
+def _manifest_lock(model_dir):
+    with _manifest_thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(model_dir, "manifest.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# Function to store the image of a topic: the PNG first, then its manifest entry
+def _write_image(model_type, version, topic_id, png):
+    model_dir = _model_dir(model_type)
+    os.makedirs(model_dir, exist_ok=True)
+    _write_atomic(os.path.join(model_dir, f"topic_{topic_id}.png"), png)
+    with _manifest_lock(model_dir):
+        manifest = _read_manifest(model_type)
+        if manifest.get("model_version") != version:
+            manifest = {"model_version": version, "topics": []}
+        manifest["topics"] = sorted(set(manifest["topics"]) | {topic_id})
+        _write_atomic(
+            os.path.join(model_dir, "manifest.json"),
+            json.dumps(manifest, indent=2).encode(),
+        )
+
+
+# Function to get the PNG bytes of a topic's wordcloud, rendering it only once
+def get_wordcloud_png(model_type, topic_id):
+    topic_id = int(topic_id)
+    version = get_model_version(model_type)
+    key = (model_type, version, topic_id)
+    if key in _images:
+        return _images[key]
+
+    with _lock:
+        if key not in _images:
+            manifest = _read_manifest(model_type)
+            image_path = os.path.join(_model_dir(model_type), f"topic_{topic_id}.png")
+            if manifest.get("model_version") == version and topic_id in manifest.get(
+                "topics", []
+            ):
+                with open(image_path, "rb") as f:
+                    png = f.read()
+            else:
+                with stage("wordcloud_render", model=model_type):
+                    png = render_wordcloud_png(model_type, topic_id)
+                try:
+                    _write_image(model_type, version, topic_id, png)
+                except OSError:
+                    pass  # read-only models directory, keep the image in memory only
+            _images[key] = png
+    return _images[key]
+
+
+# Function to render the wordclouds of every topic of both models
+def build_all():
+    lda_topics = range(registry.get("topic_terms_lda").num_topics)
+    bertopic_topics = range(registry.get("topic_terms_bertopic").num_topics)
+    for model_type, topic_ids in [("LDA", lda_topics), ("BERTopic", bertopic_topics)]:
+        version = get_model_version(model_type)
+        for topic_id in topic_ids:
+            _write_image(
+                model_type,
+                version,
+                topic_id,
+                render_wordcloud_png(model_type, topic_id),
+            )
+        print(f"Rendered {len(topic_ids)} {model_type} wordclouds")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-render topic wordclouds.")
+    parser.add_argument("command", choices=["build"])
+    parser.parse_args(argv)
+    build_all()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())